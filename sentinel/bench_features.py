@@ -0,0 +1,66 @@
+# bench_features.py
+# ⏱️ Micro-benchmark for the vectorized feature engine over multi-day M5 windows
+
+import time
+
+import numpy as np
+
+from candles import Candles
+from features import SWING_LOOKBACK, compute_features, format_feature_digest
+
+CANDLES_PER_DAY = 288  # M5
+WINDOW_DAYS = [1, 5, 20, 60]
+REPEATS = 50
+
+
+def synthetic_candles(count: int, seed: int = 7) -> Candles:
+    """Random-walk XAU/USD-like M5 candles (no network needed)."""
+    rng = np.random.default_rng(seed)
+    close = 3350 + np.cumsum(rng.normal(0, 0.8, count))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    wick = np.abs(rng.normal(0, 0.6, (2, count)))
+    start = np.datetime64("2025-08-04T00:00:00", "ns")
+    return Candles(
+        start + np.arange(count) * np.timedelta64(5, "m"),
+        open_,
+        np.maximum(open_, close) + wick[0],
+        np.minimum(open_, close) - wick[1],
+        close,
+        rng.integers(50, 900, count),
+    )
+
+
+def _best_of(fn, repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark():
+    print(f"{'days':>5} {'candles':>8} {'features':>12} {'digest':>12} {'raw lines':>12} {'digest chars':>13} {'raw chars':>10}")
+    for days in WINDOW_DAYS:
+        candles = synthetic_candles(days * CANDLES_PER_DAY)
+        features_s = _best_of(lambda: compute_features(candles))
+        digest_s = _best_of(lambda: format_feature_digest(candles))
+        raw_s = _best_of(lambda: candles.to_prompt_lines())
+        print(
+            f"{days:>5} {len(candles):>8} {features_s * 1e3:>10.2f}ms {digest_s * 1e3:>10.2f}ms "
+            f"{raw_s * 1e3:>10.2f}ms {len(format_feature_digest(candles)):>13} {len(candles.to_prompt_lines()):>10}"
+        )
+
+
+def check_short_windows():
+    """Windows too short to confirm a swing (fewer than 2*SWING_LOOKBACK+1 candles) still produce a digest."""
+    for count in range(1, 2 * SWING_LOOKBACK + 2):
+        candles = synthetic_candles(count)
+        digest = format_feature_digest(candles, compute_features(candles))
+        print(f"✅ {count} candle(s): {len(digest)} digest chars")
+
+
+# 🟢 Direct Execution
+if __name__ == "__main__":
+    check_short_windows()
+    run_benchmark()
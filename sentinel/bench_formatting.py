@@ -0,0 +1,140 @@
+# bench_formatting.py
+# ⏱️ Benchmark: previous multi-pass regex formatting vs the single-pass HTML engine, over the summaries in logs/
+
+import glob
+import os
+import re
+import time
+
+from html_engine import TOKEN_RE, render_report_body, trim_html, prepare_telegram_chunks
+
+LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
+ENTRY_RE = re.compile(r"^\[\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\] SESSION: (.+?) \| \d+ candles\n", re.MULTILINE)
+MAX_LEN = 4096
+CHUNK_LEN = 4096 - 50
+REPEATS = 20
+FRAME = "<b>SENTINELx XAU/USD REPORT</b>\n\n{body}\n\n<i>quote</i>\n\n<b>Date:</b> Monday\n<b>Session:</b> {session}"
+
+
+def load_logged_summaries(log_dir: str = LOG_DIR) -> list:
+    """(session_name, summary) for every entry of the TXT logs."""
+    entries = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "*", "*_summary_log.txt"))):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        marks = list(ENTRY_RE.finditer(text))
+        for mark, nxt in zip(marks, marks[1:] + [None]):
+            body = text[mark.end():nxt.start() if nxt else len(text)]
+            entries.append((mark.group(1), body.rsplit("─" * 60, 1)[0].strip()))
+    return entries
+
+
+# 🐢 Previous pipeline (prompt_formatter + telegram_alert before the engine), kept as the reference
+def _legacy_remove_emojis(text):
+    return re.compile(
+        "[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF"
+        "\U00002500-\U00002BEF\U00002702-\U000027B0\U000024C2-\U0001F251]+", flags=re.UNICODE
+    ).sub("", text)
+
+
+def _legacy_format_price_values(text):
+    return re.sub(r"\b(\d{3,5}\.\d{2})\b",
+                  lambda m: f"<b>{m.group(1)}</b>" if f"<b>{m.group(1)}</b>" not in text else m.group(1), text)
+
+
+def _legacy_clean(summary):
+    for pattern in (r"(?i)📍.*session summary.*", r"(?i)^.*session summary.*\n?", r"<i>.*?</i>",
+                    r"(?i)<b>\s*date\s*:.*?</b>.*", r"(?i)<b>\s*session\s*:.*?</b>.*", r"(?i)<b>\s*time\s*:.*?</b>.*",
+                    r"(?i)<b>\s*sentinelx\s*:?.*?</b>.*", r"(?i)<b>\s*xau/usd\s*\s*:?.*?</b>.*",
+                    r"(?im)^\s*date\s*:.*$", r"(?im)^\s*session\s*:.*$", r"(?im)^\s*time\s*:.*$",
+                    r"(?im)^\s*sentinelx\s*:?.*$", r"(?im)^\s*xau/usd\s*report\s*:?.*$"):
+        summary = re.sub(pattern, "", summary)
+    return summary.strip()
+
+
+def _legacy_trim(message, max_len):
+    if len(message) <= max_len:
+        return message
+    trimmed = message[:max_len]
+    for tag in ["b", "i"]:
+        if trimmed.count(f"<{tag}>") != trimmed.count(f"</{tag}>"):
+            trimmed += f"</{tag}>"
+    return trimmed + "..."
+
+
+def _legacy_sanitize(text):
+    allowed = {"b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "a", "code", "pre", "span", "br"}
+    text = text.replace("&lt;", "<").replace("&gt;", ">")
+    text = re.sub(r"(<code>.*?)(<br>)(.*?</code>)", r"\1\3", text, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r"(<pre>.*?)(<br>)(.*?</pre>)", r"\1\3", text, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r"<\s*br\s*/?>", "<br>", text, flags=re.IGNORECASE)
+    return re.sub(r"</?([a-zA-Z0-9]+)(\s[^>]*)?>", lambda m: m.group(0) if m.group(1).lower() in allowed else "", text)
+
+
+def _legacy_split(text, max_len):
+    chunks, current = [], ""
+    for word in text.split(" "):
+        if len(current) + len(word) + 1 > max_len:
+            chunks.append(current)
+            current = word
+        else:
+            current += (" " if current else "") + word
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def legacy_pipeline(session_name, summary):
+    body = _legacy_format_price_values(_legacy_remove_emojis(_legacy_clean(summary)))
+    message = _legacy_trim(FRAME.format(body=body, session=session_name), MAX_LEN)
+    return _legacy_split(_legacy_sanitize(message), CHUNK_LEN)
+
+
+def engine_pipeline(session_name, summary):
+    message = trim_html(FRAME.format(body=render_report_body(summary), session=session_name), MAX_LEN)
+    return prepare_telegram_chunks(message, CHUNK_LEN)[1]
+
+
+def _balanced(chunk: str) -> bool:
+    stack = []
+    for m in TOKEN_RE.finditer(chunk):
+        if m.group("name"):
+            if not m.group("close"):
+                stack.append(m.group("name").lower())
+            elif not stack or stack.pop() != m.group("name").lower():
+                return False
+        elif m.group("br"):
+            return False  # Telegram rejects <br>
+    return not stack
+
+
+def _best_of(fn, repeats: int = REPEATS) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(corpus_copies: int = 1):
+    entries = load_logged_summaries() * corpus_copies
+    if not entries:
+        print(f"No logged summaries found under {LOG_DIR}")
+        return
+    chars = sum(len(s) for _, s in entries)
+    print(f"Corpus: {len(entries)} logged summaries, {chars / 1024:.0f} KiB")
+
+    for name, pipeline in (("legacy regex passes", legacy_pipeline), ("single-pass engine", engine_pipeline)):
+        elapsed = _best_of(lambda: [pipeline(s, text) for s, text in entries])
+        outputs = [pipeline(s, text) for s, text in entries]
+        chunks = [c for out in outputs for c in out]
+        oversize = sum(len(c) > MAX_LEN for c in chunks)
+        broken = sum(not _balanced(c) for c in chunks)
+        print(f"{name:>22}: {elapsed * 1e3:8.2f} ms total | {elapsed / len(entries) * 1e6:7.1f} µs/report | "
+              f"{len(chunks)} chunks, {oversize} over {MAX_LEN}, {broken} with unbalanced tags or <br>")
+
+
+# 🟢 Direct Execution
+if __name__ == "__main__":
+    run_benchmark()
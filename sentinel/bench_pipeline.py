@@ -0,0 +1,210 @@
+# bench_pipeline.py
+# ⏱️ End-to-end latency benchmark — the real session loop against local OANDA/OpenAI/Telegram stubs, timed per stage
+
+import argparse
+import contextvars
+import functools
+import glob
+import inspect
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, time as dtime
+
+import gpt_analysis
+import main
+import telegram_alert
+from config import GPT_HEDGE_MODEL, LOCAL_TZ
+from replay import run_replay
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "bench_results")
+REGRESSION_THRESHOLD = 0.20  # flag stages whose p95 grew by more than 20% over the previous run
+GPT_TAIL_RATE = 0.05  # share of primary-model requests that stall in the gpt-tail scenarios
+GPT_TAIL_SEC = 6.0
+
+# 🧩 Stage → (module, function) wrapped with a timer for the run
+STAGES = {
+    "candle_fetch": [(main, "fetch_latest_data"), (main, "fetch_latest_data_async")],
+    "prompt_build": [(gpt_analysis, "_session_summary_prompt"), (gpt_analysis, "_morning_forecast_prompt"),
+                     (gpt_analysis, "_evening_review_prompt"), (gpt_analysis, "_batched_summary_prompt")],
+    "gpt": [(gpt_analysis, "chat_completion"), (gpt_analysis, "chat_completion_async")],
+    "formatting": [(main, "format_spectral_summary")],
+    "sanitize_split": [(telegram_alert, "_prepare_message")],
+    "send": [(telegram_alert, "http_request"), (telegram_alert, "async_http_request")],
+    "warm_up": [(main, "warm_up_sessions"), (main, "warm_up_sessions_async")],
+}
+
+# Calls made by the pre-session warm-up (candles, connections) are kept out of the per-alert stages
+_in_warm_up = contextvars.ContextVar("in_warm_up", default=False)
+
+
+def _timed(stage: str, fn, samples: dict):
+    def record(start: float):
+        if stage == "warm_up" or not _in_warm_up.get():
+            samples[stage].append(time.perf_counter() - start)
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            token = _in_warm_up.set(True) if stage == "warm_up" else None
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                record(start)
+                if token:
+                    _in_warm_up.reset(token)
+        return wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _in_warm_up.set(True) if stage == "warm_up" else None
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(start)
+            if token:
+                _in_warm_up.reset(token)
+    return wrapper
+
+
+def _stage_stats(samples: list) -> dict:
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e3, 2)
+    return {"count": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "max_ms": round(ordered[-1] * 1e3, 2)}
+
+
+def run_scenario(name: str, start: datetime, days: float, sessions: dict | None = None, sync: bool = False,
+                 concurrency: int | None = None, patches: list = (), **stub_options) -> dict:
+    """One replay with every stage timed; returns per-stage percentiles plus the replay summary."""
+    samples = defaultdict(list)
+    patches = [(module, attr, _timed(stage, getattr(module, attr), samples))
+               for stage, targets in STAGES.items() for module, attr in targets] + list(patches)
+    if concurrency:
+        patches.append((main, "MAX_CONCURRENT_SESSIONS", concurrency))
+
+    out_dir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    try:
+        summary = run_replay(start, days, sessions=sessions, sync=sync, patches=patches, out_dir=out_dir,
+                             **stub_options)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    stages = {stage: _stage_stats(samples[stage]) for stage in STAGES if samples[stage]}
+    delivered = summary["deliveries"]
+    result = {
+        "scenario": name, "loop": "sync" if sync else "async", "stub_options": stub_options,
+        "concurrency": concurrency or main.MAX_CONCURRENT_SESSIONS, "stages": stages,
+        "sessions": summary["sessions_triggered"], "delivered": delivered,
+        "end_to_end_p50_ms": round(summary["latency_p50"] * 1e3, 2) if delivered else None,
+        "end_to_end_p95_ms": round(summary["latency_p95"] * 1e3, 2) if delivered else None,
+        "real_seconds": summary["real_seconds"],
+        "gpt_paths": summary["gpt_paths"],
+    }
+    if sessions and len(sessions) > 1:
+        result["throughput_per_sec"] = round(delivered / summary["real_seconds"], 2)
+    return result
+
+
+def load_sessions(count: int, at: dtime = dtime(10, 0)) -> dict:
+    """`count` synthetic sessions all due at the same moment — the concurrency stress case."""
+    return {f"Load {i:03d}": at for i in range(count)}
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(__file__) or ".", timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def save_results(results: list, label: str | None = None) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    revision = _git_revision()
+    path = os.path.join(RESULTS_DIR, f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"created": datetime.now().isoformat(timespec="seconds"), "revision": revision,
+                   "label": label, "scenarios": results}, f, indent=2)
+    return path
+
+
+def previous_results(exclude: str | None = None) -> dict | None:
+    paths = sorted(p for p in glob.glob(os.path.join(RESULTS_DIR, "pipeline-*.json")) if p != exclude)
+    if not paths:
+        return None
+    with open(paths[-1], "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def print_results(results: list, baseline: dict | None = None):
+    before = {s["scenario"]: s for s in (baseline or {}).get("scenarios", [])}
+    for result in results:
+        line = f"\n📊 {result['scenario']} ({result['loop']}, concurrency {result['concurrency']}): " \
+               f"{result['delivered']}/{result['sessions']} delivered"
+        if result.get("throughput_per_sec"):
+            line += f" | {result['throughput_per_sec']} reports/s"
+        if result["end_to_end_p50_ms"] is not None:
+            line += f" | end-to-end p50 {result['end_to_end_p50_ms']:.0f} ms p95 {result['end_to_end_p95_ms']:.0f} ms"
+        print(line)
+        if len(result.get("gpt_paths") or {}) > 1:
+            print(f"{'GPT answers':>16} " + ", ".join(f"{path} {s['wins']} (p95 {s['p95'] * 1e3:.0f} ms)"
+                                                      for path, s in result["gpt_paths"].items()))
+        print(f"{'stage':>16} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  vs previous p95")
+        old_stages = before.get(result["scenario"], {}).get("stages", {})
+        for stage, stats in result["stages"].items():
+            delta = ""
+            old = old_stages.get(stage)
+            if old and old["p95_ms"]:
+                change = stats["p95_ms"] / old["p95_ms"] - 1
+                delta = f"{change:+.0%}" + (" ⚠️ regression" if change > REGRESSION_THRESHOLD else "")
+            print(f"{stage:>16} {stats['count']:>6} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} "
+                  f"{stats['p99_ms']:>9.2f}  {delta}")
+
+
+def run_benchmark(days: float = 3, load: int = 24, gpt_latency: float = 0.25, telegram_latency: float = 0.03,
+                  oanda_latency: float = 0.05, error_rate: float = 0.0, label: str | None = None) -> list:
+    start = datetime(2025, 10, 20, tzinfo=LOCAL_TZ)
+    stubs = {"gpt_latency": gpt_latency, "telegram_latency": telegram_latency,
+             "oanda_latency": oanda_latency, "error_rate": error_rate}
+    results = [
+        run_scenario("schedule-async", start, days, **stubs),
+        run_scenario("schedule-sync", start, days, sync=True, **stubs),
+    ]
+    for concurrency in (1, 4, 16):
+        results.append(run_scenario(f"load-{load}-c{concurrency}", start, 1, sessions=load_sessions(load),
+                                    concurrency=concurrency, **stubs))
+
+    # 🏁 Slow-tail primary model, with and without the hedge to the faster model
+    tail = {**stubs, "gpt_options": {"model_latency": {GPT_HEDGE_MODEL: gpt_latency}, "slow_rate": GPT_TAIL_RATE,
+                                      "slow_latency": GPT_TAIL_SEC}}
+    results.append(run_scenario("gpt-tail-hedged", start, days, **tail))
+    results.append(run_scenario("gpt-tail-unhedged", start, days, patches=[(gpt_analysis, "ENABLE_GPT_HEDGING", False)],
+                                **tail))
+
+    baseline = previous_results()
+    path = save_results(results, label)
+    print_results(results, baseline)
+    print(f"\n💾 Saved {path}" + (f" (compared with {baseline['created']}, {baseline['revision']})" if baseline else ""))
+    return results
+
+
+# 🟢 Direct Execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency of the session pipeline against local stubs.")
+    parser.add_argument("--days", type=float, default=3, help="replayed schedule length")
+    parser.add_argument("--load", type=int, default=24, help="sessions due at once in the throughput scenarios")
+    parser.add_argument("--gpt-latency", type=float, default=0.25)
+    parser.add_argument("--telegram-latency", type=float, default=0.03)
+    parser.add_argument("--oanda-latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub responses that are HTTP 500")
+    parser.add_argument("--label", help="stored with the results, e.g. a branch name")
+    args = parser.parse_args()
+    run_benchmark(args.days, args.load, args.gpt_latency, args.telegram_latency, args.oanda_latency,
+                  args.error_rate, args.label)
@@ -0,0 +1,117 @@
+# bench_startup.py
+# ⏱️ Cold-start import benchmark — `python -X importtime` per entry point, in fresh interpreters, against a budget
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from bench_pipeline import RESULTS_DIR, _git_revision
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 🎯 Entry point → (import budget in ms, modules it must never load)
+ENTRY_POINTS = {
+    "main": (250, ("openai",)),
+    "test": (250, ("openai",)),
+    "log_index": (60, ("openai", "httpx", "numpy")),
+    "session_tracker": (80, ("openai", "httpx", "numpy")),
+}
+HEAVIEST_SHOWN = 6
+
+
+def _parse_importtime(stderr: str) -> list:
+    """(module, self µs, cumulative µs, nesting depth) per `-X importtime` line."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def measure(module: str, forbidden: tuple = ()) -> dict:
+    """Imports `module` in a fresh interpreter: its cumulative import time, process wall time and forbidden leaks."""
+    probe = f"import sys, {module}; print(','.join(m for m in {list(forbidden)!r} if m in sys.modules))"
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", probe], capture_output=True, text=True,
+                         cwd=HERE, env=env, timeout=60)
+    wall = time.perf_counter() - start
+    if out.returncode:
+        raise RuntimeError(f"import {module} failed:\n{out.stderr.strip().splitlines()[-1]}")
+
+    rows = _parse_importtime(out.stderr)
+    entry = next(r for r in reversed(rows) if r[0] == module and r[3] == 0)
+    packages = [r for r in rows if "." not in r[0] and r[0] != module and r[3] > 0]
+    return {
+        "import_ms": entry[2] / 1e3,
+        "wall_ms": wall * 1e3,
+        "modules": len(rows),
+        "leaked": [m for m in out.stdout.strip().split(",") if m],
+        "heaviest": [(name, round(cum / 1e3, 1)) for name, _, cum, _ in
+                     sorted(packages, key=lambda r: r[2], reverse=True)[:HEAVIEST_SHOWN]],
+    }
+
+
+def _previous_run() -> dict:
+    paths = sorted(glob.glob(os.path.join(RESULTS_DIR, "startup-*.json")))
+    if not paths:
+        return {}
+    with open(paths[-1], "r", encoding="utf-8") as f:
+        return {r["module"]: r for r in json.load(f)["entry_points"]}
+
+
+def run_benchmark(repeats: int = 5, modules: list | None = None, label: str | None = None) -> bool:
+    """Median of `repeats` cold imports per entry point; True when every budget and forbidden-module rule holds."""
+    results, ok = [], True
+    previous = _previous_run()
+    for module in modules or ENTRY_POINTS:
+        budget, forbidden = ENTRY_POINTS.get(module, (None, ()))
+        runs = [measure(module, forbidden) for _ in range(repeats)]
+        import_ms = statistics.median(r["import_ms"] for r in runs)
+        result = {
+            "module": module, "budget_ms": budget,
+            "import_ms": round(import_ms, 1),
+            "wall_ms": round(statistics.median(r["wall_ms"] for r in runs), 1),
+            "modules": runs[-1]["modules"],
+            "leaked": runs[-1]["leaked"],
+            "heaviest": runs[-1]["heaviest"],
+        }
+        over = budget is not None and import_ms > budget
+        ok &= not over and not result["leaked"]
+        results.append(result)
+
+        status = "⚠️ over budget" if over else "✅"
+        before = previous.get(module)
+        delta = f" ({import_ms - before['import_ms']:+.1f} vs previous)" if before else ""
+        print(f"{module:>16} import {import_ms:7.1f} ms{delta} (budget {budget or '-'}) | "
+              f"process {result['wall_ms']:7.1f} ms | {result['modules']} modules {status}")
+        if result["leaked"]:
+            print(f"{'':>16} ❌ loads {', '.join(result['leaked'])}")
+        print(f"{'':>16} heaviest: " + ", ".join(f"{name} {ms} ms" for name, ms in result["heaviest"]))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"startup-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"created": datetime.now().isoformat(timespec="seconds"), "revision": _git_revision(),
+                   "label": label, "python": sys.version.split()[0], "entry_points": results}, f, indent=2)
+    print(f"\n💾 Saved {path}")
+    return ok
+
+
+# 🟢 Direct Execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start import time per entry point (python -X importtime).")
+    parser.add_argument("modules", nargs="*", help=f"entry modules (default: {', '.join(ENTRY_POINTS)})")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--label", help="stored with the results, e.g. a branch name")
+    args = parser.parse_args()
+    sys.exit(0 if run_benchmark(args.repeats, args.modules, args.label) else 1)
@@ -0,0 +1,116 @@
+# candles.py
+# 🕯️ Columnar candle container — float64 OHLC, int volume, datetime64 time (struct-of-arrays)
+
+import numpy as np
+from datetime import datetime, timezone
+
+DEFAULT_DECIMALS = 3  # XAU/USD mid prices are quoted to 3 decimals
+
+
+class Candles:
+    """
+    Struct-of-arrays view of a candle window, parsed once from the OANDA response.
+
+    Slicing (`candles[-100:]`) returns another Candles that shares the same
+    underlying arrays, so handlers can take their window without copying.
+    Integer indices return a one-candle window.
+    """
+
+    __slots__ = ("time", "open", "high", "low", "close", "volume", "decimals")
+
+    def __init__(self, time, open, high, low, close, volume, decimals: int = DEFAULT_DECIMALS):
+        self.time = time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.decimals = decimals
+
+    # ───────────────── Construction ─────────────────
+    @classmethod
+    def empty(cls, decimals: int = DEFAULT_DECIMALS) -> "Candles":
+        f = np.empty(0, dtype=np.float64)
+        return cls(np.empty(0, dtype="datetime64[ns]"), f, f, f, f, np.empty(0, dtype=np.int64), decimals)
+
+    @classmethod
+    def from_oanda(cls, raw: list) -> "Candles":
+        """Builds the arrays from OANDA candle dicts (midpoint prices as strings)."""
+        if not raw:
+            return cls.empty()
+
+        mids = [c["mid"] for c in raw]
+        ohlc = np.array([(m["o"], m["h"], m["l"], m["c"]) for m in mids], dtype=np.float64).reshape(-1, 4)
+        return cls(
+            np.array([c["time"].rstrip("Z") for c in raw], dtype="datetime64[ns]"),
+            ohlc[:, 0], ohlc[:, 1], ohlc[:, 2], ohlc[:, 3],
+            np.fromiter((c.get("volume", 0) for c in raw), dtype=np.int64, count=len(raw)),
+            len(mids[0]["o"].partition(".")[2]) or DEFAULT_DECIMALS,
+        )
+
+    @classmethod
+    def concat(cls, parts: list) -> "Candles":
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        return cls(
+            np.concatenate([p.time for p in parts]),
+            np.concatenate([p.open for p in parts]),
+            np.concatenate([p.high for p in parts]),
+            np.concatenate([p.low for p in parts]),
+            np.concatenate([p.close for p in parts]),
+            np.concatenate([p.volume for p in parts]),
+            max(p.decimals for p in parts),
+        )
+
+    # ───────────────── Container protocol ─────────────────
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def __getitem__(self, key) -> "Candles":
+        if isinstance(key, (int, np.integer)):
+            key = slice(key, key + 1 or None)
+        return Candles(
+            self.time[key], self.open[key], self.high[key], self.low[key],
+            self.close[key], self.volume[key], self.decimals
+        )
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return "Candles(0)"
+        return f"Candles({len(self)}, {self.time[0]} → {self.time[-1]})"
+
+    # ───────────────── Time helpers ─────────────────
+    def last_time(self) -> datetime:
+        """Start time of the newest candle as an aware UTC datetime."""
+        return self.time[-1].astype("datetime64[us]").item().replace(tzinfo=timezone.utc)
+
+    def oanda_times(self) -> list:
+        """Times in OANDA's RFC3339 format (for `from` parameters and round-trips)."""
+        return [t + "Z" for t in np.datetime_as_string(self.time, unit="ns")]
+
+    # ───────────────── Serialization ─────────────────
+    def to_prompt_lines(self) -> str:
+        """One `time | O: H: L: C:` line per candle, formatted in a single pass."""
+        if not len(self):
+            return ""
+        fmt = "%sZ | O:{0} H:{0} L:{0} C:{0}".format(f"%.{self.decimals}f")
+        times = np.datetime_as_string(self.time, unit="s").tolist()
+        return "\n".join(map(
+            fmt.__mod__,
+            zip(times, self.open.tolist(), self.high.tolist(), self.low.tolist(), self.close.tolist())
+        ))
+
+    def to_oanda(self) -> list:
+        """Back to OANDA-shaped dicts (for code that still expects the raw JSON)."""
+        d = self.decimals
+        return [
+            {"complete": True, "volume": v, "time": t,
+             "mid": {"o": f"{o:.{d}f}", "h": f"{h:.{d}f}", "l": f"{l:.{d}f}", "c": f"{c:.{d}f}"}}
+            for t, o, h, l, c, v in zip(
+                self.oanda_times(), self.open.tolist(), self.high.tolist(),
+                self.low.tolist(), self.close.tolist(), self.volume.tolist()
+            )
+        ]
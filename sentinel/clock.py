@@ -0,0 +1,22 @@
+# clock.py
+# 🕰️ Process-wide UTC clock — wall time in production, a simulated clock in replays (replay.py)
+
+from datetime import datetime, timezone
+
+
+def wall_clock() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+_now = wall_clock
+
+
+def utc_now() -> datetime:
+    """Current time as an aware UTC datetime, from whichever clock is installed."""
+    return _now()
+
+
+def set_clock(clock=None):
+    """Installs `clock` (a callable returning aware UTC datetimes); None restores the wall clock."""
+    global _now
+    _now = clock or wall_clock
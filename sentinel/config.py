@@ -1,4 +1,6 @@
 import os
+import platform
+import re
 from datetime import datetime, time
 from dotenv import load_dotenv
 from zoneinfo import ZoneInfo
@@ -16,6 +18,10 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 # 🧠 GPT model selection (default = gpt-4o)
 GPT_MODEL = os.getenv("GPT_MODEL", "gpt-4o")
 
+# 🔌 API base URLs (override to point at local stand-in services)
+GPT_API_BASE = os.getenv("GPT_API_BASE")  # None → OpenAI default
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+
 # ✅ Session schedule (times are in CEST – Central European Summer Time)
 SESSIONS = {
     # Forecast and Review
@@ -69,7 +75,61 @@ SESSION_WINDOWS = {
 
 # 🔁 Loop and logging control
 SESSION_ALERT_DELAY_SEC = 15
+MAX_CONCURRENT_SESSIONS = 4  # session pipelines allowed in flight at once (asyncio runner)
+SESSION_WARMUP_LEAD_SEC = 60  # connections, candles and report frame are prepared this long before a session
+
+# 🧺 Session batching: summaries due together go to GPT as one request
+SESSION_BATCH_WINDOW_SEC = 0  # also pull in sessions due up to this long after the first (they are sent early)
+MAX_BATCHED_SESSIONS = 3
+
+# 📝 Streaming reports: first section goes out as soon as it's written, later ones are edited in
+ENABLE_GPT_STREAMING = os.getenv("ENABLE_GPT_STREAMING", "false").lower() == "true"
+TELEGRAM_EDIT_MIN_INTERVAL_SEC = 1.5
+
+# 📮 Outbound Telegram queue: alerts are spooled to disk and sent by a background thread
+ENABLE_TELEGRAM_QUEUE = os.getenv("ENABLE_TELEGRAM_QUEUE", "true").lower() == "true"
+TELEGRAM_SPOOL_DIR = os.getenv("TELEGRAM_SPOOL_DIR", os.path.join(os.path.dirname(__file__), "telegram_spool"))
+TELEGRAM_GLOBAL_RATE_PER_SEC = 25   # Telegram allows ~30 messages/s per bot
+TELEGRAM_CHAT_RATE_PER_SEC = 1      # ~1 message/s per chat (groups: 20/min)
+TELEGRAM_CHAT_BURST = 3
+TELEGRAM_RETRY_BASE_SEC = 2         # exponential backoff for network errors / 5xx
+TELEGRAM_RETRY_MAX_SEC = 300
+TELEGRAM_MAX_ATTEMPTS = 8
+
+# 🗃️ Job queue: due sessions become SQLite jobs; any number of worker processes claim them under expiring leases
+ENABLE_JOB_QUEUE = os.getenv("ENABLE_JOB_QUEUE", "false").lower() == "true"
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(os.path.dirname(__file__), "job_queue.sqlite"))
+WORKER_ID = os.getenv("WORKER_ID") or f"{platform.node()}-{os.getpid()}"
+JOB_LEASE_SEC = 90       # a crashed worker's job is claimed by another this long after its last heartbeat
+JOB_HEARTBEAT_SEC = 20   # lease renewal interval while a pipeline runs
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BASE_SEC = 15  # backoff before an undelivered job is retried (doubles per attempt)
+JOB_MAX_DELAY_SEC = 30 * 60  # jobs still undelivered this long after their deadline are dropped as stale
+if ENABLE_JOB_QUEUE:
+    # Workers never share a spool (same file names, each replaying the other's chunks): one subdirectory each.
+    # Set a stable WORKER_ID to replay a worker's spool after a restart; otherwise the job queue resends the report
+    TELEGRAM_SPOOL_DIR = os.path.join(TELEGRAM_SPOOL_DIR, re.sub(r"[^\w.-]", "_", WORKER_ID))
+
+# 📣 Broadcast: every report is also fanned out to these subscriber chats/channels
+TELEGRAM_BROADCAST_CHAT_IDS = os.getenv("TELEGRAM_BROADCAST_CHAT_IDS", "")  # comma-separated
+TELEGRAM_BROADCAST_FILE = os.getenv("TELEGRAM_BROADCAST_FILE")  # one chat ID per line
+BROADCAST_MAX_WORKERS = 32  # chats in flight at once
+BROADCAST_MAX_ATTEMPTS = 4
 ENABLE_LOGGING = True
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if ENABLE_LOGGING else "INFO").upper()  # DEBUG lines cost nothing above DEBUG
+
+# 📈 Metrics: Prometheus text on http://METRICS_HOST:METRICS_PORT/metrics, recent spans on /traces
+ENABLE_METRICS_SERVER = os.getenv("ENABLE_METRICS_SERVER", "false").lower() == "true"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+TRACE_BUFFER_SIZE = 500  # finished spans kept for /traces
+
+# 🗂️ Log writer: records are batched by a background thread, files rotated + gzipped past the size limit
+LOG_FLUSH_INTERVAL_SEC = 1.0
+LOG_BATCH_SIZE = 200
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_INDEX_PATH = os.path.join(os.path.dirname(__file__), "logs", "log_index.sqlite")  # FTS index (log_index.py)
+LOG_INDEX_ON_WRITE = True  # index new summaries as the log writer appends them
 
 # 🧭 OANDA account and feed configuration
 OANDA_ACCOUNT_TYPE = os.getenv("OANDA_ACCOUNT_TYPE", "practice")  # or 'live'
@@ -78,11 +138,69 @@ OANDA_DOMAIN = (
     if OANDA_ACCOUNT_TYPE == "practice"
     else "https://api-fxtrade.oanda.com"
 )
+OANDA_STREAM_DOMAIN = (
+    "https://stream-fxpractice.oanda.com"
+    if OANDA_ACCOUNT_TYPE == "practice"
+    else "https://stream-fxtrade.oanda.com"
+)
 
 INSTRUMENT = "XAU_USD"
 GRANULARITY = "M5"
 
-# 🚨 Required .env variables validation
+# 🌐 Instruments analysed every session (comma-separated override, e.g. "XAU_USD,XAG_USD,NAS100_USD,EUR_USD")
+INSTRUMENTS = [i.strip() for i in os.getenv("INSTRUMENTS", INSTRUMENT).split(",") if i.strip()]
+MAX_CONCURRENT_INSTRUMENTS = 4  # instrument pipelines in flight at once (sync runner; asyncio shares MAX_CONCURRENT_SESSIONS)
+INSTRUMENT_ASSET_NAMES = {"XAU_USD": "gold", "XAG_USD": "silver"}  # wording in the GPT system prompts
+
+# 🗃️ In-process candle cache (ring buffer size per instrument/granularity)
+CANDLE_CACHE_SIZE = 500
+
+# 📐 Prompt content: feature digest + short candle tail instead of the full raw window
+ENABLE_FEATURE_DIGEST = True
+FEATURE_TAIL_CANDLES = 24
+
+# 🧭 Higher-timeframe context: bars resampled locally from the GRANULARITY window (resample.py) — no extra requests
+ENABLE_HTF_CONTEXT = os.getenv("ENABLE_HTF_CONTEXT", "false").lower() == "true"
+HTF_CONTEXT_BARS = {"M15": 8, "H1": 6, "H4": 6, "D": 3}  # timeframe → recent bars shown in the prompt
+
+# 🔡 Candle encoding inside GPT prompts: "delta" (base price + tick offsets) or "full" (absolute lines)
+PROMPT_ENCODING = os.getenv("PROMPT_ENCODING", "delta")
+PROMPT_DELTA_DECIMALS = None  # tick precision override; None → the instrument's own quote precision
+PROMPT_MAX_CANDLES = 120
+PROMPT_CANDLE_BUDGET_SHARE = 0.25  # share of the model's context window raw candles may use
+
+# 🗄️ GPT response cache (identical model + prompts + temperature → reuse the answer)
+ENABLE_GPT_CACHE = True
+GPT_CACHE_DIR = os.path.join(os.path.dirname(__file__), "gpt_cache")
+GPT_CACHE_TTL_SEC = 60 * 60
+GPT_CACHE_MEMORY_ENTRIES = 64
+GPT_CACHE_MAX_DISK_ENTRIES = 500
+
+# 🏁 GPT latency budget and hedging: once the primary model is slower than it usually is, a faster model races it
+GPT_LATENCY_BUDGET_SEC = 45  # whole GPT stage per report — attempts, hedges and backoff
+GPT_SESSION_BUDGET_SEC = {"London Open": 25, "New York Open": 25}  # tighter budgets for the busiest opens
+ENABLE_GPT_HEDGING = os.getenv("ENABLE_GPT_HEDGING", "true").lower() == "true"
+GPT_HEDGE_MODEL = os.getenv("GPT_HEDGE_MODEL", "gpt-4o-mini")  # also takes the retries after a failed attempt
+GPT_HEDGE_PERCENTILE = 0.9  # hedge once the primary runs past this percentile of its recent latencies
+GPT_HEDGE_DEFAULT_DELAY_SEC = 12  # until GPT_HEDGE_MIN_SAMPLES answers are recorded
+GPT_HEDGE_MIN_DELAY_SEC = 2
+GPT_HEDGE_MIN_SAMPLES = 20
+GPT_LATENCY_WINDOW = 200  # recent answers kept per model
+
+# 🌐 Shared HTTP transport (keep-alive pools for OANDA + Telegram)
+HTTP_CONNECT_TIMEOUT_SEC = 5
+HTTP_READ_TIMEOUT_SEC = 20
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+HTTP_KEEPALIVE_EXPIRY_SEC = 120
+
+# 📡 Live pricing stream (builds candles locally between session triggers)
+ENABLE_PRICE_STREAM = os.getenv("ENABLE_PRICE_STREAM", "false").lower() == "true"
+PRICE_STREAM_HEARTBEAT_TIMEOUT_SEC = 20  # OANDA sends a heartbeat every 5s
+PRICE_STREAM_RECONNECT_MAX_SEC = 60
+PRICE_STREAM_RECORD_PATH = os.getenv("PRICE_STREAM_RECORD_PATH")  # optional tick recording for offline replay
+
+# 🚨 Required .env variables validation — run by the entry points (and before building an API client),
+# so tools that never talk to the APIs (log search, scheduler dry-run) start without credentials
 REQUIRED_ENV_VARS = {
     "OANDA_API_KEY": OANDA_API_KEY,
     "OANDA_ACCOUNT_ID": OANDA_ACCOUNT_ID,
@@ -91,12 +209,16 @@ REQUIRED_ENV_VARS = {
     "TELEGRAM_CHAT_ID": TELEGRAM_CHAT_ID,
 }
 
-missing_vars = [key for key, val in REQUIRED_ENV_VARS.items() if not val or "xxx" in val.lower()]
-if missing_vars:
-    raise EnvironmentError(
-        f"❌ Missing or invalid environment variables: {', '.join(missing_vars)}\n"
-        "Please check your .env file and complete all required variables."
-    )
+
+def validate_env(names=None):
+    """Raises EnvironmentError listing every missing/placeholder variable among `names` (default: all required)."""
+    missing_vars = [key for key in (names or REQUIRED_ENV_VARS)
+                    if not REQUIRED_ENV_VARS.get(key) or "xxx" in REQUIRED_ENV_VARS[key].lower()]
+    if missing_vars:
+        raise EnvironmentError(
+            f"❌ Missing or invalid environment variables: {', '.join(missing_vars)}\n"
+            "Please check your .env file and complete all required variables."
+        )
 
 # 🛡 Validation: Ensure SESSIONS times are datetime.time objects
 for s_name, s_time in SESSIONS.items():
@@ -0,0 +1,160 @@
+# features.py
+# 📐 Vectorized market-structure features — computed in one pass over a Candles window
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from candles import Candles
+
+ATR_PERIOD = 14
+SWING_LOOKBACK = 2          # fractal: bars on each side that must be lower/higher
+VOLUME_SPIKE_Z = 2.0
+MAX_LISTED = 3              # levels/events listed per digest line
+
+
+def _atr(c: Candles, period: int = ATR_PERIOD) -> float:
+    prev_close = np.concatenate(([c.close[0]], c.close[:-1]))
+    tr = np.maximum(c.high - c.low, np.maximum(np.abs(c.high - prev_close), np.abs(c.low - prev_close)))
+    return float(tr[-period:].mean())
+
+
+def _swings(c: Candles, n: int = SWING_LOOKBACK):
+    """Boolean masks of fractal swing highs/lows (confirmed `n` bars later)."""
+    highs = np.zeros(len(c), dtype=bool)
+    lows = np.zeros(len(c), dtype=bool)
+    if len(c) < 2 * n + 1:
+        return highs, lows
+    hw = sliding_window_view(c.high, 2 * n + 1)
+    lw = sliding_window_view(c.low, 2 * n + 1)
+    highs[n:-n] = hw[:, n] > np.delete(hw, n, axis=1).max(axis=1)
+    lows[n:-n] = lw[:, n] < np.delete(lw, n, axis=1).min(axis=1)
+    return highs, lows
+
+
+def _last_level(mask: np.ndarray, levels: np.ndarray, lag: int) -> np.ndarray:
+    """For every bar, the most recent swing level already confirmed at that bar (NaN before the first)."""
+    if lag >= len(mask):
+        return np.full(len(mask), np.nan)  # window too short for any swing to be confirmed
+    idx = np.where(mask, np.arange(len(mask)), -1)
+    idx = np.maximum.accumulate(idx)
+    # a swing at i is only known at i + lag
+    idx = np.concatenate((np.full(lag, -1), idx[:-lag])) if lag else idx
+    out = np.full(len(mask), np.nan)
+    known = idx >= 0
+    out[known] = levels[idx[known]]
+    return out
+
+
+def _fvgs(c: Candles):
+    """Unfilled fair-value gaps as (kind, bottom, top, index) tuples, newest first."""
+    if len(c) < 3:
+        return []
+    gaps = []
+    bull = np.nonzero(c.low[2:] > c.high[:-2])[0] + 2
+    bear = np.nonzero(c.high[2:] < c.low[:-2])[0] + 2
+
+    # suffix extremes after each bar decide whether price came back into the gap
+    later_low = np.append(np.minimum.accumulate(c.low[::-1])[::-1][1:], np.inf)
+    later_high = np.append(np.maximum.accumulate(c.high[::-1])[::-1][1:], -np.inf)
+
+    for i in bull[later_low[bull] > c.high[bull - 2]]:
+        gaps.append(("bull", c.high[i - 2], c.low[i], i))
+    for i in bear[later_high[bear] < c.low[bear - 2]]:
+        gaps.append(("bear", c.high[i], c.low[i - 2], i))
+    return sorted(gaps, key=lambda g: g[3], reverse=True)
+
+
+def compute_features(candles: Candles) -> dict:
+    """Session range, ATR, swings, FVGs, volume z-scores, sweeps and BOS/CHoCH for one window."""
+    c = candles
+    n = len(c)
+    if n == 0:
+        return {}
+
+    hi_idx = int(np.argmax(c.high))
+    lo_idx = int(np.argmin(c.low))
+
+    swing_hi, swing_lo = _swings(c)
+    prev_hi = _last_level(swing_hi, c.high, SWING_LOOKBACK)
+    prev_lo = _last_level(swing_lo, c.low, SWING_LOOKBACK)
+
+    with np.errstate(invalid="ignore"):
+        # Sweeps: wick through the last swing level, close back inside
+        sweep_hi = (c.high > prev_hi) & (c.close < prev_hi)
+        sweep_lo = (c.low < prev_lo) & (c.close > prev_lo)
+
+        # Breaks: first close beyond the last swing level
+        prev_close = np.concatenate(([np.nan], c.close[:-1]))
+        break_up = (c.close > prev_hi) & ~(prev_close > prev_hi)
+        break_dn = (c.close < prev_lo) & ~(prev_close < prev_lo)
+
+    direction = np.where(break_up, 1, np.where(break_dn, -1, 0))
+    break_idx = np.nonzero(direction)[0]
+    break_dir = direction[break_idx]
+    # CHoCH = break against the previous break's direction, BOS = with it
+    choch = np.concatenate(([False], break_dir[1:] != break_dir[:-1])) if len(break_dir) else break_dir.astype(bool)
+
+    vol = c.volume.astype(np.float64)
+    std = vol.std()
+    vol_z = (vol - vol.mean()) / std if std else np.zeros(n)
+
+    # Trend: least-squares slope of closes, per candle
+    slope = float(np.polyfit(np.arange(n), c.close, 1)[0]) if n > 1 else 0.0
+
+    return {
+        "count": n,
+        "open": float(c.open[0]),
+        "close": float(c.close[-1]),
+        "high": float(c.high[hi_idx]), "high_idx": hi_idx,
+        "low": float(c.low[lo_idx]), "low_idx": lo_idx,
+        "atr": _atr(c),
+        "slope": slope,
+        "swing_highs": np.nonzero(swing_hi)[0],
+        "swing_lows": np.nonzero(swing_lo)[0],
+        "fvgs": _fvgs(c),
+        "vol_z": vol_z,
+        "vol_spikes": np.nonzero(vol_z >= VOLUME_SPIKE_Z)[0],
+        "sweeps_high": np.nonzero(sweep_hi)[0], "sweep_high_levels": prev_hi,
+        "sweeps_low": np.nonzero(sweep_lo)[0], "sweep_low_levels": prev_lo,
+        "breaks": list(zip(break_idx.tolist(), break_dir.tolist(), choch.tolist())),
+    }
+
+
+def format_feature_digest(candles: Candles, features: dict | None = None) -> str:
+    """Compact text digest of the computed features for the GPT prompt."""
+    f = features if features is not None else compute_features(candles)
+    if not f:
+        return ""
+
+    d = candles.decimals
+    t = lambda i: str(candles.time[i])[11:16]
+    p = lambda x: f"{x:.{d}f}"
+
+    def levels(idxs, arr):
+        return ", ".join(f"{p(arr[i])}@{t(i)}" for i in idxs[::-1][:MAX_LISTED]) or "none"
+
+    change = f["close"] - f["open"]
+    recent_z = float(f["vol_z"][-12:].mean())
+
+    lines = [
+        f"WINDOW: {f['count']} candles {str(candles.time[0])[:16]} → {str(candles.time[-1])[:16]} UTC",
+        f"RANGE: high {p(f['high'])}@{t(f['high_idx'])} | low {p(f['low'])}@{t(f['low_idx'])} | "
+        f"range {p(f['high'] - f['low'])} | open {p(f['open'])} → close {p(f['close'])} ({change:+.{d}f})",
+        f"TREND: slope {f['slope']:+.{d}f}/candle | ATR({ATR_PERIOD}) {p(f['atr'])}",
+        f"SWING HIGHS: {levels(f['swing_highs'], candles.high)}",
+        f"SWING LOWS: {levels(f['swing_lows'], candles.low)}",
+        "FVG (unfilled): " + (", ".join(
+            f"{kind} {p(bottom)}–{p(top)}@{t(i)}" for kind, bottom, top, i in f["fvgs"][:MAX_LISTED]
+        ) or "none"),
+        "SWEEPS: " + (", ".join(
+            [f"buy-side {p(f['sweep_high_levels'][i])}@{t(i)}" for i in f["sweeps_high"][::-1][:MAX_LISTED]] +
+            [f"sell-side {p(f['sweep_low_levels'][i])}@{t(i)}" for i in f["sweeps_low"][::-1][:MAX_LISTED]]
+        ) or "none"),
+        "STRUCTURE: " + (", ".join(
+            f"{'CHoCH' if ch else 'BOS'} {'up' if dr > 0 else 'down'}@{t(i)}" for i, dr, ch in f["breaks"][::-1][:MAX_LISTED]
+        ) or "none"),
+        f"VOLUME: last-12 z {recent_z:+.1f} | spikes: " + (", ".join(
+            f"{t(i)} z={f['vol_z'][i]:.1f}" for i in f["vol_spikes"][::-1][:MAX_LISTED]
+        ) or "none"),
+    ]
+    return "\n".join(lines)
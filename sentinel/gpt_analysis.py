@@ -1,13 +1,49 @@
 # gpt_analysis.py
 # 🧠 Generates concise sniper-level GPT summaries with final Telegram-ready formatting
 
+import asyncio
+import threading
 import time
-from openai import OpenAI
-from config import GPT_API_KEY, ENABLE_LOGGING, GPT_MODEL
-from prompt_formatter import format_spectral_summary
-
-# 🔐 OpenAI client
-client = OpenAI(api_key=GPT_API_KEY)
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from config import (
+    validate_env, GPT_API_KEY, GPT_API_BASE, GPT_MODEL, ENABLE_FEATURE_DIGEST, FEATURE_TAIL_CANDLES, ENABLE_GPT_CACHE,
+    MAX_BATCHED_SESSIONS, INSTRUMENT, INSTRUMENT_ASSET_NAMES, ENABLE_HTF_CONTEXT, HTF_CONTEXT_BARS,
+    GPT_LATENCY_BUDGET_SEC, GPT_SESSION_BUDGET_SEC, ENABLE_GPT_HEDGING, GPT_HEDGE_MODEL, GPT_HEDGE_PERCENTILE,
+    GPT_HEDGE_DEFAULT_DELAY_SEC, GPT_HEDGE_MIN_DELAY_SEC, GPT_HEDGE_MIN_SAMPLES, GPT_LATENCY_WINDOW
+)
+from candles import Candles
+from features import format_feature_digest
+from prompt_encoder import candle_cap, encode_candles
+from resample import resample_many
+from gpt_cache import cache_key, get_gpt_cache
+from instrumentation import (
+    GPT_CACHE, GPT_COMPLETION_SECONDS, GPT_EMPTY_OUTPUTS, GPT_HEDGES, GPT_WINS, RETRIES, get_logger, span, traced
+)
+from log_writer import log_event
+from prompt_formatter import format_spectral_summary, instrument_label, split_batched_reports
+
+# 🔐 OpenAI clients (blocking + asyncio) — built on first use, so importing this module never loads the SDK
+client = None
+async_client = None
+
+
+def get_client():
+    global client
+    if client is None:
+        from openai import OpenAI
+        validate_env(["GPT_API_KEY"])
+        client = OpenAI(api_key=GPT_API_KEY, base_url=GPT_API_BASE)
+    return client
+
+
+def get_async_client():
+    global async_client
+    if async_client is None:
+        from openai import AsyncOpenAI
+        validate_env(["GPT_API_KEY"])
+        async_client = AsyncOpenAI(api_key=GPT_API_KEY, base_url=GPT_API_BASE)
+    return async_client
 
 # 📏 Model token capacities (approx.)
 MODEL_CAPACITY = {
@@ -17,52 +53,433 @@ MODEL_CAPACITY = {
 }
 DEFAULT_CAPACITY = 8192
 
-# 🔁 GPT chat completion with dynamic token budget
-def chat_completion(user_text: str, system_prompt: str) -> str | None:
-    max_retries = 3
+log = get_logger("gpt")
+
+# 🧩 Request setup shared by the sync and async completions
+def _prepare_completion(user_text: str, system_prompt: str, max_output: int = 1500) -> tuple[str, dict, str | None]:
+    """Returns (cache key, create() kwargs, cached answer or None)."""
+    temperature = 0.6
     model_limit = MODEL_CAPACITY.get(GPT_MODEL, DEFAULT_CAPACITY)
 
+    # 🗄️ Re-runs on the same candle set come back from the cache without an API call
+    key = cache_key(GPT_MODEL, system_prompt, user_text, temperature)
+    cached = None
+    if ENABLE_GPT_CACHE:
+        response_cache = get_gpt_cache()
+        cached = response_cache.get(key)
+        GPT_CACHE.inc(result="hit" if cached else "miss")
+        log.debug("GPT cache %s | %s", "hit" if cached else "miss", response_cache.stats)
+
     # Reserve at least 1000–1500 tokens for output
     prompt_tokens_est = len(user_text + system_prompt) // 4
-    max_output_tokens = max(800, min(1500, model_limit - prompt_tokens_est - 50))
+    max_output_tokens = max(800, min(max_output, model_limit - prompt_tokens_est - 50))
+
+    if not cached:
+        log.debug("Prompt length (chars): %d | Est tokens: %d | Max output tokens allowed: %d",
+                  len(user_text), prompt_tokens_est, max_output_tokens)
+
+    request = {
+        "model": GPT_MODEL,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_text}
+        ],
+        "temperature": temperature,
+        "max_tokens": max_output_tokens,
+    }
+    return key, request, cached
+
+
+def _accept_content(key: str, raw_content: str | None, attempt: int, elapsed: float,
+                    model: str = GPT_MODEL) -> str | None:
+    """Strips and caches a non-empty answer; returns None for empty ones."""
+    log.debug("%s responded in %.2fs | raw output before strip: %r", model, elapsed, raw_content)
+
+    log_event("gpt_response", model=model, attempt=attempt, elapsed_sec=round(elapsed, 3),
+              chars=len(raw_content or ""))
+
+    if raw_content and raw_content.strip():
+        if ENABLE_GPT_CACHE:
+            get_gpt_cache().put(key, raw_content.strip(), model)
+        return raw_content.strip()
+
+    GPT_EMPTY_OUTPUTS.inc()
+    log.warning("⚠️ %s returned empty content on attempt %d.", model, attempt)
+    return None
+
+
+# 🏁 Latency budget and hedging — a slow primary model races a faster one, the first valid answer wins
+class LatencyTracker:
+    """
+    Recent latencies (seconds) per name, plus all-time counts. A censored sample
+    (a request abandoned before it answered) enters at its time so far — a lower
+    bound, which keeps slow answers the race never waited for in the percentiles.
+    """
+
+    def __init__(self, window: int = GPT_LATENCY_WINDOW):
+        self.window = window
+        self.totals = {}
+        self.censored = {}
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, censored: bool = False):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+            self.totals[name] = self.totals.get(name, 0) + 1
+            if censored:
+                self.censored[name] = self.censored.get(name, 0) + 1
+
+    def percentile(self, name: str, q: float, min_samples: int = 1) -> float | None:
+        """None until `min_samples` latencies are recorded for `name`."""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+model_latencies = LatencyTracker()  # one request, per model
+path_latencies = LatencyTracker()   # whole GPT stage, per winning path (primary / hedge / fallback)
+
+
+def gpt_budget(session_names: list) -> float:
+    """GPT stage budget for a report — the tightest one among sessions answered together."""
+    return min((GPT_SESSION_BUDGET_SEC.get(name, GPT_LATENCY_BUDGET_SEC) for name in session_names),
+               default=GPT_LATENCY_BUDGET_SEC)
+
+
+def _model_request(request: dict, model: str) -> dict | None:
+    """`request` sent to `model` instead, output budget fitted to its capacity; None when the prompt doesn't fit."""
+    if model == request["model"]:
+        return request
+    prompt_tokens_est = sum(len(m["content"]) for m in request["messages"]) // 4
+    room = MODEL_CAPACITY.get(model, DEFAULT_CAPACITY) - prompt_tokens_est - 50
+    if room < 800:
+        return None
+    return {**request, "model": model, "max_tokens": min(request["max_tokens"], room)}
+
+
+def hedge_delay(remaining: float) -> float:
+    """
+    How long the primary model gets before the hedge joins: its recent
+    GPT_HEDGE_PERCENTILE latency, cut so the hedge model's own usual time
+    still fits in the `remaining` budget.
+    """
+    usual = model_latencies.percentile(GPT_MODEL, GPT_HEDGE_PERCENTILE, GPT_HEDGE_MIN_SAMPLES)
+    delay = max(GPT_HEDGE_MIN_DELAY_SEC, usual if usual is not None else GPT_HEDGE_DEFAULT_DELAY_SEC)
+    hedge_usual = model_latencies.percentile(GPT_HEDGE_MODEL, GPT_HEDGE_PERCENTILE)
+    if hedge_usual is None:
+        hedge_usual = remaining / 2  # no answer from it yet — give it half of what's left
+    return max(0.0, min(delay, remaining - hedge_usual))
+
+
+def _attempt_plan(request: dict, attempt: int, remaining: float) -> list:
+    """
+    (path, request, start delay) per request of one attempt. The first attempt
+    is the primary model, hedged after hedge_delay(); a retry after a failed
+    or empty answer goes to the hedge model straight away (model fallback).
+    """
+    fallback = _model_request(request, GPT_HEDGE_MODEL) if ENABLE_GPT_HEDGING and GPT_HEDGE_MODEL != GPT_MODEL else None
+    if fallback is None:
+        return [("primary", request, 0.0)]
+    if attempt > 1:
+        return [("fallback", fallback, 0.0)]
+    return [("primary", request, 0.0), ("hedge", fallback, hedge_delay(remaining))]
+
+
+def _hedge_started(path: str, model: str, waited: float):
+    if path == "hedge":
+        GPT_HEDGES.inc()
+        log.info("🏁 Hedging %s with %s after %.1fs", GPT_MODEL, model, waited)
+
+
+def _record_win(path: str, model: str, started: float, attempt: int):
+    elapsed = time.perf_counter() - started
+    GPT_WINS.inc(path=path, model=model)
+    GPT_COMPLETION_SECONDS.observe(elapsed, path=path)
+    path_latencies.observe(path, elapsed)
+    log_event("gpt_completion", path=path, model=model, attempt=attempt, elapsed_sec=round(elapsed, 3))
+    if path != "primary":
+        log.info("🏁 %s answer from %s won after %.2fs", path, model, elapsed)
+
+
+def gpt_path_summary() -> dict:
+    """{path: wins, recent p50/p95/p99 of the GPT stage} — how often each path answers and the tail it leaves."""
+    return {
+        path: {"wins": wins, **{f"p{round(q * 100)}": round(path_latencies.percentile(path, q), 2)
+                                for q in (0.5, 0.95, 0.99)}}
+        for path, wins in sorted(path_latencies.totals.items())
+    }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _hedge_pool() -> ThreadPoolExecutor:
+    """Threads for the blocking client's racing requests."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gpt")
+        return _pool
+
+
+class _LatencySample:
+    """
+    One racing request's model latency, recorded once: in full when it answers,
+    censored when its race ends first. The same on both paths — a cancelled
+    asyncio loser and a thread-pool loser left to run out are both abandoned.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.start = time.perf_counter()
+        self._recorded = False
+        self._lock = threading.Lock()
+
+    def record(self, censored: bool = False):
+        elapsed = time.perf_counter() - self.start
+        with self._lock:
+            if self._recorded:
+                return
+            self._recorded = True
+        model_latencies.observe(self.model, elapsed, censored=censored)
+
+
+def _request(key: str, request: dict, attempt: int, timeout: float, sample: _LatencySample) -> str | None:
+    try:
+        log.debug("🧠 GPT Request [Attempt %d] — Model: %s", attempt, request["model"])
+        response = get_client().chat.completions.create(**request, timeout=timeout)
+    except Exception as e:
+        log.error("❌ GPT API Error [Attempt %d, %s]: %s", attempt, request["model"], e)
+        return None
+    elapsed = time.perf_counter() - sample.start
+    content = _accept_content(key, response.choices[0].message.content, attempt, elapsed, request["model"])
+    if content:
+        sample.record()
+    return content
+
+
+async def _request_async(key: str, request: dict, attempt: int, timeout: float, sample: _LatencySample) -> str | None:
+    try:
+        log.debug("🧠 GPT Request [Attempt %d] — Model: %s (async)", attempt, request["model"])
+        response = await get_async_client().chat.completions.create(**request, timeout=timeout)
+    except Exception as e:
+        log.error("❌ GPT API Error [Attempt %d, %s]: %s", attempt, request["model"], e)
+        return None
+    elapsed = time.perf_counter() - sample.start
+    content = _accept_content(key, response.choices[0].message.content, attempt, elapsed, request["model"])
+    if content:
+        sample.record()
+    return content
+
+
+def _race(key: str, plan: list, attempt: int, remaining: float) -> tuple:
+    """
+    Runs one attempt's plan on the thread pool → (answer, path, model), or Nones.
+    A planned request starts once its delay is up, or at once when nothing else
+    is still running. Losers can't be interrupted mid-request: their latency is
+    recorded censored when the race ends, their answers are ignored and their
+    timeout ends them within the budget.
+    """
+    start = time.perf_counter()
+    end = start + remaining
+    waiting, running = list(plan), {}
+    try:
+        while True:
+            for future, (path, model, _) in running.items():
+                if future.done() and future.result():
+                    return future.result(), path, model
+            now = time.perf_counter()
+            while waiting and (waiting[0][2] <= now - start or all(f.done() for f in running)):
+                path, request, _ = waiting.pop(0)
+                _hedge_started(path, request["model"], now - start)
+                sample = _LatencySample(request["model"])
+                future = _hedge_pool().submit(_request, key, request, attempt, max(1.0, end - now), sample)
+                running[future] = (path, request["model"], sample)
+            pending = [f for f in running if not f.done()]
+            if not pending or now >= end:
+                return None, None, None
+            wake = min(end, start + waiting[0][2]) if waiting else end
+            wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+    finally:
+        for future, (_, _, sample) in running.items():
+            if not future.done():
+                sample.record(censored=True)
+            future.cancel()
+
+
+async def _race_async(key: str, plan: list, attempt: int, remaining: float) -> tuple:
+    """Asyncio counterpart of _race(); the losing requests are cancelled (latency recorded censored)."""
+    start = time.perf_counter()
+    end = start + remaining
+    waiting, running = list(plan), {}
+    try:
+        while True:
+            for task, (path, model, _) in running.items():
+                if task.done() and task.result():
+                    return task.result(), path, model
+            now = time.perf_counter()
+            while waiting and (waiting[0][2] <= now - start or all(t.done() for t in running)):
+                path, request, _ = waiting.pop(0)
+                _hedge_started(path, request["model"], now - start)
+                sample = _LatencySample(request["model"])
+                task = asyncio.create_task(_request_async(key, request, attempt, max(1.0, end - now), sample))
+                running[task] = (path, request["model"], sample)
+            pending = [t for t in running if not t.done()]
+            if not pending or now >= end:
+                return None, None, None
+            wake = min(end, start + waiting[0][2]) if waiting else end
+            await asyncio.wait(pending, timeout=max(0.0, wake - now), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task, (_, _, sample) in running.items():
+            if not task.done():
+                sample.record(censored=True)
+            task.cancel()
+
 
+# 🔁 GPT chat completion with dynamic token budget
+def chat_completion(user_text: str, system_prompt: str, max_output: int = 1500,
+                    budget: float = GPT_LATENCY_BUDGET_SEC) -> str | None:
+    """Up to 3 attempts, hedged and retried on the fallback model, all within `budget` seconds."""
+    max_retries = 3
+    with span("gpt", model=GPT_MODEL):
+        key, request, cached = _prepare_completion(user_text, system_prompt, max_output)
+        if cached:
+            return cached
+
+        started = time.perf_counter()
+        for attempt in range(1, max_retries + 1):
+            remaining = budget - (time.perf_counter() - started)
+            if remaining <= 0:
+                log.warning("⌛ GPT budget of %ss spent after %d attempt(s)", budget, attempt - 1)
+                break
+            if attempt > 1:
+                RETRIES.inc(target="gpt")
+
+            content, path, model = _race(key, _attempt_plan(request, attempt, remaining), attempt, remaining)
+            if content:
+                _record_win(path, model, started, attempt)
+                return content
+
+            time.sleep(max(0.0, min(1.5, budget - (time.perf_counter() - started))))
+
+        return None
+
+
+# 🔁 Async GPT chat completion (asyncio session runner)
+async def chat_completion_async(user_text: str, system_prompt: str, max_output: int = 1500,
+                                budget: float = GPT_LATENCY_BUDGET_SEC) -> str | None:
+    """Same budget, cache, hedging and retries as chat_completion(), without blocking the event loop."""
+    max_retries = 3
+    with span("gpt", model=GPT_MODEL):
+        key, request, cached = _prepare_completion(user_text, system_prompt, max_output)
+        if cached:
+            return cached
+
+        started = time.perf_counter()
+        for attempt in range(1, max_retries + 1):
+            remaining = budget - (time.perf_counter() - started)
+            if remaining <= 0:
+                log.warning("⌛ GPT budget of %ss spent after %d attempt(s)", budget, attempt - 1)
+                break
+            if attempt > 1:
+                RETRIES.inc(target="gpt")
+
+            content, path, model = await _race_async(key, _attempt_plan(request, attempt, remaining), attempt,
+                                                     remaining)
+            if content:
+                _record_win(path, model, started, attempt)
+                return content
+
+            await asyncio.sleep(max(0.0, min(1.5, budget - (time.perf_counter() - started))))
+
+        return None
+
+
+# 📝 Streaming GPT completion — yields text as the model writes it
+async def stream_completion_async(user_text: str, system_prompt: str, budget: float = GPT_LATENCY_BUDGET_SEC):
+    """
+    Async generator over content deltas. A cached answer is yielded in one piece;
+    a complete streamed answer is stored in the cache. Retries only before the first
+    delta, and only within `budget` seconds: attempts, backoff and the wait for the
+    first delta count against it. Once text is flowing the stream is never cut short.
+    """
+    max_retries = 3
+    key, request, cached = _prepare_completion(user_text, system_prompt)
+    if cached:
+        yield cached
+        return
+
+    deadline = time.perf_counter() + budget
     for attempt in range(1, max_retries + 1):
+        if time.perf_counter() >= deadline:
+            log.warning("⌛ GPT budget of %ss spent after %d attempt(s)", budget, attempt - 1)
+            return
+        if attempt > 1:
+            RETRIES.inc(target="gpt")
+        start = time.perf_counter()
+        first_token_at = None
+        parts = []
+        stream = None
         try:
-            if ENABLE_LOGGING:
-                print(f"\n🧠 GPT Request [Attempt {attempt}] — Model: {GPT_MODEL}")
-                print(f"DEBUG — Prompt length (chars): {len(user_text)} | Est tokens: {prompt_tokens_est}")
-                print(f"DEBUG — Max output tokens allowed: {max_output_tokens}")
-
-            response = client.chat.completions.create(
-                model=GPT_MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_text}
-                ],
-                temperature=0.6,
-                max_tokens=max_output_tokens
-            )
-
-            raw_content = response.choices[0].message.content
-            if ENABLE_LOGGING:
-                print("DEBUG — Raw GPT Output Before Strip:", repr(raw_content))
-
-            if raw_content and raw_content.strip():
-                return raw_content.strip()
-            else:
-                print(f"⚠️ GPT returned empty content on attempt {attempt}.")
-
+            log.debug("🧠 GPT Stream [Attempt %d] — Model: %s", attempt, GPT_MODEL)
+
+            stream = await asyncio.wait_for(get_async_client().chat.completions.create(**request, stream=True),
+                                            max(0.0, deadline - time.perf_counter()))
+            chunks = aiter(stream)
+            while True:
+                try:
+                    if first_token_at is None:
+                        chunk = await asyncio.wait_for(anext(chunks), max(0.0, deadline - time.perf_counter()))
+                    else:
+                        chunk = await anext(chunks)
+                except StopAsyncIteration:
+                    break
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter() - start
+                    log.debug("GPT first token after %.2fs", first_token_at)
+                parts.append(delta)
+                yield delta
+
+            if _accept_content(key, "".join(parts), attempt, time.perf_counter() - start):
+                return
+
+        except TimeoutError:
+            log.error("❌ GPT API Error [Attempt %d]: no answer within the %ss budget", attempt, budget)
+            if stream is not None:
+                await stream.close()
         except Exception as e:
-            print(f"❌ GPT API Error [Attempt {attempt}]: {e}")
+            log.error("❌ GPT API Error [Attempt %d]: %s", attempt, e)
+            if parts:
+                return  # already streamed to the caller — don't restart mid-message
 
-        time.sleep(1.5)
+        await asyncio.sleep(max(0.0, min(1.5, deadline - time.perf_counter())))
+
+
+# 🔥 Pre-session warm-up: open the TLS connection to the API before the real request
+def warm_gpt_connection():
+    try:
+        get_client().models.retrieve(GPT_MODEL)
+    except Exception as e:
+        log.debug("GPT warm-up failed: %s", e)
 
-    return None
+
+async def warm_gpt_connection_async():
+    try:
+        await get_async_client().models.retrieve(GPT_MODEL)
+    except Exception as e:
+        log.debug("GPT warm-up failed: %s", e)
 
 
 # 📝 Prompt template for all summaries
 SUMMARY_PROMPT_TEMPLATE = """
-You are an elite institutional XAU/USD analyst.
+You are an elite institutional {instrument} analyst.
 Output the **final Telegram-ready format** exactly as shown below.
 
 Use **these exact section names** (in this exact order):
@@ -107,72 +524,228 @@ Do not include:
 - Any extra footer text
 """
 
-# 📍 SESSION SUMMARY
-def generate_session_summary(candles: list, session_name: str):
-    if not candles:
-        print(f"❌ No candle data for {session_name}")
-        return f"⚠️ No candle data for {session_name}"
+def _summary_template(instrument: str) -> str:
+    return SUMMARY_PROMPT_TEMPLATE.format(instrument=instrument_label(instrument))
+
+
+def _asset_name(instrument: str) -> str:
+    return INSTRUMENT_ASSET_NAMES.get(instrument, instrument_label(instrument))
+
+
+# 🧭 Higher timeframes resampled from the whole fetched window — bias line + the last bars of each
+def _timeframe_context(candles: Candles) -> str:
+    blocks = []
+    for granularity, bars in resample_many(candles, HTF_CONTEXT_BARS).items():
+        bars = bars[-HTF_CONTEXT_BARS[granularity]:]
+        if not len(bars):
+            continue
+        change = bars.close[-1] - bars.open[0]
+        bias = "bullish" if change > 0 else "bearish" if change < 0 else "flat"
+        blocks.append(f"{granularity} — {bias} {change:+.{bars.decimals}f} over {len(bars)} bars:\n{encode_candles(bars)}")
+    return "\n\n".join(blocks)
+
+
+# 📐 Candle context: feature digest of the window + the most recent candles
+def _candle_context(candles: Candles, window: int) -> str:
+    window_candles = candles[-window:]
+    # Raw candles are capped per model so small context windows keep room for the template
+    cap = candle_cap(MODEL_CAPACITY.get(GPT_MODEL, DEFAULT_CAPACITY))
+    if not ENABLE_FEATURE_DIGEST:
+        context = encode_candles(window_candles[-cap:])
+    else:
+        tail = window_candles[-min(FEATURE_TAIL_CANDLES, cap):]
+        context = f"""{format_feature_digest(window_candles)}
 
+Last {len(tail)} candles:
+{encode_candles(tail)}"""
+
+    timeframes = _timeframe_context(candles) if ENABLE_HTF_CONTEXT else ""
+    return f"{context}\n\nHigher timeframes:\n{timeframes}" if timeframes else context
+
+
+# 🏁 Final Telegram formatting (or the no-output notice)
+def finish_report(summary: str | None, session_name: str, instrument: str = INSTRUMENT) -> str:
+    if not summary:
+        return f"⚠️ GPT returned no output for {session_name}" + _instrument_suffix(instrument)
+    return format_spectral_summary(summary, session_name, tz="Europe/Rome", instrument=instrument)
+
+
+def _instrument_suffix(instrument: str) -> str:
+    """Notices only name the instrument when it isn't the default one."""
+    return f" ({instrument_label(instrument)})" if instrument != INSTRUMENT else ""
+
+
+# 📍 SESSION SUMMARY
+@traced("prompt_build")
+def _session_summary_prompt(candles: Candles, session_name: str, instrument: str = INSTRUMENT) -> tuple[str, str]:
     # Increased to 100 candles for full-session coverage
-    candle_data = "\n".join([
-        f"{c['time']} | O:{c['mid']['o']} H:{c['mid']['h']} L:{c['mid']['l']} C:{c['mid']['c']}"
-        for c in candles[-100:]
-    ])
-    if ENABLE_LOGGING:
-        print(f"DEBUG — {session_name} using {len(candles[-100:])} candles.")
+    candle_data = _candle_context(candles, 100)
+    log.debug("%s using %d candles.", session_name, len(candles[-100:]))
 
     user_text = f"""
 Analyze these {len(candles[-100:])} M5 candles for {session_name}:
 {candle_data}
 
-{SUMMARY_PROMPT_TEMPLATE}
+{_summary_template(instrument)}
 """
+    return user_text, "You are a concise institutional trading analyst."
 
-    summary = chat_completion(user_text, "You are a concise institutional trading analyst.")
-    return format_spectral_summary(summary, session_name, tz="Europe/Rome") if summary else f"⚠️ GPT returned no output for {session_name}"
 
-
-# 🌅 MORNING FORECAST
-def generate_morning_forecast(candles: list):
+def generate_session_summary(candles: Candles, session_name: str, instrument: str = INSTRUMENT):
     if not candles:
-        print("❌ No candle data for Morning Forecast")
-        return "⚠️ No candle data for Morning Forecast"
+        log.error("❌ No candle data for %s %s", session_name, instrument)
+        return f"⚠️ No candle data for {session_name}" + _instrument_suffix(instrument)
+
+    summary = chat_completion(*_session_summary_prompt(candles, session_name, instrument),
+                              budget=gpt_budget([session_name]))
+    return finish_report(summary, session_name, instrument)
 
+
+# 🌅 MORNING FORECAST
+@traced("prompt_build")
+def _morning_forecast_prompt(candles: Candles, instrument: str = INSTRUMENT) -> tuple[str, str]:
     # Increased to 50 candles for broader Asia context
-    candle_data = "\n".join([
-        f"{c['time']} | O:{c['mid']['o']} H:{c['mid']['h']} L:{c['mid']['l']} C:{c['mid']['c']}"
-        for c in candles[-50:]
-    ])
+    candle_data = _candle_context(candles, 50)
 
     user_text = f"""
 Analyze these overnight (Asia) candles for London session prep:
 {candle_data}
 
-{SUMMARY_PROMPT_TEMPLATE}
+{_summary_template(instrument)}
 """
+    return user_text, f"You are a concise institutional {_asset_name(instrument)} forecaster."
 
-    summary = chat_completion(user_text, "You are a concise institutional gold forecaster.")
-    return format_spectral_summary(summary, "Morning Forecast", tz="Europe/Rome") if summary else "⚠️ GPT returned no output for Morning Forecast"
+
+def generate_morning_forecast(candles: Candles, instrument: str = INSTRUMENT):
+    if not candles:
+        log.error("❌ No candle data for Morning Forecast %s", instrument)
+        return "⚠️ No candle data for Morning Forecast" + _instrument_suffix(instrument)
+
+    summary = chat_completion(*_morning_forecast_prompt(candles, instrument), budget=gpt_budget(["Morning Forecast"]))
+    return finish_report(summary, "Morning Forecast", instrument)
 
 
 # 🌙 EVENING REVIEW
-def generate_evening_review(candles: list):
+@traced("prompt_build")
+def _evening_review_prompt(candles: Candles, instrument: str = INSTRUMENT) -> tuple[str, str]:
+    # Increased to 120 candles for full-day coverage
+    candle_data = _candle_context(candles, 120)
+
+    user_text = f"""
+Review these full-day {instrument_label(instrument)} candles:
+{candle_data}
+
+{_summary_template(instrument)}
+"""
+    return user_text, f"You are a concise institutional {_asset_name(instrument)} strategist."
+
+
+def generate_evening_review(candles: Candles, instrument: str = INSTRUMENT):
     if not candles:
-        print("❌ No candle data for Evening Review")
-        return "⚠️ No candle data for Evening Review"
+        log.error("❌ No candle data for Evening Review %s", instrument)
+        return "⚠️ No candle data for Evening Review" + _instrument_suffix(instrument)
+
+    summary = chat_completion(*_evening_review_prompt(candles, instrument), budget=gpt_budget(["Evening Review"]))
+    return finish_report(summary, "Evening Review", instrument)
 
-    # Increased to 120 candles for full-day coverage
-    candle_data = "\n".join([
-        f"{c['time']} | O:{c['mid']['o']} H:{c['mid']['h']} L:{c['mid']['l']} C:{c['mid']['c']}"
-        for c in candles[-120:]
-    ])
 
+# 🔀 Prompt routing (same rules as main.dispatch_gpt_handler)
+def build_report_prompt(session_name: str, candles: Candles, instrument: str = INSTRUMENT) -> tuple[str, str]:
+    """Returns (user_text, system_prompt) for a session."""
+    if session_name == "Morning Forecast":
+        return _morning_forecast_prompt(candles, instrument)
+    elif session_name == "Evening Review":
+        return _evening_review_prompt(candles, instrument)
+    else:
+        return _session_summary_prompt(candles, session_name, instrument)
+
+
+# ⚡ Async report generation for the asyncio session runner
+async def generate_report_async(session_name: str, candles: Candles, instrument: str = INSTRUMENT) -> str:
+    if not candles:
+        log.error("❌ No candle data for %s %s", session_name, instrument)
+        return f"⚠️ No candle data for {session_name}" + _instrument_suffix(instrument)
+
+    summary = await chat_completion_async(*build_report_prompt(session_name, candles, instrument),
+                                          budget=gpt_budget([session_name]))
+    return finish_report(summary, session_name, instrument)
+
+
+# 🧺 BATCHED SESSION SUMMARIES — sessions due together share one window, so they share one request
+STANDALONE_REPORTS = ("Morning Forecast", "Evening Review")  # own template/window, never batched
+
+
+def group_report_batches(session_names: list) -> list:
+    """Splits due sessions into request batches: forecast/review alone, summaries together (≤ MAX_BATCHED_SESSIONS)."""
+    summaries = [name for name in session_names if name not in STANDALONE_REPORTS]
+    batches = [[name] for name in session_names if name in STANDALONE_REPORTS]
+    batches += [summaries[i:i + MAX_BATCHED_SESSIONS] for i in range(0, len(summaries), MAX_BATCHED_SESSIONS)]
+    return batches
+
+
+@traced("prompt_build")
+def _batched_summary_prompt(candles: Candles, session_names: list, instrument: str = INSTRUMENT) -> tuple[str, str]:
+    candle_data = _candle_context(candles, 100)
+    log.debug("Batched %s using %d candles.", session_names, len(candles[-100:]))
+
+    markers = "\n".join(f"=== SESSION: {name} ===" for name in session_names)
     user_text = f"""
-Review these full-day XAU/USD candles:
+Analyze these {len(candles[-100:])} M5 candles. Write one separate report for EACH of these sessions: {", ".join(session_names)}.
+Start every report with its marker line, exactly as written, in this order:
+{markers}
+
+Candles:
 {candle_data}
 
-{SUMMARY_PROMPT_TEMPLATE}
+Each report follows this format:
+{_summary_template(instrument)}
 """
+    return user_text, "You are a concise institutional trading analyst."
+
 
-    summary = chat_completion(user_text, "You are a concise institutional gold strategist.")
-    return format_spectral_summary(summary, "Evening Review", tz="Europe/Rome") if summary else "⚠️ GPT returned no output for Evening Review"
+def _split_batch(response: str | None, session_names: list) -> dict:
+    reports = split_batched_reports(response or "", session_names)
+    missing = [name for name in session_names if name not in reports]
+    if missing:
+        log.warning("⚠️ Batched GPT answer missing %s — requesting them individually.", missing)
+    return reports
+
+
+def generate_session_reports(candles: Candles, session_names: list, instrument: str = INSTRUMENT) -> dict:
+    """One GPT request for several session summaries → {session_name: Telegram-ready report}."""
+    if len(session_names) == 1:
+        name = session_names[0]
+        report = generate_morning_forecast(candles, instrument) if name == "Morning Forecast" else (
+            generate_evening_review(candles, instrument) if name == "Evening Review"
+            else generate_session_summary(candles, name, instrument))
+        return {name: report}
+    if not candles:
+        return {name: f"⚠️ No candle data for {name}" + _instrument_suffix(instrument) for name in session_names}
+
+    response = chat_completion(*_batched_summary_prompt(candles, session_names, instrument),
+                               max_output=1500 * len(session_names), budget=gpt_budget(session_names))
+    reports = _split_batch(response, session_names)
+    return {
+        name: finish_report(reports[name], name, instrument) if name in reports
+        else generate_session_summary(candles, name, instrument)
+        for name in session_names
+    }
+
+
+async def generate_session_reports_async(candles: Candles, session_names: list, instrument: str = INSTRUMENT) -> dict:
+    """Asyncio counterpart of generate_session_reports()."""
+    if len(session_names) == 1:
+        return {session_names[0]: await generate_report_async(session_names[0], candles, instrument)}
+    if not candles:
+        return {name: f"⚠️ No candle data for {name}" + _instrument_suffix(instrument) for name in session_names}
+
+    response = await chat_completion_async(
+        *_batched_summary_prompt(candles, session_names, instrument), max_output=1500 * len(session_names),
+        budget=gpt_budget(session_names),
+    )
+    reports = _split_batch(response, session_names)
+    missing = [name for name in session_names if name not in reports]
+    fallbacks = await asyncio.gather(*(generate_report_async(name, candles, instrument) for name in missing))
+    results = {name: finish_report(reports[name], name, instrument) for name in session_names if name in reports}
+    results.update(zip(missing, fallbacks))
+    return {name: results[name] for name in session_names}
@@ -0,0 +1,117 @@
+# gpt_cache.py
+# 🗄️ Content-addressed GPT response cache — in-memory LRU in front of an on-disk store
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config import (
+    GPT_CACHE_DIR, GPT_CACHE_TTL_SEC,
+    GPT_CACHE_MEMORY_ENTRIES, GPT_CACHE_MAX_DISK_ENTRIES
+)
+from instrumentation import get_logger
+
+log = get_logger("gpt_cache")
+
+
+def cache_key(model: str, system_prompt: str, user_text: str, temperature: float) -> str:
+    """SHA-256 over everything that determines the completion."""
+    payload = json.dumps([model, system_prompt, user_text, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GPTResponseCache:
+    """
+    Two-level cache for chat completions. Entries expire after `ttl` seconds;
+    the memory tier keeps the `memory_entries` most recently used, the disk
+    tier is trimmed to `disk_entries` files (oldest first).
+    """
+
+    def __init__(self, cache_dir: str = GPT_CACHE_DIR, ttl: float = GPT_CACHE_TTL_SEC,
+                 memory_entries: int = GPT_CACHE_MEMORY_ENTRIES, disk_entries: int = GPT_CACHE_MAX_DISK_ENTRIES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self._memory = OrderedDict()  # key → (created, content)
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _expired(self, created: float) -> bool:
+        return time.time() - created > self.ttl
+
+    def _remember(self, key: str, created: float, content: str):
+        self._memory[key] = (created, content)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and not self._expired(entry[0]):
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return entry[1]
+            self._memory.pop(key, None)
+
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    record = json.load(f)
+                if not self._expired(record["created"]):
+                    self._remember(key, record["created"], record["content"])
+                    self.stats["disk_hits"] += 1
+                    return record["content"]
+                os.remove(self._path(key))
+            except (OSError, ValueError, KeyError):
+                pass
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, content: str, model: str = ""):
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, content)
+            self.stats["stores"] += 1
+            try:
+                tmp_path = self._path(key) + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"created": created, "model": model, "content": content}, f, ensure_ascii=False)
+                os.replace(tmp_path, self._path(key))
+                self._trim_disk()
+            except OSError as e:
+                log.debug("GPT cache write failed: %s", e)
+
+    def _trim_disk(self):
+        files = [e for e in os.scandir(self.cache_dir) if e.name.endswith(".json")]
+        if len(files) <= self.disk_entries:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for entry in files[:len(files) - self.disk_entries]:
+            try:
+                os.remove(entry.path)
+                self.stats["evictions"] += 1
+            except OSError:
+                pass
+
+
+# 🌍 Process-wide cache used by chat_completion() (created on first use — importing doesn't touch the disk)
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_gpt_cache() -> GPTResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GPTResponseCache()
+        return _cache
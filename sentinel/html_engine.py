@@ -0,0 +1,212 @@
+# html_engine.py
+# 🧱 Single-pass Telegram HTML engine — one tag-aware token stream for cleaning, sanitizing and chunking
+
+import re
+
+# 🏷️ Tags Telegram's HTML parse mode accepts (attributes only kept where Telegram uses them)
+ALLOWED_TAGS = {"b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "a", "code", "pre", "span", "tg-spoiler", "blockquote"}
+ATTRIBUTE_TAGS = {"a", "span", "code", "pre", "blockquote"}
+BOLD_TAGS = {"b", "strong"}
+VERBATIM_TAGS = {"code", "pre"}
+
+# 🔣 Precompiled patterns (compiled once at import, not per call)
+TOKEN_RE = re.compile(
+    r"(?P<br><\s*br\s*/?\s*>)"
+    r"|<(?P<close>/?)(?P<name>[a-zA-Z][a-zA-Z0-9-]*)(?P<attrs>\s[^<>]*)?\s*/?>"
+    r"|(?P<text>[^<]+|<)",
+    re.IGNORECASE,
+)
+
+# Meta lines GPT adds despite the prompt (header, date/session/time, report title, quotes).
+# Three passes, each anchored on something the regex engine can skip to quickly.
+CLEAN_PIN_RE = re.compile(r"📍.*session summary.*", re.IGNORECASE)
+CLEAN_LINE_RE = re.compile(
+    r"^(?:.*session summary.*\n?"
+    r"|\s*(?:date|session|time)\s*:.*$"
+    r"|\s*sentinelx\s*:?.*$"
+    r"|\s*xau/usd\s*report\s*:?.*$)",
+    re.IGNORECASE | re.MULTILINE,
+)
+CLEAN_TAG_RE = re.compile(
+    r"<(?:i>.*?</i>"
+    r"|b>\s*(?:date|session|time)\s*:.*?</b>.*"
+    r"|b>\s*(?:sentinelx|xau/usd)\s*:?.*?</b>.*)",
+    re.IGNORECASE,
+)
+
+EMOJI_RE = re.compile(
+    "["
+    "\U0001F600-\U0001F64F"
+    "\U0001F300-\U0001F5FF"
+    "\U0001F680-\U0001F6FF"
+    "\U0001F1E0-\U0001F1FF"
+    "\U00002500-\U00002BEF"
+    "\U00002702-\U000027B0"
+    "\U000024C2-\U0001F251"
+    "]+"
+)
+
+# Digits first so the engine can skip ahead; the leading word boundary is checked in _bold_price()
+PRICE_RE = re.compile(r"[0-9]{3,5}\.[0-9]{2}\b")
+BARE_AMP_RE = re.compile(r"&(?!(?:[a-zA-Z]+|#\d+|#x[0-9a-fA-F]+);)")
+SPLIT_RE = re.compile(r"(\s+)")
+
+
+def _bold_price(m: re.Match) -> str:
+    start = m.start()
+    before = m.string[start - 1] if start else " "
+    return m.group(0) if before.isalnum() or before == "_" else f"<b>{m.group(0)}</b>"
+
+
+def _escape(text: str) -> str:
+    if "&" in text:
+        text = BARE_AMP_RE.sub("&amp;", text)
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text.replace("<", "&lt;") if "<" in text else text
+
+
+def render_html(text: str, strip_emojis: bool = False, bold_prices: bool = False) -> str:
+    """
+    One pass over the token stream: unknown tags dropped (content kept), <br>
+    turned into newlines, stray < > & escaped, unclosed tags closed. Optionally
+    strips emoji and bolds prices like 3427.50 that aren't already bold.
+    """
+    text = text.replace("&lt;", "<").replace("&gt;", ">")  # escaped tags from GPT become real tags
+    if strip_emojis:
+        text = EMOJI_RE.sub("", text)  # never part of a tag, so safe before tokenizing
+    out = []
+    stack = []
+    bold = verbatim = 0
+
+    for m in TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "text":
+            piece = _escape(m.group("text"))
+            if bold_prices and not bold and "." in piece:
+                piece = PRICE_RE.sub(_bold_price, piece)
+            out.append(piece)
+            continue
+
+        if kind == "br":
+            # Telegram rejects <br>; a newline renders the same (dropped inside code blocks)
+            if not verbatim:
+                out.append("\n")
+            continue
+
+        name = m.group("name").lower()
+        if name not in ALLOWED_TAGS:
+            continue
+        if m.group("close"):
+            if name in stack:
+                while stack:
+                    tag = stack.pop()
+                    bold -= tag in BOLD_TAGS
+                    verbatim -= tag in VERBATIM_TAGS
+                    out.append(f"</{tag}>")
+                    if tag == name:
+                        break
+            continue
+        attrs = m.group("attrs") if name in ATTRIBUTE_TAGS and m.group("attrs") else ""
+        out.append(f"<{name}{attrs.rstrip()}>")
+        stack.append(name)
+        bold += name in BOLD_TAGS
+        verbatim += name in VERBATIM_TAGS
+
+    out.extend(f"</{tag}>" for tag in reversed(stack))
+    return "".join(out)
+
+
+def clean_meta_lines(summary: str) -> str:
+    """Removes GPT-added headers, quotes and date/time lines (plain or HTML)."""
+    summary = CLEAN_PIN_RE.sub("", summary)
+    summary = CLEAN_LINE_RE.sub("", summary)
+    return CLEAN_TAG_RE.sub("", summary).strip()
+
+
+def render_report_body(summary: str) -> str:
+    """GPT output → Telegram-ready body: meta lines removed, then one token pass (emoji, prices, sanitizing)."""
+    return render_html(clean_meta_lines(summary), strip_emojis=True, bold_prices=True)
+
+
+def split_html(html: str, max_len: int) -> list:
+    """
+    Chunks of at most `max_len` characters, broken at whitespace (words longer
+    than a chunk are cut). Tags open at a break are closed at the end of the
+    chunk and reopened at the start of the next. Expects sanitized HTML.
+    """
+    if len(html) <= max_len:
+        return [html] if html else []
+
+    chunks = []
+    current = []
+    size = 0
+    stack = []  # (name, opening tag)
+    reopen = ""
+
+    def closing() -> str:
+        return "".join(f"</{name}>" for name, _ in reversed(stack))
+
+    def flush():
+        nonlocal current, size, reopen
+        body = "".join(current).rstrip()
+        if body and body != reopen:
+            chunks.append(body + closing())
+        reopen = "".join(opening for _, opening in stack)
+        current, size = [reopen], len(reopen)
+
+    for m in TOKEN_RE.finditer(html):
+        piece = m.group("text")
+        if piece is None:
+            tag = m.group(0)
+            if m.group("close"):
+                if not stack:
+                    continue  # stray closing tag
+                stack.pop()  # its length was already counted in the budget
+            elif not m.group("br"):
+                name = m.group("name").lower()
+                if size + len(tag) + len(name) + 3 > max_len - len(closing()) and size > len(reopen):
+                    flush()
+                stack.append((name, tag))
+            current.append(tag)
+            size += len(tag)
+            continue
+
+        for word in SPLIT_RE.split(piece):
+            while word:
+                room = max_len - len(closing()) - size
+                if len(word) <= room:
+                    current.append(word)
+                    size += len(word)
+                    break
+                if word.isspace():
+                    flush()
+                    break
+                if size > len(reopen):
+                    flush()
+                    continue
+                # A single word longer than a whole chunk — hard cut (never inside an entity)
+                cut = room
+                amp = word.rfind("&", 0, cut)
+                if amp != -1 and ";" not in word[amp:cut]:
+                    cut = amp or cut
+                current.append(word[:cut])
+                size += cut
+                word = word[cut:]
+                flush()
+
+    flush()
+    return chunks
+
+
+def trim_html(html: str, max_len: int) -> str:
+    """First `max_len` characters (tag-aware), with '...' when something was cut."""
+    if len(html) <= max_len:
+        return html
+    return split_html(html, max_len - 3)[0] + "..."
+
+
+def prepare_telegram_chunks(message: str, max_len: int) -> tuple[str, list]:
+    """Sanitized message and its Telegram-sized chunks."""
+    html = render_html(message)
+    return html, split_html(html, max_len)
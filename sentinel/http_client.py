@@ -0,0 +1,135 @@
+# http_client.py
+# 🌐 Shared pooled HTTP transport for OANDA and Telegram (keep-alive, HTTP/2, timeouts, timing)
+
+import asyncio
+import threading
+import time
+import weakref
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+import httpx
+
+from instrumentation import HTTP_RESPONSES, HTTP_SECONDS, get_logger
+from config import (
+    HTTP_CONNECT_TIMEOUT_SEC, HTTP_READ_TIMEOUT_SEC,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY_SEC
+)
+
+log = get_logger("http")
+
+# 🚀 HTTP/2 needs the optional `h2` package — fall back to HTTP/1.1 keep-alive without it
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+TIMEOUT = httpx.Timeout(
+    connect=HTTP_CONNECT_TIMEOUT_SEC,
+    read=HTTP_READ_TIMEOUT_SEC,
+    write=HTTP_READ_TIMEOUT_SEC,
+    pool=HTTP_CONNECT_TIMEOUT_SEC,
+)
+LIMITS = httpx.Limits(
+    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SEC,
+)
+
+# ⏱️ Recent request latencies per host (seconds)
+TIMING_HISTORY = 200
+_timings = defaultdict(lambda: deque(maxlen=TIMING_HISTORY))
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()  # event loop → AsyncClient (async pools are loop-bound)
+
+
+def get_http_client() -> httpx.Client:
+    """Returns the process-wide pooled client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(http2=HTTP2_AVAILABLE, timeout=TIMEOUT, limits=LIMITS)
+    return _client
+
+
+def close_http_client():
+    """Closes the pooled client (open connections are dropped)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Returns the pooled async client for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, timeout=TIMEOUT, limits=LIMITS)
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_http_client():
+    """Closes the async client of the running event loop."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _log_timing(method: str, host: str, response: httpx.Response, elapsed: float):
+    HTTP_SECONDS.observe(elapsed, host=host)
+    HTTP_RESPONSES.inc(host=host, status=response.status_code)
+    log.debug("%s %s → %s in %.0f ms (%s)", method, host, response.status_code, elapsed * 1000, response.http_version)
+
+
+def http_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Sends a request through the shared pool and records its latency per host.
+    Raises httpx.HTTPError on transport failures (timeouts, refused connections).
+    """
+    host = urlsplit(url).netloc
+    start = time.perf_counter()
+    try:
+        response = get_http_client().request(method, url, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        _timings[host].append(elapsed)
+
+    _log_timing(method, host, response, elapsed)
+    return response
+
+
+async def async_http_request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Async counterpart of http_request(), sharing the same per-host timing history."""
+    host = urlsplit(url).netloc
+    start = time.perf_counter()
+    try:
+        response = await get_async_http_client().request(method, url, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        _timings[host].append(elapsed)
+
+    _log_timing(method, host, response, elapsed)
+    return response
+
+
+def request_timing_summary() -> dict:
+    """Latency stats per host over the recent history, in milliseconds."""
+    summary = {}
+    for host, samples in _timings.items():
+        ordered = sorted(samples)
+        if not ordered:
+            continue
+        summary[host] = {
+            "count": len(ordered),
+            "first_ms": round(samples[0] * 1000, 1),
+            "p50_ms": round(ordered[(len(ordered) - 1) // 2] * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1),
+            "last_ms": round(samples[-1] * 1000, 1),
+        }
+    return summary
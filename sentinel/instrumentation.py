@@ -0,0 +1,273 @@
+# instrumentation.py
+# 📈 Counters, latency histograms and stage spans — served as Prometheus text — plus level-gated lazy logging
+
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import LOG_LEVEL, METRICS_HOST, METRICS_PORT, TRACE_BUFFER_SIZE
+
+# ───────────────── Logging ─────────────────
+# log.debug("GPT responded in %.2fs", elapsed) — arguments are only formatted when DEBUG is enabled
+
+
+class _ConsoleHandler(logging.StreamHandler):
+    """Writes to whatever sys.stdout is at emit time (replays redirect it)."""
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _ConsoleFormatter(logging.Formatter):
+    """Keeps the console output as before: messages as-is, debug lines prefixed with DEBUG:."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        return f"DEBUG: {message}" if record.levelno == logging.DEBUG else message
+
+
+_root_logger = logging.getLogger("sentinel")
+_root_logger.setLevel(LOG_LEVEL)
+_root_logger.propagate = False
+if not _root_logger.handlers:
+    _handler = _ConsoleHandler()
+    _handler.setFormatter(_ConsoleFormatter("%(message)s"))
+    _root_logger.addHandler(_handler)
+
+
+def get_logger(name: str) -> logging.Logger:
+    return _root_logger.getChild(name)
+
+
+log = get_logger("instrumentation")
+
+
+# ───────────────── Metrics ─────────────────
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: tuple, values: tuple, le: str | None = None) -> str:
+    pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic count per label set."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.labels), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label set (seconds)."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values → [bucket counts…, +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels.get(n, "") for n in self.labels))
+        return series[-2] if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_label_text(self.labels, key, f'{bound:g}')} {count}")
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, '+Inf')} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {series[-1]:.6f}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("sentinel_stage_seconds", "Duration of pipeline stages.", ("stage",))
+STAGE_ERRORS = REGISTRY.counter("sentinel_stage_errors_total", "Stages that raised.", ("stage",))
+HTTP_SECONDS = REGISTRY.histogram("sentinel_http_request_seconds", "HTTP request latency per host.", ("host",))
+HTTP_RESPONSES = REGISTRY.counter("sentinel_http_responses_total", "HTTP responses per host and status.",
+                                  ("host", "status"))
+DELIVERY_SECONDS = REGISTRY.histogram(
+    "sentinel_delivery_latency_seconds", "Session deadline to Telegram accepting the report.", ("session",),
+    buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0),
+)
+RETRIES = REGISTRY.counter("sentinel_retries_total", "Requests retried after a failure.", ("target",))
+GPT_EMPTY_OUTPUTS = REGISTRY.counter("sentinel_gpt_empty_outputs_total", "GPT answers with no content.")
+GPT_CACHE = REGISTRY.counter("sentinel_gpt_cache_total", "GPT response cache lookups.", ("result",))
+GPT_HEDGES = REGISTRY.counter("sentinel_gpt_hedges_total", "Hedged GPT requests sent after the primary ran slow.")
+GPT_WINS = REGISTRY.counter("sentinel_gpt_wins_total", "GPT answers by the request that delivered them.",
+                            ("path", "model"))
+GPT_COMPLETION_SECONDS = REGISTRY.histogram(
+    "sentinel_gpt_completion_seconds", "GPT stage latency — first attempt to accepted answer — per winning path.",
+    ("path",), buckets=(0.5, 1.0, 2.0, 5.0, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 120.0),
+)
+TELEGRAM_FALLBACKS = REGISTRY.counter(
+    "sentinel_telegram_fallbacks_total", "Messages resent as plain text after Telegram rejected the HTML.", ("sender",)
+)
+TELEGRAM_FAILURES = REGISTRY.counter("sentinel_telegram_failures_total", "Telegram sends given up.", ("content_type",))
+
+
+# ───────────────── Tracing ─────────────────
+# Spans nest through a context variable, so every stage of one session pipeline shares its trace id.
+_current_span = contextvars.ContextVar("current_span", default=None)
+_ids = itertools.count(1)
+RECENT_SPANS = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Times a block into sentinel_stage_seconds{stage} and keeps it in the recent-trace buffer."""
+    parent = _current_span.get()
+    record = {"trace": parent["trace"] if parent else next(_ids), "span": next(_ids),
+              "parent": parent["span"] if parent else None, "stage": stage, "attrs": attrs, "start": time.time()}
+    token = _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = repr(e)
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start) * 1e3, 3)
+        _current_span.reset(token)
+        STAGE_SECONDS.observe(record["duration_ms"] / 1e3, stage=stage)
+        RECENT_SPANS.append(record)
+        log.debug("⏱️ %s %.1f ms %s", stage, record["duration_ms"], attrs or "")
+
+
+def traced(stage: str):
+    """Decorator form of span() for plain and async functions."""
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def recent_traces(limit: int = 50) -> list:
+    """The latest `limit` traces, each as its spans in start order."""
+    traces = {}
+    for record in reversed(RECENT_SPANS):
+        if record["trace"] not in traces and len(traces) >= limit:
+            continue
+        traces.setdefault(record["trace"], []).append(record)
+    return [sorted(spans, key=lambda s: s["start"]) for spans in traces.values()]
+
+
+# ───────────────── Endpoint ─────────────────
+_server = None
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Serves /metrics (Prometheus text format) and /traces (recent spans, JSON) from a daemon thread."""
+    global _server
+    if _server is not None:
+        return _server
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/metrics"):
+                body, content_type = REGISTRY.render().encode("utf-8"), "text/plain; version=0.0.4"
+            elif self.path.startswith("/traces"):
+                body, content_type = json.dumps(recent_traces(), ensure_ascii=False).encode("utf-8"), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    _server = ThreadingHTTPServer((host, port), Handler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    log.info("📈 Metrics on http://%s:%d/metrics", host, _server.server_address[1])
+    return _server
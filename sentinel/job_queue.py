@@ -0,0 +1,224 @@
+# job_queue.py
+# 🗃️ Durable session job queue — SQLite, shared by every worker process; claims hold expiring leases
+
+import argparse
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from clock import utc_now
+from config import (
+    JOB_QUEUE_PATH, WORKER_ID, JOB_LEASE_SEC, JOB_MAX_ATTEMPTS, JOB_RETRY_BASE_SEC, JOB_MAX_DELAY_SEC
+)
+from instrumentation import get_logger
+
+log = get_logger("job_queue")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    job_key TEXT NOT NULL UNIQUE,
+    deadline REAL NOT NULL,
+    instrument TEXT NOT NULL,
+    sessions TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    not_before REAL NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    finished REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, deadline);
+
+CREATE TABLE IF NOT EXISTS deliveries (
+    job_id INTEGER NOT NULL,
+    session TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    delivered REAL NOT NULL,
+    PRIMARY KEY (job_id, session)
+);
+"""
+
+# Job lifecycle: pending → leased → done | pending (retry) | failed; never-claimed stale jobs → expired
+OPEN_STATUSES = ("pending", "leased")
+
+
+def job_key(deadline: datetime, sessions: list, instrument: str) -> str:
+    """Same deadline, batch and instrument → same key, whichever worker's scheduler enqueues it."""
+    return f"{deadline.astimezone(timezone.utc):%Y-%m-%dT%H:%M:%SZ}|{instrument}|{'+'.join(sessions)}"
+
+
+class JobQueue:
+    """
+    Due session batches as rows in a SQLite file that several processes open at once.
+
+    Every worker runs its own scheduler and enqueues what falls due; the unique
+    job key turns the duplicates into no-ops. claim() hands a job to one worker
+    for `lease_sec`, renewed while its pipeline runs — a worker that dies stops
+    renewing and the job becomes claimable again. Each delivered session is
+    recorded as it goes out, so a retried job only sends what is still missing.
+    """
+
+    def __init__(self, db_path: str = JOB_QUEUE_PATH, clock=utc_now):
+        self.db_path = db_path
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def _now(self) -> float:
+        return self.clock().timestamp()
+
+    def _job(self, row: sqlite3.Row) -> dict:
+        delivered = {r["session"] for r in self.conn.execute(
+            "SELECT session FROM deliveries WHERE job_id = ?", (row["id"],))}
+        return {
+            "id": row["id"], "key": row["job_key"], "instrument": row["instrument"],
+            "deadline": datetime.fromtimestamp(row["deadline"], timezone.utc),
+            "sessions": json.loads(row["sessions"]), "delivered": delivered,
+            "status": row["status"], "attempts": row["attempts"], "worker": row["worker"],
+        }
+
+    # 📥 Producer side
+    def enqueue(self, deadline: datetime, sessions: list, instrument: str) -> bool:
+        """Adds a job unless one with the same key exists (any status). True when it was new."""
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_key, deadline, instrument, sessions, created) VALUES (?, ?, ?, ?, ?)",
+                (job_key(deadline, sessions, instrument), deadline.timestamp(), instrument,
+                 json.dumps(sessions), self._now()),
+            )
+        return cursor.rowcount == 1
+
+    # 🔒 Worker side
+    def claim(self, worker: str = WORKER_ID, lease_sec: float = JOB_LEASE_SEC) -> dict | None:
+        """
+        Leases the oldest claimable job to `worker`: pending and past its retry
+        backoff, or leased by anyone with the lease expired. One UPDATE, so two
+        workers can never take the same job. Open jobs past JOB_MAX_DELAY_SEC
+        are expired instead of claimed.
+        """
+        now = self._now()
+        with self._lock, self.conn:
+            expired = self.conn.execute(
+                "UPDATE jobs SET status = 'expired', finished = ?, worker = NULL "
+                "WHERE deadline < ? AND (status = 'pending' OR (status = 'leased' AND lease_expires <= ?))",
+                (now, now - JOB_MAX_DELAY_SEC, now),
+            ).rowcount
+            row = self.conn.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE id = (SELECT id FROM jobs "
+                "            WHERE (status = 'pending' AND not_before <= ?) OR (status = 'leased' AND lease_expires <= ?) "
+                "            ORDER BY deadline, id LIMIT 1) "
+                "RETURNING *",
+                (worker, now + lease_sec, now, now),
+            ).fetchone()
+            job = self._job(row) if row else None
+        if expired:
+            log.warning("⌛ %d job(s) expired undelivered (over %ds late)", expired, JOB_MAX_DELAY_SEC)
+        if job and job["attempts"] > 1:
+            log.info("🔁 %s claimed %s (attempt %d)", worker, job["key"], job["attempts"])
+        return job
+
+    def renew(self, job: dict, worker: str = WORKER_ID, lease_sec: float = JOB_LEASE_SEC) -> bool:
+        """Extends the lease. False when `worker` no longer holds it (expired and claimed elsewhere)."""
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND status = 'leased' AND worker = ?",
+                (self._now() + lease_sec, job["id"], worker),
+            )
+        return cursor.rowcount == 1
+
+    def mark_delivered(self, job: dict, session: str, worker: str = WORKER_ID):
+        """Records that `session` went out (sent or handed to the durable Telegram outbox)."""
+        with self._lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO deliveries (job_id, session, worker, delivered) VALUES (?, ?, ?, ?)",
+                              (job["id"], session, worker, self._now()))
+        job["delivered"].add(session)
+
+    def finish(self, job: dict, worker: str = WORKER_ID) -> str | None:
+        """
+        Closes the lease: done once every session is delivered, otherwise back to
+        pending after a backoff, or failed after JOB_MAX_ATTEMPTS. Returns the new
+        status, or None when the lease had already passed to another worker.
+        """
+        now = self._now()
+        with self._lock, self.conn:
+            delivered = {r["session"] for r in self.conn.execute(
+                "SELECT session FROM deliveries WHERE job_id = ?", (job["id"],))}
+            missing = [s for s in job["sessions"] if s not in delivered]
+            if not missing:
+                status, error = "done", None
+            else:
+                status = "failed" if job["attempts"] >= JOB_MAX_ATTEMPTS else "pending"
+                error = f"undelivered: {', '.join(missing)}"
+            cursor = self.conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease_expires = NULL, "
+                "finished = CASE WHEN ? = 'pending' THEN NULL ELSE ? END, not_before = ? "
+                "WHERE id = ? AND status = 'leased' AND worker = ?",
+                (status, error, status, now, now + JOB_RETRY_BASE_SEC * 2 ** (job["attempts"] - 1),
+                 job["id"], worker),
+            )
+        if cursor.rowcount == 0:
+            log.warning("⚠️ Lease on %s was lost before it finished", job["key"])
+            return None
+        if status != "done":
+            log.warning("⚠️ Job %s %s (%s)", job["key"], "failed" if status == "failed" else "will be retried", error)
+        return status
+
+    def seconds_until_claimable(self, worker: str = WORKER_ID) -> float | None:
+        """
+        Wait until the next open job could be claimed — a retry backoff or another
+        worker's lease running out. None when no open job is left (leases held by
+        `worker` itself don't count: it will finish them).
+        """
+        now = self._now()
+        row = self.conn.execute(
+            "SELECT MIN(CASE WHEN status = 'pending' THEN not_before ELSE lease_expires END) FROM jobs "
+            "WHERE deadline >= ? AND (status = 'pending' OR (status = 'leased' AND worker != ?))",
+            (now - JOB_MAX_DELAY_SEC, worker),
+        ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - now)
+
+    def counts(self) -> dict:
+        return {r["status"]: r["n"] for r in self.conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+
+    def recent(self, limit: int = 20) -> list:
+        rows = self.conn.execute("SELECT * FROM jobs ORDER BY deadline DESC, id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._job(r) for r in rows]
+
+    def close(self):
+        self.conn.close()
+
+
+# 🌍 Process-wide queue
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
+
+
+# 🟢 Direct Execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Job queue status.")
+    parser.add_argument("--db", default=JOB_QUEUE_PATH)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    queue = JobQueue(args.db)
+    print(" | ".join(f"{status}: {n}" for status, n in sorted(queue.counts().items())) or "empty")
+    for job in queue.recent(args.limit):
+        print(f"{job['deadline']:%Y-%m-%d %H:%M} UTC  {job['instrument']:<8} {job['status']:<8} "
+              f"attempt {job['attempts']}  {', '.join(job['sessions'])}  "
+              f"({len(job['delivered'])}/{len(job['sessions'])} delivered{', ' + job['worker'] if job['worker'] else ''})")
@@ -0,0 +1,296 @@
+# log_index.py
+# 🔎 SQLite FTS index over the session logs — search by session, date range, price level and text
+
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from config import LOG_INDEX_PATH
+
+LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
+
+# 🧾 Entry headers of the two log formats (matched on bytes so offsets are file positions)
+SUMMARY_HEADER_RE = re.compile(
+    rb"^\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] SESSION: (.+?) \| (\d+) candles\r?\n", re.MULTILINE
+)
+SESSION_LOG_HEADER_RE = re.compile(
+    rb"^===== \[([A-Z]+)\] (.+?) @ (\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) UTC =====\r?\n", re.MULTILINE
+)
+ENTRY_SEPARATOR = "─" * 60
+
+# 💲 Price levels mentioned in a summary (3380, 3380.5, 3380.25) — not dates/times
+PRICE_RE = re.compile(r"(?<![\d.\-/:])(\d{4}(?:\.\d{1,3})?)(?![\d\-/:]|\.\d)")
+PRICE_RANGE = (500.0, 20000.0)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    ts TEXT NOT NULL,
+    session TEXT NOT NULL,
+    candle_count INTEGER,
+    status TEXT,
+    summary TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_session_ts ON entries(session, ts);
+CREATE INDEX IF NOT EXISTS entries_ts ON entries(ts);
+CREATE INDEX IF NOT EXISTS entries_source_pos ON entries(source, pos);
+
+CREATE TABLE IF NOT EXISTS prices (
+    entry_id INTEGER NOT NULL,
+    price REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS prices_price ON prices(price, entry_id);
+CREATE INDEX IF NOT EXISTS prices_entry ON prices(entry_id);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    session, summary, content='entries', content_rowid='id', tokenize="unicode61 tokenchars '.'"
+);
+
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    resume_pos INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+"""
+
+
+def _parse_entries(data: bytes, header_re: re.Pattern, kind: str) -> list:
+    """(pos, ts, session, candle_count, status, body) for every entry in `data`."""
+    heads = list(header_re.finditer(data))
+    entries = []
+    for head, nxt in zip(heads, heads[1:] + [None]):
+        body = data[head.end():nxt.start() if nxt else len(data)].decode("utf-8", errors="replace")
+        body = body.replace(ENTRY_SEPARATOR, "").strip()
+        groups = [g.decode("utf-8", errors="replace") for g in head.groups()]
+        if kind == "summary":
+            ts, session, candles = groups
+            entries.append((head.start(), ts, session, int(candles), None, body))
+        else:
+            status, session, ts = groups
+            entries.append((head.start(), ts, session, None, status, body))
+    return entries
+
+
+def extract_prices(text: str) -> set:
+    prices = set()
+    for match in PRICE_RE.findall(text):
+        value = float(match)
+        if PRICE_RANGE[0] <= value <= PRICE_RANGE[1]:
+            prices.add(value)
+    return prices
+
+
+class LogIndex:
+    """
+    Incremental index of logs/*/ *_summary_log.txt and logs/session_log_*.txt.
+
+    Files are append-only, so each source remembers where its last entry
+    starts; update() re-reads from there (the last entry may still have been
+    growing) and only touches new bytes. A shrunken file is re-indexed.
+    """
+
+    def __init__(self, db_path: str = LOG_INDEX_PATH, log_dir: str = LOG_DIR):
+        self.db_path = db_path
+        self.log_dir = log_dir
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def sources(self) -> list:
+        summary_logs = glob.glob(os.path.join(self.log_dir, "*", "*_summary_log.txt"))
+        session_logs = glob.glob(os.path.join(self.log_dir, "session_log_*.txt"))
+        return [(p, "summary") for p in sorted(summary_logs)] + [(p, "session") for p in sorted(session_logs)]
+
+    def _delete_from(self, source: str, pos: int):
+        ids = "SELECT id FROM entries WHERE source = ? AND pos >= ?"
+        for row in self.conn.execute(f"SELECT id, session, summary FROM entries WHERE id IN ({ids})", (source, pos)):
+            self.conn.execute(
+                "INSERT INTO entries_fts(entries_fts, rowid, session, summary) VALUES('delete', ?, ?, ?)",
+                (row["id"], row["session"], row["summary"]),
+            )
+        self.conn.execute(f"DELETE FROM prices WHERE entry_id IN ({ids})", (source, pos))
+        self.conn.execute("DELETE FROM entries WHERE source = ? AND pos >= ?", (source, pos))
+
+    def _index_source(self, path: str, kind: str) -> int:
+        stat = os.stat(path)
+        row = self.conn.execute("SELECT resume_pos, size, mtime FROM sources WHERE path = ?", (path,)).fetchone()
+        if row and row["size"] == stat.st_size and row["mtime"] == stat.st_mtime:
+            return 0
+
+        resume = row["resume_pos"] if row and stat.st_size >= row["size"] else 0
+        with open(path, "rb") as f:
+            f.seek(resume)
+            data = f.read()
+
+        header_re = SUMMARY_HEADER_RE if kind == "summary" else SESSION_LOG_HEADER_RE
+        entries = _parse_entries(data, header_re, kind)
+        self._delete_from(path, resume)
+
+        for pos, ts, session, candles, status, body in entries:
+            cur = self.conn.execute(
+                "INSERT INTO entries(source, pos, ts, session, candle_count, status, summary) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, resume + pos, ts, session, candles, status, body),
+            )
+            entry_id = cur.lastrowid
+            self.conn.execute("INSERT INTO entries_fts(rowid, session, summary) VALUES (?, ?, ?)", (entry_id, session, body))
+            self.conn.executemany("INSERT INTO prices(entry_id, price) VALUES (?, ?)",
+                                  [(entry_id, p) for p in extract_prices(body)])
+
+        last_pos = resume + entries[-1][0] if entries else resume
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sources(path, resume_pos, size, mtime) VALUES (?, ?, ?, ?)",
+            (path, last_pos, stat.st_size, stat.st_mtime),
+        )
+        return len(entries)
+
+    def update(self, paths: list | None = None) -> int:
+        """Indexes new entries of all log files (or just `paths`). Returns entries (re)indexed."""
+        targets = self.sources()
+        if paths is not None:
+            wanted = {os.path.abspath(p) for p in paths}
+            targets = [(p, k) for p, k in targets if os.path.abspath(p) in wanted]
+        with self._lock, self.conn:
+            return sum(self._index_source(path, kind) for path, kind in targets)
+
+    def rebuild(self) -> int:
+        with self._lock, self.conn:
+            self.conn.executescript(
+                "DELETE FROM prices; DELETE FROM entries; DELETE FROM sources;"
+                "INSERT INTO entries_fts(entries_fts) VALUES('delete-all');"
+            )
+        return self.update()
+
+    def search(self, text: str | None = None, session: str | None = None, since: str | None = None,
+               until: str | None = None, price_min: float | None = None, price_max: float | None = None,
+               limit: int = 50, refresh: bool = True) -> list:
+        """
+        Entries matching every given filter, newest first.
+        `text` is an FTS5 query ("sweep", "sweep AND reversal", '"buy-side liquidity"');
+        `session` matches case-insensitively; `since`/`until` are dates or timestamps
+        (YYYY-MM-DD[ HH:MM:SS], inclusive); `price_min`/`price_max` match entries
+        mentioning a price level in that range.
+        """
+        if refresh:
+            self.update()
+
+        query = "SELECT e.id, e.ts, e.session, e.candle_count, e.status, e.source, e.summary"
+        where, params = [], []
+        if text:
+            # snippet() needs the FTS row joined in
+            query += ", snippet(entries_fts, 1, '[', ']', '…', 12) AS snippet FROM entries e"
+            query += " JOIN entries_fts ON entries_fts.rowid = e.id AND entries_fts MATCH ?"
+            params.append(text)
+        else:
+            query += " FROM entries e"
+        if session:
+            where.append("e.session = ? COLLATE NOCASE")
+            params.append(session)
+        if since:
+            where.append("e.ts >= ?")
+            params.append(since)
+        if until:
+            where.append("e.ts <= ?")
+            params.append(until if len(until) > 10 else f"{until} 23:59:59")
+        if price_min is not None or price_max is not None:
+            where.append("EXISTS (SELECT 1 FROM prices p WHERE p.entry_id = e.id AND p.price BETWEEN ? AND ?)")
+            params += [price_min if price_min is not None else 0, price_max if price_max is not None else 1e9]
+
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY e.ts DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(query, params)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+                "sessions": self.conn.execute("SELECT COUNT(DISTINCT session) FROM entries").fetchone()[0],
+                "sources": self.conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0],
+                "first": self.conn.execute("SELECT MIN(ts) FROM entries").fetchone()[0],
+                "last": self.conn.execute("SELECT MAX(ts) FROM entries").fetchone()[0],
+            }
+
+
+# 🌍 Process-wide index (used by the log writer to index new summaries as they land)
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_log_index() -> LogIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LogIndex()
+        return _index
+
+
+def search_logs(text: str | None = None, **filters) -> list:
+    return get_log_index().search(text, **filters)
+
+
+# 🖥️ CLI
+def _price_range(value: str) -> tuple:
+    """'3380' → exact, '3380-' → at or above, '-3400' → at or below, '3380-3400' → between."""
+    low, dash, high = value.partition("-")
+    low = float(low) if low else None
+    if not dash:
+        return low, low
+    return low, float(high) if high else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search the SENTINELx session logs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    find = sub.add_parser("search", help="query the index (refreshes it first)")
+    find.add_argument("text", nargs="?", help='FTS query, e.g. sweep or "buy-side liquidity"')
+    find.add_argument("--session", help='e.g. "London Open"')
+    find.add_argument("--since", help="YYYY-MM-DD[ HH:MM:SS]")
+    find.add_argument("--until", help="YYYY-MM-DD[ HH:MM:SS]")
+    find.add_argument("--price", type=_price_range, help="3380 (exact), 3380- (at or above), 3380-3400")
+    find.add_argument("--limit", type=int, default=20)
+    find.add_argument("--full", action="store_true", help="print whole summaries")
+
+    sub.add_parser("update", help="index new log entries")
+    sub.add_parser("rebuild", help="drop and rebuild the index")
+    sub.add_parser("stats", help="index size and coverage")
+    args = parser.parse_args(argv)
+
+    index = get_log_index()
+    start = time.perf_counter()
+
+    if args.command == "search":
+        price_min, price_max = args.price or (None, None)
+        index.update()
+        start = time.perf_counter()
+        results = index.search(args.text, args.session, args.since, args.until, price_min, price_max,
+                               args.limit, refresh=False)
+        elapsed = (time.perf_counter() - start) * 1e3
+        for r in results:
+            print(f"\n[{r['ts']}] {r['session']}" + (f" ({r['status']})" if r["status"] else ""))
+            body = r["summary"] if args.full or not r.get("snippet") else r["snippet"]
+            print(body if args.full else body.replace("\n", " ")[:300])
+        print(f"\n🔎 {len(results)} result(s) in {elapsed:.1f} ms")
+    elif args.command == "update":
+        print(f"✅ Indexed {index.update()} entr(ies) in {(time.perf_counter() - start) * 1e3:.0f} ms")
+    elif args.command == "rebuild":
+        print(f"✅ Rebuilt: {index.rebuild()} entr(ies) in {(time.perf_counter() - start) * 1e3:.0f} ms")
+    else:
+        print(index.stats())
+
+
+# 🟢 Direct Execution
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,226 @@
-import os
+import atexit
 import csv
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
 
 from datetime import datetime
+from clock import utc_now
+from instrumentation import get_logger
+from config import LOG_FLUSH_INTERVAL_SEC, LOG_BATCH_SIZE, LOG_MAX_BYTES, LOG_INDEX_ON_WRITE
 
 # 🔁 Path where logs will be saved (auto-sorted by date)
 LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
+RECORDS_DIR = os.path.join(LOG_DIR, "records")  # structured JSONL store, one file per day
+FAILURE_LOG_DIR = os.path.join(os.path.dirname(__file__), "telegram_logs")
+
+log = get_logger("log_writer")
+
 
-def _get_today_log_paths():
+def _gzip_file(path: str, target: str):
+    """Compresses `path` into `target` (suffixed -1, -2… if taken) and removes the original."""
+    base, n = target[:-len(".gz")], 0
+    while os.path.exists(target):
+        n += 1
+        target = f"{base}-{n}.gz"
+    with open(path, "rb") as src, gzip.open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+
+
+class LogWriter:
     """
-    Returns file paths for today's .txt and .csv logs.
-    Auto-creates folders as needed.
+    Queue-backed log writer. Callers only enqueue a record; a background thread
+    writes them in batches (every `flush_interval` seconds or `batch_size`
+    records) with each file opened once per batch.
+
+    Every record goes to the day's JSONL store (records/YYYY-MM-DD.jsonl) with
+    its full content and metadata. Summaries are also appended to the readable
+    daily TXT/CSV logs, Telegram failures to telegram_failures.log. Files over
+    `max_bytes` are rotated to a gzip archive; the previous day's JSONL is
+    gzipped once the date changes.
     """
-    today = datetime.now().strftime("%Y-%m-%d")
-    day_dir = os.path.join(LOG_DIR, today)
-    os.makedirs(day_dir, exist_ok=True)
 
-    txt_path = os.path.join(day_dir, f"{today}_summary_log.txt")
-    csv_path = os.path.join(day_dir, f"{today}_summary_log.csv")
-    return txt_path, csv_path
+    def __init__(self, log_dir: str = LOG_DIR, failure_dir: str = FAILURE_LOG_DIR,
+                 flush_interval: float = LOG_FLUSH_INTERVAL_SEC, batch_size: int = LOG_BATCH_SIZE,
+                 max_bytes: int = LOG_MAX_BYTES):
+        self.log_dir = log_dir
+        self.records_dir = os.path.join(log_dir, "records")
+        self.failure_dir = failure_dir
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue()
+        self._made_dirs = set()
+        self._current_day = None
+        self._thread = None
+        self.stats = {"records": 0, "batches": 0, "rotations": 0, "errors": 0}
+
+    # 📥 Hot path
+    def submit(self, record: dict):
+        record.setdefault("ts", utc_now().astimezone().replace(tzinfo=None).isoformat(timespec="milliseconds"))
+        self._queue.put(record)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Blocks until everything submitted so far is on disk."""
+        if self._thread is None or not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    # 🔁 Writer thread
+    def _run(self):
+        while True:
+            batch, waiters = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break  # flush requested — write what we have now
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            try:
+                if batch:
+                    self._write_batch(batch)
+            except Exception as e:
+                self.stats["errors"] += 1
+                log.error("❌ Log writer failed on a batch of %d record(s): %s", len(batch), e)
+            for waiter in waiters:
+                waiter.set()
+
+    def _ensure_dir(self, path: str):
+        if path not in self._made_dirs:
+            os.makedirs(path, exist_ok=True)
+            self._made_dirs.add(path)
+
+    def _write_batch(self, batch: list):
+        by_day = {}
+        for record in batch:
+            by_day.setdefault(record["ts"][:10], []).append(record)
+
+        for day, records in by_day.items():
+            self._roll_day(day)
+            self._append_jsonl(day, records)
+            summaries = [r for r in records if r.get("kind") == "summary"]
+            if summaries:
+                self._append_daily_logs(day, summaries)
+            failures = [r for r in records if r.get("kind") == "telegram_failure"]
+            if failures:
+                self._append_failures(failures)
+
+        self.stats["records"] += len(batch)
+        self.stats["batches"] += 1
+
+    # 🗂️ Stores
+    def _append_jsonl(self, day: str, records: list):
+        self._ensure_dir(self.records_dir)
+        path = os.path.join(self.records_dir, f"{day}.jsonl")
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records)
+        self._rotate_if_large(path)
+
+    def _append_daily_logs(self, day: str, records: list):
+        day_dir = os.path.join(self.log_dir, day)
+        self._ensure_dir(day_dir)
+        txt_path = os.path.join(day_dir, f"{day}_summary_log.txt")
+        csv_path = os.path.join(day_dir, f"{day}_summary_log.csv")
+
+        # ───────────────── TXT LOG ─────────────────
+        with open(txt_path, "a", encoding="utf-8") as txt_log:
+            for r in records:
+                txt_log.write(f"\n{'─' * 60}\n")
+                txt_log.write(f"[{r['ts'][:19].replace('T', ' ')}] SESSION: {r['session']} | {r['candle_count']} candles\n")
+                txt_log.write(r["summary"] + "\n")
+
+        # ───────────────── CSV LOG ─────────────────
+        file_exists = os.path.isfile(csv_path)
+        with open(csv_path, "a", newline='', encoding="utf-8") as csv_log:
+            writer = csv.writer(csv_log)
+            if not file_exists:
+                writer.writerow(["Timestamp", "Session", "CandleCount", "Summary"])
+            for r in records:
+                writer.writerow([r["ts"][:19].replace("T", " "), r["session"], r["candle_count"], r["summary"].replace("\n", " ")])
+
+        # 🔎 Keep the search index live (only the bytes just appended are parsed)
+        if LOG_INDEX_ON_WRITE and os.path.abspath(self.log_dir) == os.path.abspath(LOG_DIR):
+            from log_index import get_log_index
+            get_log_index().update([txt_path])
+
+    def _append_failures(self, records: list):
+        self._ensure_dir(self.failure_dir)
+        path = os.path.join(self.failure_dir, "telegram_failures.log")
+        with open(path, "a", encoding="utf-8") as f:
+            for r in records:
+                f.write("\n" + "-" * 60 + "\n")
+                f.write(f"[{r['ts'][:19].replace('T', ' ')}] TELEGRAM {r['content_type']} FAILURE\n")
+                f.write(f"Error Code: {r['error_code']}\n")
+                f.write(f"Error Detail: {r['error_detail']}\n")
+                f.write("Content:\n" + r["content"] + "\n")
+        self._rotate_if_large(path)
+
+    # ♻️ Rotation
+    def _rotate_if_large(self, path: str):
+        if os.path.getsize(path) <= self.max_bytes:
+            return
+        base, ext = os.path.splitext(path)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        _gzip_file(path, f"{base}.{stamp}{ext}.gz")
+        self.stats["rotations"] += 1
+        log.debug("Rotated %s (%d bytes limit)", os.path.basename(path), self.max_bytes)
+
+    def _roll_day(self, day: str):
+        """On the first record of a new day, gzip the JSONL stores of earlier days."""
+        if day == self._current_day:
+            return
+        self._current_day = day
+        if not os.path.isdir(self.records_dir):
+            return
+        for name in os.listdir(self.records_dir):
+            if name.endswith(".jsonl") and name[:10] < day:
+                path = os.path.join(self.records_dir, name)
+                _gzip_file(path, path + ".gz")
+                self.stats["rotations"] += 1
+
+
+# 🌍 Process-wide writer (started on first use, drained at exit)
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer() -> LogWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter().start()
+            atexit.register(_writer.flush)
+        return _writer
+
+
+def log_event(kind: str, **fields):
+    """Enqueues a structured record (delivery latency, GPT timing, failure…) — never blocks on disk."""
+    get_log_writer().submit({"kind": kind, **fields})
 
 
-def log_message(session_name: str, summary: str, candle_count: int):
+def log_message(session_name: str, summary: str, candle_count: int, **metadata):
     """
-    Logs session summary to both TXT and CSV formats in dated folder.
+    Logs session summary to both TXT and CSV formats in dated folder, plus the
+    JSONL store with the full summary and any metadata (latencies, model…).
     """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    txt_path, csv_path = _get_today_log_paths()
-
-    # ───────────────── TXT LOG ─────────────────
-    with open(txt_path, "a", encoding="utf-8") as txt_log:
-        txt_log.write(f"\n{'─' * 60}\n")
-        txt_log.write(f"[{timestamp}] SESSION: {session_name} | {candle_count} candles\n")
-        txt_log.write(summary + "\n")
-
-    # ───────────────── CSV LOG ─────────────────
-    file_exists = os.path.isfile(csv_path)
-    with open(csv_path, "a", newline='', encoding="utf-8") as csv_log:
-        writer = csv.writer(csv_log)
-        if not file_exists:
-            writer.writerow(["Timestamp", "Session", "CandleCount", "Summary"])
-        writer.writerow([timestamp, session_name, candle_count, summary.replace("\n", " ")[:1000]])
+    log_event("summary", session=session_name, candle_count=candle_count, summary=summary, **metadata)
@@ -1,70 +1,518 @@
 # main.py
 # 🟦 Spectral Sniper Bot — Session Manager & Execution Entry
 
+import asyncio
+import contextlib
 import time
-import traceback
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
-from config import ENABLE_LOGGING
-from oanda_connector import fetch_latest_data
+from config import (
+    ENABLE_PRICE_STREAM, ENABLE_GPT_STREAMING, ENABLE_TELEGRAM_QUEUE, ENABLE_METRICS_SERVER, ENABLE_JOB_QUEUE,
+    MAX_CONCURRENT_SESSIONS, SESSION_WARMUP_LEAD_SEC, INSTRUMENT, INSTRUMENTS, MAX_CONCURRENT_INSTRUMENTS,
+    JOB_HEARTBEAT_SEC, JOB_MAX_DELAY_SEC,
+    validate_env
+)
+from oanda_connector import fetch_latest_data, fetch_latest_data_async
+from resample import REPORT_CANDLE_COUNT
+from candles import Candles
+from clock import utc_now
+from price_stream import PriceStreamConsumer, start_price_stream_thread
+from http_client import request_timing_summary
+from instrumentation import DELIVERY_SECONDS, get_logger, span, start_metrics_server, traced
 from gpt_analysis import (
     generate_session_summary,
     generate_morning_forecast,
     generate_evening_review,
+    generate_session_reports,
+    generate_session_reports_async,
+    group_report_batches,
+    build_report_prompt,
+    finish_report,
+    gpt_path_summary,
+    gpt_budget,
+    stream_completion_async,
+    warm_gpt_connection,
+    warm_gpt_connection_async,
+)
+from telegram_alert import (
+    send_telegram_message,
+    send_telegram_message_async,
+    ProgressiveTelegramMessage,
+    warm_telegram_connection,
+    warm_telegram_connection_async,
 )
-from telegram_alert import send_telegram_message
-from prompt_formatter import format_spectral_summary
-from session_tracker import check_sessions  # ✅ Session trigger logic
+from log_writer import log_event, log_message
+from telegram_queue import get_outbox, queue_telegram_message
+from telegram_broadcast import broadcast_telegram_message, broadcast_telegram_message_async
+from prompt_formatter import format_spectral_summary, prerender_report_frame, split_report_sections
+from session_tracker import SessionScheduler  # ✅ Session trigger logic
+from job_queue import get_job_queue
+
+log = get_logger("main")
 
 
 # 🔀 GPT Handler Router
-def dispatch_gpt_handler(session_name: str, candles: list) -> str:
+def dispatch_gpt_handler(session_name: str, candles: Candles, instrument: str = INSTRUMENT) -> str:
     if session_name == "Morning Forecast":
-        return generate_morning_forecast(candles)
+        return generate_morning_forecast(candles, instrument)
     elif session_name == "Evening Review":
-        return generate_evening_review(candles)
+        return generate_evening_review(candles, instrument)
     else:
-        return generate_session_summary(candles, session_name)
+        return generate_session_summary(candles, session_name, instrument)
+
+
+# ⏱️ Trigger-to-delivery latency (session deadline → Telegram accepted), seconds
+DELIVERY_LATENCIES = deque(maxlen=200)
+
+
+def record_delivery_latency(session_name: str, deadline: datetime | None):
+    if deadline is None:
+        return
+    latency = (utc_now() - deadline).total_seconds()
+    DELIVERY_LATENCIES.append(latency)
+    DELIVERY_SECONDS.observe(latency, session=session_name)
+    log_event("delivery", session=session_name, deadline=deadline.isoformat(), latency_sec=round(latency, 3))
+    ordered = sorted(DELIVERY_LATENCIES)
+    log.info("⏱️ Trigger-to-delivery for %s: %.2fs (p50 %.2fs over %d alerts)",
+             session_name, latency, ordered[(len(ordered) - 1) // 2], len(ordered))
+
+
+# 📮 Hand a report to the outbound queue — latency is recorded, and a job's session marked, once Telegram accepts it
+def enqueue_report(session_name: str, formatted: str, deadline: datetime | None, job: dict | None = None) -> bool:
+    """Spools the report (no latency without a `deadline`). A `job` waits for the outbox in run_job_async()."""
+    settled = _track_handoff(job) if job is not None else None
+
+    def on_delivered():
+        record_delivery_latency(session_name, deadline)
+        mark_job_delivered(job, session_name)
+        if settled:
+            settled(True)
+
+    queued = queue_telegram_message(formatted, on_delivered=on_delivered,
+                                    on_failed=(lambda: settled(False)) if settled else None)
+    if not queued and settled:
+        settled(False)
+    return queued
+
+
+# 🗃️ Queued jobs record each session as it goes out, so a retry only sends what's missing
+def mark_job_delivered(job: dict | None, session_name: str):
+    if job is not None:
+        get_job_queue().mark_delivered(job, session_name)
+
+
+def _track_handoff(job: dict):
+    """A future on the job that the outbox thread settles — True once Telegram accepted the report, False if dropped."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    job.setdefault("handoffs", []).append(future)
+
+    def settle(delivered: bool):
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(delivered))
+
+    return settle
+
+
+# 📣 Subscriber fan-out on its own task — hundreds of chats at the bot-wide rate mustn't hold a pipeline slot or job lease
+_broadcasts = set()
+
+
+async def _broadcast_async(message: str):
+    try:
+        await broadcast_telegram_message_async(message)
+    except Exception as e:
+        log.exception("❌ Broadcast failed: %s", e)
+
 
+def launch_broadcast(message: str):
+    task = asyncio.create_task(_broadcast_async(message))
+    _broadcasts.add(task)
+    task.add_done_callback(_broadcasts.discard)
+
+
+# 🔥 Pre-session warm-up — at the deadline only the last candle delta and the GPT call remain
+@traced("warm_up")
+def warm_up_sessions(session_names: list, deadline: datetime):
+    log.info("🔥 Warming up for %s (deadline %s UTC)", session_names, f"{deadline:%H:%M:%S}")
+    warm_gpt_connection()
+    warm_telegram_connection()
+    _map_instruments(lambda instrument: fetch_latest_data(REPORT_CANDLE_COUNT, instrument))
+    for session_name in session_names:
+        prerender_report_frame(session_name, deadline)
+
+
+@traced("warm_up")
+async def warm_up_sessions_async(session_names: list, deadline: datetime):
+    log.info("🔥 Warming up for %s (deadline %s UTC)", session_names, f"{deadline:%H:%M:%S}")
+    await asyncio.gather(
+        warm_gpt_connection_async(),
+        warm_telegram_connection_async(),
+        *(fetch_latest_data_async(REPORT_CANDLE_COUNT, instrument) for instrument in INSTRUMENTS),
+    )
+    for session_name in session_names:
+        prerender_report_frame(session_name, deadline)
+
+
+# 🌐 Instrument fan-out for the sync loop — pipelines share the HTTP pools, candle cache and Telegram limits
+def _map_instruments(fn) -> list:
+    """Runs fn(instrument) for every configured instrument, at most MAX_CONCURRENT_INSTRUMENTS at once."""
+    if len(INSTRUMENTS) == 1:
+        return [fn(INSTRUMENTS[0])]
+    workers = min(MAX_CONCURRENT_INSTRUMENTS, len(INSTRUMENTS))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="instrument") as pool:
+        return list(pool.map(fn, INSTRUMENTS))
+
+
+# 🧺 Batch pipeline (sync) — one fetch and one GPT request per instrument, one message per session
+def run_batch(session_names: list, deadline: datetime | None = None, instrument: str = INSTRUMENT):
+    with span("session", sessions=session_names, instrument=instrument):
+        log.info("⏰ Running GPT logic for: %s (%s)", ", ".join(session_names), instrument)
+
+        candles = fetch_latest_data(REPORT_CANDLE_COUNT, instrument)
+        if not candles:
+            log.warning("⚠️ No candle data fetched for %s.", instrument)
+            return
+
+        # One GPT request per batch, one Telegram message per session
+        for triggered_session, summary in generate_session_reports(candles, session_names, instrument).items():
+            log_message(triggered_session, summary, candle_count=len(candles), batch=session_names,
+                        instrument=instrument)
+            formatted = format_spectral_summary(summary, triggered_session, instrument=instrument)
+
+            if ENABLE_TELEGRAM_QUEUE:
+                enqueue_report(triggered_session, formatted, deadline)
+            else:
+                log.debug("Sending formatted session message to Telegram...")
+                if send_telegram_message(formatted):
+                    record_delivery_latency(triggered_session, deadline)
+
+            # 📣 Subscriber fan-out (no-op without configured recipients)
+            broadcast_telegram_message(formatted)
+
+        log.debug("HTTP latency per host: %s", request_timing_summary())
+        log.debug("GPT answers per path: %s", gpt_path_summary())
+
+
+# 🔁 Main loop — sleeps until the next session deadline, then runs every session due
+def run_scheduled_sessions(test_mode: bool = False, scheduler: SessionScheduler | None = None,
+                           until: datetime | None = None):
+    """Runs forever, or until the sessions due up to `until` are done (see run_scheduled_sessions_async)."""
+    # 📡 Keep the candle cache live between triggers so alerts skip the REST round trip
+    if ENABLE_PRICE_STREAM:
+        start_price_stream_thread()
+
+    if ENABLE_METRICS_SERVER:
+        start_metrics_server()
+
+    # ♻️ Start the outbound sender now so alerts spooled by a previous run go out
+    if ENABLE_TELEGRAM_QUEUE:
+        get_outbox()
+
+    scheduler = scheduler or SessionScheduler()
 
-# 🔁 Main loop — Calls check_sessions() every 10s
-def run_scheduled_sessions(test_mode: bool = False):
     while True:
         try:
-            triggered_session = check_sessions()
-            print("DEBUG: check_sessions() returned:", triggered_session)
+            deadline = None
+            if test_mode:
+                # Force a test trigger if no session is active
+                due = scheduler.pop_due() or ["Morning Forecast"]
+                log.debug("Forcing test session trigger: %s", due)
+            else:
+                deadline = scheduler.next_deadline()
+                if until is not None and (deadline is None or deadline > until):
+                    break
+                log.debug("Next session deadline: %s", deadline)
+                scheduler.sleep_until(deadline - timedelta(seconds=SESSION_WARMUP_LEAD_SEC))
+                if SESSION_WARMUP_LEAD_SEC and scheduler.clock() < deadline:
+                    warm_up_sessions(scheduler.sessions_at(deadline), deadline)
+                due = scheduler.wait_for_next()
+            log.debug("Sessions due: %s", due)
+
+            # Instruments run side by side; each one works through the batches in order
+            batches = group_report_batches(due)
+            _map_instruments(lambda instrument: [run_batch(batch, deadline, instrument) for batch in batches])
 
-            # Force a test trigger if no session is active
-            if test_mode and triggered_session is None:
-                triggered_session = "Morning Forecast"
-                print("DEBUG: Forcing test session trigger:", triggered_session)
+            if test_mode:
+                time.sleep(10)
+
+        except Exception as e:
+            log.exception("❌ Error in session loop: %s", e)
+            scheduler.sleep(30)
 
-            if triggered_session:
-                print(f"⏰ Running GPT logic for: {triggered_session}")
 
-                candles = fetch_latest_data()
+# ⚡ One session pipeline — fetch, GPT, format, send — under the shared concurrency limit
+async def run_session_async(session_name: str, semaphore: asyncio.Semaphore, deadline: datetime | None = None,
+                            instrument: str = INSTRUMENT, job: dict | None = None):
+    await run_batch_async([session_name], semaphore, deadline, instrument, job)
+
+
+# 🧺 Batch pipeline — one fetch and one GPT request for sessions due together, one message each
+async def run_batch_async(session_names: list, semaphore: asyncio.Semaphore, deadline: datetime | None = None,
+                          instrument: str = INSTRUMENT, job: dict | None = None):
+    async with semaphore:
+        with span("session", sessions=session_names, instrument=instrument):
+            try:
+                log.info("⏰ Running GPT logic for: %s (%s)", ", ".join(session_names), instrument)
+
+                candles = await fetch_latest_data_async(REPORT_CANDLE_COUNT, instrument)
                 if not candles:
-                    print("⚠️ No candle data fetched.")
-                    time.sleep(10)
-                    continue
+                    log.warning("⚠️ No candle data fetched for %s %s.", session_names, instrument)
+                    return
+
+                async def deliver(session_name: str, summary: str):
+                    log_message(session_name, summary, candle_count=len(candles), batch=session_names,
+                                instrument=instrument)
+                    formatted = format_spectral_summary(summary, session_name, instrument=instrument)
+                    if ENABLE_TELEGRAM_QUEUE:
+                        enqueue_report(session_name, formatted, deadline, job)
+                    else:
+                        log.debug("Sending formatted %s message to Telegram...", session_name)
+                        if await send_telegram_message_async(formatted):
+                            record_delivery_latency(session_name, deadline)
+                            mark_job_delivered(job, session_name)
+
+                    # 📣 Subscriber fan-out (no-op without configured recipients)
+                    launch_broadcast(formatted)
+
+                reports = await generate_session_reports_async(candles, session_names, instrument)
+                await asyncio.gather(*(deliver(name, summary) for name, summary in reports.items()))
+
+                log.debug("HTTP latency per host: %s", request_timing_summary())
+                log.debug("GPT answers per path: %s", gpt_path_summary())
+
+            except Exception as e:
+                log.exception("❌ Error in %s %s pipeline: %s", ", ".join(session_names), instrument, e)
+
+
+# 📝 Streaming pipeline — the first section goes out as soon as GPT finishes it, the rest are edited in
+async def run_session_streaming_async(session_name: str, semaphore: asyncio.Semaphore,
+                                      deadline: datetime | None = None, instrument: str = INSTRUMENT,
+                                      job: dict | None = None):
+    async with semaphore:
+        with span("session", sessions=[session_name], instrument=instrument, streamed=True):
+            try:
+                log.info("⏰ Streaming GPT report for: %s (%s)", session_name, instrument)
+
+                candles = await fetch_latest_data_async(REPORT_CANDLE_COUNT, instrument)
+                if not candles:
+                    log.warning("⚠️ No candle data fetched for %s %s.", session_name, instrument)
+                    return
+
+                # Same quote/footer on every edit
+                prerender_report_frame(session_name, deadline or utc_now())
+                message = ProgressiveTelegramMessage()
+                text = ""
+                shown = 0
+
+                async for delta in stream_completion_async(*build_report_prompt(session_name, candles, instrument),
+                                                           budget=gpt_budget([session_name])):
+                    text += delta
+                    sections = split_report_sections(text)
+                    if len(sections) > shown:
+                        shown = len(sections)
+                        first_send = message.message_id is None
+                        await message.update(format_spectral_summary("\n\n".join(sections), session_name,
+                                                                     instrument=instrument))
+                        if first_send and message.message_id is not None:
+                            record_delivery_latency(session_name, deadline)
+
+                if not text:
+                    notice = finish_report(None, session_name, instrument)
+                    if ENABLE_TELEGRAM_QUEUE:
+                        enqueue_report(session_name, notice, None, job)
+                    elif await send_telegram_message_async(notice):
+                        mark_job_delivered(job, session_name)
+                    return
+
+                log_message(session_name, text, candle_count=len(candles), streamed=True, instrument=instrument)
+                final = format_spectral_summary(text, session_name, instrument=instrument)
+                if await message.finish(final):
+                    if shown == 0:
+                        # Nothing was sent while streaming (single section or cached answer)
+                        record_delivery_latency(session_name, deadline)
+                    mark_job_delivered(job, session_name)
+                elif message.message_id is None and ENABLE_TELEGRAM_QUEUE:
+                    # Direct send failed — hand the final report to the retrying queue
+                    enqueue_report(session_name, final, deadline, job)
+                elif message.message_id is not None:
+                    # The last edit failed, but the report is already in the chat — a retry would duplicate it
+                    mark_job_delivered(job, session_name)
+
+                # 📣 Subscribers get the finished report only
+                launch_broadcast(final)
+
+                log.debug("HTTP latency per host: %s", request_timing_summary())
+
+            except Exception as e:
+                log.exception("❌ Error in %s %s streaming pipeline: %s", session_name, instrument, e)
+
+
+# 🗃️ Job queue workers — any process may run a due batch; a crashed worker's lease runs out and another takes over
+def enqueue_jobs(due: list, deadline: datetime) -> int:
+    """One job per batch and instrument; returns how many were new (other workers may have added them first)."""
+    queue = get_job_queue()
+    return sum(queue.enqueue(deadline, batch, instrument)
+               for batch in group_report_batches(due) for instrument in INSTRUMENTS)
 
-                summary = dispatch_gpt_handler(triggered_session, candles)
-                formatted = format_spectral_summary(summary, triggered_session)
 
-                print("DEBUG: Sending formatted session message to Telegram...")
-                send_telegram_message(formatted)
+async def _renew_lease_async(job: dict, async_sleep):
+    while True:
+        await async_sleep(JOB_HEARTBEAT_SEC)
+        if not get_job_queue().renew(job):
+            log.warning("⚠️ Lost the lease on %s — another worker may resend it", job["key"])
+            return
+
+
+async def _await_handoffs(job: dict):
+    """Waits for reports spooled to the outbox to be accepted or dropped — at most until the job goes stale."""
+    handoffs = job.get("handoffs")
+    if not handoffs:
+        return
+    timeout = (job["deadline"] + timedelta(seconds=JOB_MAX_DELAY_SEC) - utc_now()).total_seconds()
+    _, unsettled = await asyncio.wait(handoffs, timeout=max(0.0, timeout))
+    if unsettled:
+        log.warning("⚠️ %d report(s) of %s still in the Telegram outbox at the job's max delay",
+                    len(unsettled), job["key"])
+
+
+async def run_job_async(job: dict, slot: asyncio.Semaphore, async_sleep=asyncio.sleep):
+    """
+    Runs a claimed job's undelivered sessions in the pipeline slot already taken for it,
+    then settles the job. Reports handed to the outbox only count once Telegram accepts
+    them — the slot is freed meanwhile, the lease kept, so a crash here still gets the job resent.
+    """
+    queue = get_job_queue()
+    heartbeat = asyncio.create_task(_renew_lease_async(job, async_sleep))
+    pending = [name for name in job["sessions"] if name not in job["delivered"]]
+    try:
+        try:
+            if pending and ENABLE_GPT_STREAMING and len(job["sessions"]) == 1:
+                await run_session_streaming_async(pending[0], contextlib.nullcontext(), job["deadline"],
+                                                  job["instrument"], job)
+            elif pending:
+                await run_batch_async(pending, contextlib.nullcontext(), job["deadline"], job["instrument"], job)
+        finally:
+            slot.release()
+        await _await_handoffs(job)
+    finally:
+        heartbeat.cancel()
+        queue.finish(job)
+
+
+async def drain_job_queue_async(semaphore: asyncio.Semaphore, async_sleep=asyncio.sleep):
+    """
+    Claims jobs whenever a pipeline slot is free. Returns once no open job is
+    left — it waits out retry backoffs and other workers' leases first, so a job
+    whose worker died is picked up here.
+    """
+    queue = get_job_queue()
+    running = set()
+    while True:
+        running = {task for task in running if not task.done()}
+        await semaphore.acquire()
+        job = queue.claim()
+        if job is not None:
+            running.add(asyncio.create_task(run_job_async(job, semaphore, async_sleep)))
+            continue
+        semaphore.release()
+
+        wait = queue.seconds_until_claimable()
+        if not running:
+            if wait is None:
+                return
+            await async_sleep(wait)
+            continue
+        # Our own jobs may end in a retry, so wake when one finishes as well
+        sleeper = asyncio.create_task(async_sleep(wait)) if wait is not None else None
+        await asyncio.wait([task for task in (*running, sleeper) if task], return_when=asyncio.FIRST_COMPLETED)
+        if sleeper:
+            sleeper.cancel()
+
 
-            time.sleep(10)
+# 🔁 Asyncio loop — due sessions run concurrently, a slow GPT call never holds back the others
+async def run_scheduled_sessions_async(test_mode: bool = False, scheduler: SessionScheduler | None = None,
+                                       until: datetime | None = None):
+    """
+    Runs forever, or — with `until` — returns once every session due up to then
+    has been delivered. Pass a `scheduler` on a simulated clock to replay (replay.py).
+
+    With ENABLE_JOB_QUEUE, due batches are enqueued instead of run directly and
+    every worker process running this loop claims from the shared queue.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SESSIONS)
+    scheduler = scheduler or SessionScheduler()
+    if ENABLE_TELEGRAM_QUEUE:
+        get_outbox()
+    if ENABLE_METRICS_SERVER:
+        start_metrics_server()
+    running = set()
+
+    def launch(coro):
+        task = asyncio.create_task(coro)
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    # 📡 Same loop hosts the price stream consumer
+    if ENABLE_PRICE_STREAM:
+        launch(PriceStreamConsumer().run())
+
+    # 🗃️ Jobs left open by a previous run (or a dead peer) are picked up right away
+    if ENABLE_JOB_QUEUE:
+        launch(drain_job_queue_async(semaphore, scheduler.async_sleep))
+
+    while True:
+        try:
+            deadline = None
+            if test_mode:
+                # Force a test trigger if no session is active
+                due = scheduler.pop_due() or ["Morning Forecast"]
+                log.debug("Forcing test session trigger: %s", due)
+            else:
+                # Warm up shortly before the deadline, then sleep until it;
+                # every session due then comes back together
+                deadline = scheduler.next_deadline()
+                if until is not None and (deadline is None or deadline > until):
+                    break
+                log.debug("Next session deadline: %s", deadline)
+                await scheduler.sleep_until_async(deadline - timedelta(seconds=SESSION_WARMUP_LEAD_SEC))
+                if SESSION_WARMUP_LEAD_SEC and scheduler.clock() < deadline:
+                    launch(warm_up_sessions_async(scheduler.sessions_at(deadline), deadline))
+                due = await scheduler.wait_for_next_async()
+            log.debug("Sessions due: %s", due)
+
+            if ENABLE_JOB_QUEUE:
+                added = enqueue_jobs(due, deadline or utc_now().replace(second=0, microsecond=0))
+                log.debug("Enqueued %d new job(s) for %s", added, due)
+                launch(drain_job_queue_async(semaphore, scheduler.async_sleep))
+            else:
+                # One pipeline per batch and instrument, all under the shared concurrency limit.
+                # Streaming edits one message per request, so only single-session batches stream
+                for batch in group_report_batches(due):
+                    for instrument in INSTRUMENTS:
+                        if ENABLE_GPT_STREAMING and len(batch) == 1:
+                            launch(run_session_streaming_async(batch[0], semaphore, deadline, instrument))
+                        else:
+                            launch(run_batch_async(batch, semaphore, deadline, instrument))
+
+            if test_mode:
+                await asyncio.sleep(10)
 
         except Exception as e:
-            print("❌ Error in session loop:", str(e))
-            traceback.print_exc()
-            time.sleep(30)
+            log.exception("❌ Error in session loop: %s", e)
+            await scheduler.async_sleep(30)
+
+    # ⏹️ Only reached with `until` — let the last pipelines and broadcasts finish
+    while running or _broadcasts:
+        await asyncio.gather(*running, *_broadcasts)
 
 
 # 🟢 Entry Point
 if __name__ == "__main__":
+    validate_env()
 
     # ✅ Run loop in test mode (forces triggers if no real session is active)
-    run_scheduled_sessions(test_mode=False)
+    asyncio.run(run_scheduled_sessions_async(test_mode=False))
@@ -1,13 +1,22 @@
 # session_gpt_bot/oanda_connector.py
 
-import requests
+import asyncio
+import httpx
+import threading
 
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from http_client import http_request, async_http_request
+from candles import Candles
+from clock import utc_now
+from instrumentation import get_logger, traced
 from config import (
     OANDA_API_KEY, OANDA_ACCOUNT_ID, OANDA_DOMAIN,
-    INSTRUMENT, GRANULARITY, ENABLE_LOGGING
+    INSTRUMENT, GRANULARITY, CANDLE_CACHE_SIZE
 )
 
+log = get_logger("oanda")
+
 # === OANDA Candles API Endpoint ===
 OANDA_CANDLES_URL = f"{OANDA_DOMAIN}/v3/instruments/{INSTRUMENT}/candles"
 
@@ -17,41 +26,210 @@ HEADERS = {
     "Content-Type": "application/json"
 }
 
-def fetch_latest_data(count: int = 50) -> list:
+# === Candle length in seconds per OANDA granularity ===
+GRANULARITY_SECONDS = {
+    "S5": 5, "S10": 10, "S15": 15, "S30": 30,
+    "M1": 60, "M2": 120, "M4": 240, "M5": 300, "M10": 600, "M15": 900, "M30": 1800,
+    "H1": 3600, "H2": 7200, "H3": 10800, "H4": 14400, "H6": 21600, "H8": 28800, "H12": 43200,
+    "D": 86400,
+}
+
+# 🕔 OANDA aligns H2+ and daily candles to the trading day boundary (17:00 New York)
+ALIGNMENT_TZ = ZoneInfo("America/New_York")
+DAILY_ALIGNMENT_HOUR = 17
+
+# 🗃️ Completed candles kept in memory, keyed by (instrument, granularity) → (Candles, capacity)
+_candle_cache = {}
+_cache_lock = threading.RLock()  # shared with the price stream thread
+_fetch_locks = {}                # key → threading.Lock, so threads fetching one instrument share one request
+_async_fetch_locks = {}          # key → asyncio.Lock, so concurrent sessions share one request
+
+
+def _candles_url(instrument: str) -> str:
+    if instrument == INSTRUMENT:
+        return OANDA_CANDLES_URL
+    return f"{OANDA_DOMAIN}/v3/instruments/{instrument}/candles"
+
+
+def parse_oanda_time(ts: str) -> datetime:
+    """Parses an OANDA RFC3339 timestamp (nanosecond precision) into an aware UTC datetime."""
+    return datetime.strptime(ts[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+
+
+def format_oanda_time(dt: datetime) -> str:
+    """Formats an aware datetime the way OANDA does (RFC3339, nanoseconds, UTC)."""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000000000Z")
+
+
+def candle_bucket_start(ts: datetime, granularity: str = GRANULARITY) -> datetime:
+    """
+    Returns the UTC start of the OANDA candle containing `ts`.
+    Buckets are counted from the trading day boundary, which for sub-hour
+    granularities is the same as plain UTC clock alignment.
+    """
+    step = GRANULARITY_SECONDS[granularity]
+    local = ts.astimezone(ALIGNMENT_TZ)
+    day_start = local.replace(hour=DAILY_ALIGNMENT_HOUR, minute=0, second=0, microsecond=0)
+    if local < day_start:
+        day_start = (local - timedelta(days=1)).replace(hour=DAILY_ALIGNMENT_HOUR, minute=0, second=0, microsecond=0)
+    day_start_utc = day_start.astimezone(timezone.utc)
+    elapsed = (ts.astimezone(timezone.utc) - day_start_utc).total_seconds()
+    return day_start_utc + timedelta(seconds=int(elapsed // step) * step)
+
+
+def _parse_candles(response: httpx.Response) -> Candles:
+    """Parses only the completed candles of a candles response into columns."""
+    response.raise_for_status()  # Raise an error for non-200 status codes
+
+    candles = response.json().get("candles", [])
+
+    # Filter to keep only fully completed candles (ignore in-progress ones)
+    return Candles.from_oanda([c for c in candles if c.get("complete")])
+
+
+def _request_candles(instrument: str, params: dict) -> Candles:
+    return _parse_candles(http_request("GET", _candles_url(instrument), headers=HEADERS, params=params))
+
+
+async def _request_candles_async(instrument: str, params: dict) -> Candles:
+    return _parse_candles(await async_http_request("GET", _candles_url(instrument), headers=HEADERS, params=params))
+
+
+def _missing_candles(cache: Candles, granularity: str) -> int:
+    """
+    Number of candles that may have completed since the newest cached one.
+    A candle that started at T completes at T+g, so the next one can only be complete from T+2g.
+    """
+    step = GRANULARITY_SECONDS.get(granularity, 0)
+    if not step:
+        return CANDLE_CACHE_SIZE
+    elapsed = (utc_now() - cache.last_time()).total_seconds()
+    return max(0, int(elapsed // step) - 1)
+
+
+def _append_candles(key: tuple, new_candles: Candles) -> int:
+    """Appends candles newer than the cached ones, trimming the window to its capacity."""
+    cache, capacity = _candle_cache[key]
+    if len(cache):
+        new_candles = new_candles[new_candles.time > cache.time[-1]]
+    if len(new_candles):
+        _candle_cache[key] = (Candles.concat([cache, new_candles])[-capacity:], capacity)
+    return len(new_candles)
+
+
+def _plan_fetch(key: tuple, count: int) -> dict | None:
+    """Query params needed to bring the cache up to date for `count` candles (None if it already is)."""
+    cache, capacity = _candle_cache.get(key, (None, 0))
+    granularity = key[1]
+
+    # Full load when nothing (or too little) is cached, or the gap is wider than the window (e.g. weekend)
+    missing = _missing_candles(cache, granularity) if cache is not None and len(cache) >= count else None
+    if missing is None or missing > capacity:
+        return {
+            "granularity": granularity,           # e.g., "M15"
+            "count": min(count + 1, 5000),        # +1: the newest candle is usually still in progress
+            "price": "M"                          # Use midpoint pricing for cleaner analysis
+        }
+
+    # Incremental load — only candles newer than the last cached one
+    if missing:
+        return {
+            "granularity": granularity,
+            "from": cache[-1].oanda_times()[0],
+            "includeFirst": "false",
+            "price": "M"
+        }
+    return None
+
+
+def _apply_fetch(key: tuple, count: int, params: dict, fetched: Candles):
+    if "count" in params:
+        capacity = max(CANDLE_CACHE_SIZE, count)
+        _candle_cache[key] = (fetched[-capacity:], capacity)
+        log.debug("✅ Retrieved %d complete candles.", len(fetched))
+    else:
+        added = _append_candles(key, fetched)
+        log.debug("✅ Retrieved %d new complete candles (cache: %d).", added, len(_candle_cache[key][0]))
+
+
+def _cached_window(key: tuple, count: int) -> Candles:
+    cache = _candle_cache.get(key, (None, 0))[0]
+    return cache[-count:] if cache is not None else Candles.empty()
+
+
+@traced("candle_fetch")
+def fetch_latest_data(count: int = 50, instrument: str = INSTRUMENT, granularity: str = GRANULARITY) -> Candles:
     """
     Fetches the latest completed candle data for the selected instrument.
 
+    The first call loads the full window; later calls only ask OANDA for candles
+    newer than the last cached one (or skip the request entirely when nothing new
+    can have completed), and every caller reads its slice from memory.
+
     Args:
         count (int): Number of candles to retrieve (default: 50)
+        instrument (str): OANDA instrument (default: config.INSTRUMENT)
+        granularity (str): OANDA granularity (default: config.GRANULARITY)
 
     Returns:
-        list: A list of completed candle objects from OANDA (or empty list if failed)
+        Candles: Columnar window of completed candles (empty if failed)
     """
-    # Query parameters for the API request
-    params = {
-        "granularity": GRANULARITY,    # e.g., "M15"
-        "count": count,                # Number of candles to fetch
-        "price": "M"                   # Use midpoint pricing for cleaner analysis
-    }
+    key = (instrument, granularity)
+    with _cache_lock:
+        fetch_lock = _fetch_locks.setdefault(key, threading.Lock())
+
+    # The request runs outside the cache lock, so other instruments fetch in parallel
+    with fetch_lock:
+        with _cache_lock:
+            params = _plan_fetch(key, count)
+
+        if params:
+            try:
+                fetched = _request_candles(instrument, params)
+                with _cache_lock:
+                    _apply_fetch(key, count, params, fetched)
+            except httpx.HTTPError as e:
+                # Handle network or API errors — serve whatever is cached
+                log.error("❌ OANDA API Request Failed: %s", e)
+        else:
+            log.debug("✅ Candle cache up to date (%d candles).", len(_candle_cache[key][0]))
 
-    try:
-        # Make GET request to OANDA candle endpoint
-        response = requests.get(OANDA_CANDLES_URL, headers=HEADERS, params=params)
-        response.raise_for_status()  # Raise an error for non-200 status codes
+        with _cache_lock:
+            return _cached_window(key, count)
 
-        data = response.json()
-        candles = data.get("candles", [])
 
-        # Filter to keep only fully completed candles (ignore in-progress ones)
-        complete_candles = [c for c in candles if c.get("complete")]
+@traced("candle_fetch")
+async def fetch_latest_data_async(count: int = 50, instrument: str = INSTRUMENT, granularity: str = GRANULARITY) -> Candles:
+    """Async counterpart of fetch_latest_data() — the request runs on the event loop, outside the cache lock."""
+    key = (instrument, granularity)
+    async with _async_fetch_locks.setdefault(key, asyncio.Lock()):
+        with _cache_lock:
+            params = _plan_fetch(key, count)
 
-        if ENABLE_LOGGING:
-            print(f"✅ Retrieved {len(complete_candles)} complete candles.")
+        if params:
+            try:
+                fetched = await _request_candles_async(instrument, params)
+                with _cache_lock:
+                    _apply_fetch(key, count, params, fetched)
+            except httpx.HTTPError as e:
+                log.error("❌ OANDA API Request Failed: %s", e)
+        else:
+            log.debug("✅ Candle cache up to date (%d candles).", len(_candle_cache[key][0]))
 
-        return complete_candles
+        with _cache_lock:
+            return _cached_window(key, count)
 
-    except requests.RequestException as e:
-        # Handle network or API errors
-        if ENABLE_LOGGING:
-            print(f"❌ OANDA API Request Failed: {str(e)}")
-        return []
+
+def store_completed_candles(candles: list, instrument: str = INSTRUMENT, granularity: str = GRANULARITY) -> int:
+    """
+    Appends completed candles built elsewhere (e.g. OANDA-shaped dicts from the
+    price stream) to the cache. Ignored until fetch_latest_data() has made the first full load.
+
+    Returns:
+        int: Number of candles appended
+    """
+    with _cache_lock:
+        key = (instrument, granularity)
+        if key not in _candle_cache:
+            return 0
+        return _append_candles(key, Candles.from_oanda(candles))
@@ -0,0 +1,217 @@
+# price_stream.py
+# 📡 OANDA pricing stream consumer — builds completed candles locally from live ticks
+
+import asyncio
+import json
+import threading
+from datetime import timedelta
+
+import httpx
+
+from config import (
+    OANDA_API_KEY, OANDA_ACCOUNT_ID, OANDA_STREAM_DOMAIN,
+    INSTRUMENT, GRANULARITY,
+    PRICE_STREAM_HEARTBEAT_TIMEOUT_SEC, PRICE_STREAM_RECONNECT_MAX_SEC, PRICE_STREAM_RECORD_PATH
+)
+from instrumentation import get_logger
+from oanda_connector import (
+    GRANULARITY_SECONDS, candle_bucket_start, fetch_latest_data,
+    format_oanda_time, parse_oanda_time, store_completed_candles
+)
+from resample import REPORT_CANDLE_COUNT
+
+log = get_logger("price_stream")
+
+
+# 🕯️ Tick → candle aggregation for one granularity
+class CandleBuilder:
+    """Aggregates mid-price ticks into OANDA-shaped completed candles."""
+
+    def __init__(self, granularity: str = GRANULARITY):
+        self.granularity = granularity
+        self.step = timedelta(seconds=GRANULARITY_SECONDS[granularity])
+        self.current = None
+        self.skip_partial = True
+
+    def reset(self):
+        """Drops the candle in progress — after a reconnect it has missed ticks."""
+        self.current = None
+        self.skip_partial = True
+
+    def advance(self, ts) -> list:
+        """Closes the candle in progress if `ts` is past its end (ticks or heartbeats)."""
+        if self.current is None or ts < self.current["end"]:
+            return []
+        done, self.current = self.current, None
+        if done["partial"]:
+            return []
+        return [self._to_oanda(done)]
+
+    def add_tick(self, ts, price: float, decimals: int) -> list:
+        completed = self.advance(ts)
+
+        if self.current is None:
+            start = candle_bucket_start(ts, self.granularity)
+            self.current = {
+                "start": start, "end": start + self.step, "partial": self.skip_partial,
+                "o": price, "h": price, "l": price, "c": price, "volume": 0, "decimals": decimals,
+            }
+            self.skip_partial = False
+        elif ts < self.current["start"]:
+            return completed  # late tick from an earlier bucket
+
+        candle = self.current
+        candle["h"] = max(candle["h"], price)
+        candle["l"] = min(candle["l"], price)
+        candle["c"] = price
+        candle["volume"] += 1
+        return completed
+
+    @staticmethod
+    def _to_oanda(candle: dict) -> dict:
+        d = candle["decimals"]
+        return {
+            "complete": True,
+            "volume": candle["volume"],
+            "time": format_oanda_time(candle["start"]),
+            "mid": {k: f"{candle[k]:.{d}f}" for k in ("o", "h", "l", "c")},
+        }
+
+
+# 🎞️ Offline stand-in for the live stream
+class ReplayTickSource:
+    """
+    Replays a recorded pricing stream (one JSON message per line, as written
+    with PRICE_STREAM_RECORD_PATH). speed=0 replays as fast as possible,
+    otherwise messages are paced by their own timestamps divided by `speed`.
+    """
+
+    def __init__(self, path: str, speed: float = 0):
+        self.path = path
+        self.speed = speed
+
+    async def __call__(self):
+        previous = None
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if self.speed:
+                    ts = parse_oanda_time(json.loads(line)["time"])
+                    if previous is not None:
+                        await asyncio.sleep(max(0.0, (ts - previous).total_seconds() / self.speed))
+                    previous = ts
+                yield line
+
+
+# 📡 Stream consumer with heartbeat watchdog and reconnect
+class PriceStreamConsumer:
+    """
+    Consumes OANDA's pricing stream for one instrument and pushes every candle
+    it completes into the oanda_connector cache, so fetch_latest_data() can
+    answer session triggers from memory.
+    """
+
+    def __init__(self, instrument: str = INSTRUMENT, granularities=(GRANULARITY,),
+                 source=None, record_path: str | None = PRICE_STREAM_RECORD_PATH):
+        self.instrument = instrument
+        self.builders = {g: CandleBuilder(g) for g in granularities}
+        self.source = source or self._live_lines
+        self.record_path = record_path
+        self.needs_backfill = True
+        self._stop = asyncio.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    async def _live_lines(self):
+        url = f"{OANDA_STREAM_DOMAIN}/v3/accounts/{OANDA_ACCOUNT_ID}/pricing/stream"
+        headers = {"Authorization": f"Bearer {OANDA_API_KEY}"}
+        timeout = httpx.Timeout(10.0, read=PRICE_STREAM_HEARTBEAT_TIMEOUT_SEC)
+
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            async with client.stream("GET", url, headers=headers, params={"instruments": self.instrument}) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if line:
+                        yield line
+
+    async def run(self, reconnect: bool = True):
+        """Runs until stop() is called (or, with reconnect=False, until the source is exhausted)."""
+        backoff = 1
+        recorder = open(self.record_path, "a", encoding="utf-8") if self.record_path else None
+
+        try:
+            while not self._stop.is_set():
+                for builder in self.builders.values():
+                    builder.reset()
+                self.needs_backfill = True
+                lines = self.source()
+
+                try:
+                    while not self._stop.is_set():
+                        line = await asyncio.wait_for(anext(lines), PRICE_STREAM_HEARTBEAT_TIMEOUT_SEC)
+                        if recorder:
+                            recorder.write(line + "\n")
+                        await self._handle_line(line)
+                        backoff = 1
+
+                except StopAsyncIteration:
+                    log.warning("⚠️ Price stream ended.")
+                    if not reconnect:
+                        return
+                except asyncio.TimeoutError:
+                    log.warning("⚠️ No price stream heartbeat for %ss — reconnecting.", PRICE_STREAM_HEARTBEAT_TIMEOUT_SEC)
+                except (httpx.HTTPError, ValueError, KeyError) as e:
+                    log.error("❌ Price stream error: %s", e)
+                finally:
+                    await lines.aclose()
+
+                if not reconnect:
+                    return
+                if not self._stop.is_set():
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, PRICE_STREAM_RECONNECT_MAX_SEC)
+        finally:
+            if recorder:
+                recorder.close()
+
+    async def _handle_line(self, line: str):
+        msg = json.loads(line)
+        ts = parse_oanda_time(msg["time"])
+
+        if msg.get("type") == "PRICE":
+            bid = msg["bids"][0]["price"]
+            ask = msg["asks"][0]["price"]
+            decimals = len(bid.partition(".")[2])
+            price = (float(bid) + float(ask)) / 2
+            completed = {g: b.add_tick(ts, price, decimals) for g, b in self.builders.items()}
+        else:
+            # HEARTBEAT — closes candles even when no tick arrives after the boundary
+            completed = {g: b.advance(ts) for g, b in self.builders.items()}
+
+        for granularity, candles in completed.items():
+            if candles:
+                await self._publish(granularity, candles)
+
+    async def _publish(self, granularity: str, candles: list):
+        if self.needs_backfill:
+            # Fill the gap left by the skipped partial candle via REST before appending — the sessions'
+            # own window, so a cold cache is loaded in full instead of with a candle or two
+            await asyncio.to_thread(fetch_latest_data, REPORT_CANDLE_COUNT, self.instrument, granularity)
+            self.needs_backfill = False
+
+        added = store_completed_candles(candles, self.instrument, granularity)
+        if added:
+            log.debug("📡 Stream closed %d %s candle(s) for %s: %s", added, granularity, self.instrument, candles[-1]["time"])
+
+
+# 🧵 Background runner for the synchronous session loop
+def start_price_stream_thread(instrument: str = INSTRUMENT, granularities=(GRANULARITY,)) -> threading.Thread:
+    """Starts the stream consumer on its own event loop in a daemon thread."""
+    consumer = PriceStreamConsumer(instrument, granularities)
+    thread = threading.Thread(target=asyncio.run, args=(consumer.run(),), name="price-stream", daemon=True)
+    thread.start()
+    log.info("📡 Price stream started for %s (%s)", instrument, ", ".join(granularities))
+    return thread
@@ -0,0 +1,77 @@
+# prompt_encoder.py
+# 🔡 Pluggable candle encoders for GPT prompts — full lines or compact base + tick offsets
+
+import logging
+
+import numpy as np
+
+from config import PROMPT_ENCODING, PROMPT_DELTA_DECIMALS, PROMPT_MAX_CANDLES, PROMPT_CANDLE_BUDGET_SHARE
+from candles import Candles
+from instrumentation import get_logger
+
+log = get_logger("prompt_encoder")
+
+
+def estimate_tokens(text: str) -> int:
+    """Same rough heuristic chat_completion() uses for its budget (~4 chars/token)."""
+    return len(text) // 4
+
+
+# 📄 Full mode — one absolute `time | O: H: L: C:` line per candle
+def encode_full(candles: Candles) -> str:
+    return candles.to_prompt_lines()
+
+
+# 📉 Delta mode — base price once, then integer tick offsets and minutes since the window start
+def encode_delta(candles: Candles, decimals: int | None = PROMPT_DELTA_DECIMALS) -> str:
+    """One tick is the last quoted decimal of the instrument (candles.decimals) unless `decimals` overrides it."""
+    if not len(candles):
+        return ""
+    if decimals is None:
+        decimals = candles.decimals
+
+    scale = 10 ** decimals
+    base = round(float(candles.open[0]), decimals)
+    ohlc = np.column_stack((candles.open, candles.high, candles.low, candles.close))
+    ticks = np.rint((ohlc - base) * scale).astype(np.int64)
+    minutes = ((candles.time - candles.time[0]) // np.timedelta64(1, "m")).astype(np.int64)
+
+    header = (
+        f"BASE {base:.{decimals}f} | TICK {1 / scale:.{decimals}f} | START {str(candles.time[0])[:16]}Z\n"
+        "min o h l c  (price = BASE + value × TICK, min = minutes since START)"
+    )
+    rows = "\n".join(map("%d %d %d %d %d".__mod__, zip(minutes.tolist(), *ticks.T.tolist())))
+    return f"{header}\n{rows}"
+
+
+# 🧩 Registry: name → (encoder, approx tokens per candle)
+ENCODERS = {
+    "full": (encode_full, 28),
+    "delta": (encode_delta, 10),
+}
+
+
+def register_encoder(name: str, encoder, tokens_per_candle: int):
+    """Adds a custom encoder selectable through PROMPT_ENCODING."""
+    ENCODERS[name] = (encoder, tokens_per_candle)
+
+
+def candle_cap(model_limit: int, encoding: str = PROMPT_ENCODING) -> int:
+    """Max candles a prompt may carry for a model: PROMPT_MAX_CANDLES or the context-window share, whichever is lower."""
+    tokens_per_candle = ENCODERS.get(encoding, ENCODERS["full"])[1]
+    return max(1, min(PROMPT_MAX_CANDLES, int(model_limit * PROMPT_CANDLE_BUDGET_SHARE) // tokens_per_candle))
+
+
+def encode_candles(candles: Candles, encoding: str = PROMPT_ENCODING) -> str:
+    """Encodes a window with the configured encoder and logs the token estimate against full mode."""
+    encoder = ENCODERS.get(encoding, ENCODERS["full"])[0]
+    text = encoder(candles)
+
+    if log.isEnabledFor(logging.DEBUG):
+        full_tokens = estimate_tokens(encode_full(candles)) if encoder is not encode_full else estimate_tokens(text)
+        tokens = estimate_tokens(text)
+        saved = 100 * (1 - tokens / full_tokens) if full_tokens else 0
+        log.debug("Candle encoding '%s': %d candles ≈ %d tokens (full ≈ %d, -%.0f%%)",
+                  encoding, len(candles), tokens, full_tokens, saved)
+
+    return text
@@ -2,10 +2,17 @@ import re
 import random
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from config import SESSION_WINDOWS
+from clock import utc_now
+from config import INSTRUMENT, SESSION_WINDOWS
+from html_engine import EMOJI_RE, clean_meta_lines, render_html, render_report_body, trim_html
+from instrumentation import traced
 
 MAX_TELEGRAM_MESSAGE_LENGTH = 4096
 
+# ⏱️ Static report parts rendered during the pre-session warm-up: (session, tz) → (rendered_at, quote, footer)
+_prerendered_frames = {}
+PRERENDER_MAX_AGE_SEC = 15 * 60
+
 SNIPER_QUOTES = [
     'Liquidity fuels intention. Timing defines direction.',
     'Smart money hides in silence, not noise.',
@@ -25,96 +32,109 @@ SNIPER_QUOTES = [
     'The choice is yours… execution defines reality.',
 ]
 
+def instrument_label(instrument: str = INSTRUMENT) -> str:
+    """OANDA instrument name as shown in reports and prompts (XAU_USD → XAU/USD)."""
+    return instrument.replace("_", "/")
+
 def remove_emojis(text: str) -> str:
     """Remove all emoji and pictographs from text."""
-    emoji_pattern = re.compile(
-        "["
-        "\U0001F600-\U0001F64F"
-        "\U0001F300-\U0001F5FF"
-        "\U0001F680-\U0001F6FF"
-        "\U0001F1E0-\U0001F1FF"
-        "\U00002500-\U00002BEF"
-        "\U00002702-\U000027B0"
-        "\U000024C2-\U0001F251"
-        "]+", flags=re.UNICODE
-    )
-    return emoji_pattern.sub("", text)
+    return EMOJI_RE.sub("", text)
 
 def format_price_values(text: str) -> str:
     """Bold numbers like 3427.50 unless already bolded."""
-    return re.sub(
-        r"\b(\d{3,5}\.\d{2})\b",
-        lambda m: f"<b>{m.group(1)}</b>"
-        if f"<b>{m.group(1)}</b>" not in text else m.group(1),
-        text
-    )
+    return render_html(text, bold_prices=True)
+
+SECTION_HEADER_RE = re.compile(r"^[ \t]*<b>[A-Z][A-Z &/\-]+</b>", re.MULTILINE)
+
+def split_report_sections(text: str, final: bool = False) -> list:
+    """
+    Complete report sections of (possibly still streaming) GPT output.
+    A section is complete once the next header has started, or when `final`.
+    """
+    starts = [m.start() for m in SECTION_HEADER_RE.finditer(text)]
+    if not starts:
+        return [text.strip()] if final and text.strip() else []
+    bounds = starts + [len(text)]
+    sections = [text[a:b].strip() for a, b in zip(bounds, bounds[1:])]
+    return sections if final else sections[:-1]
+
+BATCH_MARKER_RE = re.compile(r"^[ \t]*(?:<b>)?=+\s*SESSION:\s*(.+?)\s*=+(?:</b>)?[ \t]*$", re.MULTILINE | re.IGNORECASE)
+
+def split_batched_reports(text: str, session_names: list) -> dict:
+    """Splits a batched GPT answer on its `=== SESSION: name ===` markers → {session_name: report}."""
+    wanted = {name.lower(): name for name in session_names}
+    marks = list(BATCH_MARKER_RE.finditer(text))
+    reports = {}
+    for mark, nxt in zip(marks, marks[1:] + [None]):
+        name = wanted.get(mark.group(1).strip().lower())
+        body = text[mark.end():nxt.start() if nxt else len(text)].strip()
+        if name and body:
+            reports[name] = body
+    return reports
 
 def safe_trim_html(message: str, max_len: int) -> str:
     """Ensure HTML tags are not broken when trimming."""
-    if len(message) <= max_len:
-        return message
-    trimmed = message[:max_len]
-    for tag in ["b", "i"]:
-        if trimmed.count(f"<{tag}>") != trimmed.count(f"</{tag}>"):
-            trimmed += f"</{tag}>"
-    return trimmed + "..."
+    return trim_html(message, max_len)
 
 def clean_gpt_output(summary: str, session_name: str) -> str:
     """Remove any GPT-added headers, quotes, or date/time lines (plain or HTML)."""
-    # Remove GPT-added session headers
-    summary = re.sub(r"(?i)📍.*session summary.*", "", summary)
-    summary = re.sub(r"(?i)^.*session summary.*\n?", "", summary)
-
-    # Remove italicised quotes
-    summary = re.sub(r"<i>.*?</i>", "", summary)
+    return clean_meta_lines(summary)
 
-    # Remove Date, Session, Time, and Sentinel Report lines (HTML-safe and plain)
-    summary = re.sub(r"(?i)<b>\s*date\s*:.*?</b>.*", "", summary)
-    summary = re.sub(r"(?i)<b>\s*session\s*:.*?</b>.*", "", summary)
-    summary = re.sub(r"(?i)<b>\s*time\s*:.*?</b>.*", "", summary)
-    summary = re.sub(r"(?i)<b>\s*sentinelx\s*:?.*?</b>.*", "", summary)
-    summary = re.sub(r"(?i)<b>\s*xau/usd\s*\s*:?.*?</b>.*", "", summary)
-    summary = re.sub(r"(?im)^\s*date\s*:.*$", "", summary)
-    summary = re.sub(r"(?im)^\s*session\s*:.*$", "", summary)
-    summary = re.sub(r"(?im)^\s*time\s*:.*$", "", summary)
-    summary = re.sub(r"(?im)^\s*sentinelx\s*:?.*$", "", summary)
-    summary = re.sub(r"(?im)^\s*xau/usd\s*report\s*:?.*$", "", summary)
-
-    return summary.strip()
-
-
-def format_spectral_summary(summary: str, session_name: str, tz: str = "Europe/Rome") -> str:
-    """Final Telegram-ready summary with single header, quote, and session info."""
-    if not summary or not summary.strip():
-        return f"<b>{session_name} SESSION</b>\n\nNo valid summary generated."
-
-    # Clean GPT text
-    summary = clean_gpt_output(summary, session_name)
-    summary = remove_emojis(summary)
-    summary = format_price_values(summary)
 
+def render_report_frame(session_name: str, tz: str = "Europe/Rome", at: datetime | None = None) -> tuple[str, str]:
+    """Returns the (quote, footer) parts of a report — they don't depend on the GPT output."""
     # Add one controlled random quote
     quote = f"<i>{random.choice(SNIPER_QUOTES)}</i>"
 
     # Time & session info
     local_tz = ZoneInfo(tz)
-    utc_now = datetime.utcnow().replace(tzinfo=ZoneInfo("UTC"))
-    local_now = utc_now.astimezone(local_tz)
+    now_utc = at.astimezone(ZoneInfo("UTC")) if at else utc_now()
+    local_now = now_utc.astimezone(local_tz)
     time_local = local_now.strftime("%H:%M")
-    time_utc = utc_now.strftime("%H:%M UTC")
+    time_utc = now_utc.strftime("%H:%M UTC")
     date_str = local_now.strftime("%A, %d %B")
     session_window = SESSION_WINDOWS.get(session_name, "Time Window N/A")
 
+    footer = f"""<b>Date:</b> {date_str}
+<b>Session:</b> {session_name} ({session_window})
+<b>Time:</b> {time_local} {tz} | {time_utc}"""
+    return quote, footer
+
+
+def prerender_report_frame(session_name: str, at: datetime, tz: str = "Europe/Rome"):
+    """Renders the static report parts ahead of a session deadline (`at`)."""
+    _prerendered_frames[(session_name, tz)] = (at, *render_report_frame(session_name, tz, at))
+
+
+def _report_frame(session_name: str, tz: str) -> tuple[str, str]:
+    # Fresh while the deadline it shows is near — on the scheduler's clock (simulated in replays)
+    entry = _prerendered_frames.get((session_name, tz))
+    if entry and abs((utc_now() - entry[0]).total_seconds()) <= PRERENDER_MAX_AGE_SEC:
+        return entry[1], entry[2]
+    return render_report_frame(session_name, tz)
+
+
+@traced("formatting")
+def format_spectral_summary(summary: str, session_name: str, tz: str = "Europe/Rome",
+                            instrument: str = INSTRUMENT) -> str:
+    """Final Telegram-ready summary with single header, quote, and session info."""
+    if not summary or not summary.strip():
+        return f"<b>{session_name} SESSION · {instrument_label(instrument)}</b>\n\nNo valid summary generated."
+
+    # Clean GPT text — meta lines, emoji, price bolding and sanitizing in one token pass
+    summary = render_report_body(summary)
+
+    # Quote + date/session/time footer (pre-rendered at warm-up when available)
+    quote, footer = _report_frame(session_name, tz)
+
     # Final message
-    formatted = f"""<b>SENTINELx XAU/USD REPORT</b>
+    formatted = f"""<b>SENTINELx {instrument_label(instrument)} REPORT</b>
 
 {summary}
 
 {quote}
 
-<b>Date:</b> {date_str}
-<b>Session:</b> {session_name} ({session_window})
-<b>Time:</b> {time_local} {tz} | {time_utc}
+{footer}
 """
 
-    return safe_trim_html(formatted, MAX_TELEGRAM_MESSAGE_LENGTH)
+    return trim_html(formatted, MAX_TELEGRAM_MESSAGE_LENGTH)
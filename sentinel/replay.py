@@ -0,0 +1,381 @@
+# replay.py
+# ⏪ Accelerated replay — the real asyncio session loop on a simulated clock, against local OANDA/OpenAI/Telegram stubs
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs
+
+import numpy as np
+
+import clock
+import gpt_analysis
+import gpt_cache
+import job_queue
+import log_writer
+import main
+import oanda_connector
+import telegram_alert
+from candles import Candles
+from config import SESSIONS, INSTRUMENT, GRANULARITY, LOCAL_TZ
+from http_client import close_async_http_client
+from oanda_connector import GRANULARITY_SECONDS
+from session_tracker import SessionScheduler, is_metals_market_open
+from stub_servers import FakeOanda, FakeOpenAI, FakeTelegram
+
+REPLAY_DIR = os.path.join(os.path.dirname(__file__), "replay_runs")
+HISTORY_LEAD_DAYS = 4  # candles before the replay start, so the first session has a full window
+SESSION_FOOTER_RE = re.compile(r"<b>Session:</b> (.+?) \(")
+PROMPT_TICK_RE = re.compile(r"TICK (\d+\.\d+)")  # delta-encoded candle blocks (prompt_encoder.encode_delta)
+
+
+class SimulatedClock:
+    """
+    Virtual UTC clock. While anything else runs on the event loop (pipelines,
+    warm-up), virtual time moves with real time, so measured latencies are the
+    real ones. Idle waits are skipped — or, with `speed`, take 1/speed of their
+    virtual length (speed=1000 → an hour's wait in 3.6s). When several tasks
+    sleep on the clock at once, the loop is idle and the earliest one wakes.
+    """
+
+    def __init__(self, start: datetime, speed: float | None = None):
+        self._base = start.astimezone(timezone.utc)
+        self._t0 = time.monotonic()
+        self.speed = speed
+        self._sleeping = {}  # task → virtual wake-up time
+
+    def now(self) -> datetime:
+        return self._base + timedelta(seconds=time.monotonic() - self._t0)
+
+    def _jump_to(self, target: datetime):
+        ahead = target - self.now()
+        if ahead > timedelta(0):
+            self._base += ahead
+
+    def sleep(self, seconds: float):
+        target = self.now() + timedelta(seconds=seconds)
+        if self.speed:
+            time.sleep(seconds / self.speed)
+        self._jump_to(target)
+
+    def _idle_until(self, current: asyncio.Task, target: datetime) -> bool:
+        """True when every other task is sleeping on this clock too, none of them due before `target`."""
+        return all(t is current or (t in self._sleeping and self._sleeping[t] >= target) for t in asyncio.all_tasks())
+
+    async def async_sleep(self, seconds: float):
+        target = self.now() + timedelta(seconds=seconds)
+        current = asyncio.current_task()
+        self._sleeping[current] = target
+        try:
+            while self.now() < target and not self._idle_until(current, target):
+                await asyncio.sleep(min(0.005, (target - self.now()).total_seconds()))
+            if self.speed and self.now() < target:
+                await asyncio.sleep((target - self.now()).total_seconds() / self.speed)
+            self._jump_to(target)
+        finally:
+            del self._sleeping[current]
+
+
+class RecordingScheduler(SessionScheduler):
+    """SessionScheduler that logs every trigger (virtual time, deadline, sessions) to `triggers`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.triggers = []
+
+    def wait_for_next(self) -> list:
+        deadline = self.next_deadline()
+        due = super().wait_for_next()
+        self.triggers.append({"at": self.clock(), "deadline": deadline, "sessions": due})
+        return due
+
+    async def wait_for_next_async(self) -> list:
+        deadline = self.next_deadline()
+        due = await super().wait_for_next_async()
+        self.triggers.append({"at": self.clock(), "deadline": deadline, "sessions": due})
+        return due
+
+
+# 🕯️ Candle sources
+# Synthetic price profile per instrument: (start price, 5m close step σ, quoted decimals); others fall back to XAU
+SYNTHETIC_PROFILES = {
+    "XAU_USD": (3350, 0.8, 3),
+    "XAG_USD": (38, 0.02, 5),
+    "EUR_USD": (1.16, 0.0002, 5),
+    "USD_JPY": (150, 0.03, 3),
+}
+
+
+def synthetic_history(start: datetime, end: datetime, granularity: str = GRANULARITY, seed: int = 7,
+                      instrument: str = INSTRUMENT) -> Candles:
+    """Random-walk candles for every open-market bucket between `start` and `end`, priced like `instrument`."""
+    step = GRANULARITY_SECONDS[granularity]
+    first = oanda_connector.candle_bucket_start(start, granularity)
+    buckets = [first + timedelta(seconds=i * step) for i in range(int((end - first).total_seconds() // step))]
+    buckets = [b for b in buckets if is_metals_market_open(b)]
+
+    price, sigma, decimals = SYNTHETIC_PROFILES.get(instrument, SYNTHETIC_PROFILES[INSTRUMENT])
+    rng = np.random.default_rng(seed)
+    count = len(buckets)
+    close = price + np.cumsum(rng.normal(0, sigma, count))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    wick = np.abs(rng.normal(0, sigma * 0.75, (2, count)))
+    return Candles(
+        np.array([b.replace(tzinfo=None) for b in buckets], dtype="datetime64[ns]"),
+        open_,
+        np.maximum(open_, close) + wick[0],
+        np.minimum(open_, close) - wick[1],
+        close,
+        rng.integers(50, 900, count),
+        decimals,
+    )
+
+
+def _instrument_history(start: datetime, end: datetime, instrument: str) -> Candles:
+    return synthetic_history(start, end, instrument=instrument)
+
+
+def load_history(path: str) -> Candles:
+    """Candles from a saved OANDA response (`{"candles": [...]}`) or a plain list of candle dicts."""
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    candles = raw["candles"] if isinstance(raw, dict) else raw
+    return Candles.from_oanda([c for c in candles if c.get("complete", True)])
+
+
+# 🔌 Wiring
+@contextlib.contextmanager
+def _patched(patches: list):
+    """Sets (module, attribute, value) triples, restoring the originals on exit."""
+    originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    try:
+        for module, name, value in patches:
+            setattr(module, name, value)
+        yield
+    finally:
+        for module, name, value in reversed(originals):
+            setattr(module, name, value)
+
+
+async def _run_async_loop(scheduler: SessionScheduler, end: datetime):
+    try:
+        await main.run_scheduled_sessions_async(scheduler=scheduler, until=end)
+    finally:
+        # Pools are bound to this event loop — close them before asyncio.run() closes it
+        await close_async_http_client()
+        if gpt_analysis.async_client is not None:
+            await gpt_analysis.async_client.close()
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_replay(start: datetime, days: float = 7, speed: float | None = None, history: Candles | None = None,
+               sessions: dict | None = None, out_dir: str | None = None, quiet: bool = True,
+               gpt_latency: float = 0.0, telegram_latency: float = 0.0, oanda_latency: float = 0.0,
+               error_rate: float = 0.0, sync: bool = False, patches: list = (), gpt_options: dict | None = None) -> dict:
+    """
+    Replays every session between `start` and `start + days` through
+    main.run_scheduled_sessions_async() (or the blocking run_scheduled_sessions()
+    with `sync`): real scheduler, fetch, GPT, formatting and Telegram code; stub
+    servers (with the given latencies and error rate) and a simulated clock underneath.
+    `patches` are extra (module, attribute, value) overrides for the run;
+    `gpt_options` go to FakeOpenAI (per-model latency, slow tail, empty answers).
+    Without `history`, every instrument gets its own synthetic_history().
+
+    Writes trace.jsonl (one line per trigger and delivery, with the message text),
+    the run's logs/ and, with `quiet`, the pipeline output to replay.log.
+    Returns the summary dict.
+    """
+    from openai import AsyncOpenAI, OpenAI
+
+    start = start.astimezone(timezone.utc)
+    end = start + timedelta(days=days)
+    out_dir = out_dir or os.path.join(REPLAY_DIR, f"{start:%Y%m%d}-{days:g}d-{datetime.now():%H%M%S}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    sim = SimulatedClock(start, speed)
+    if history is None:
+        # One history per instrument, built on its first request — whatever INSTRUMENTS the run patches in
+        history = functools.lru_cache(maxsize=None)(functools.partial(
+            _instrument_history, start - timedelta(days=HISTORY_LEAD_DAYS), end + timedelta(days=1)))
+    scheduler = RecordingScheduler(sessions or SESSIONS, clock=sim.now,
+                                   sleep=sim.sleep, async_sleep=sim.async_sleep)
+    deliveries = []
+
+    def record_delivery(session_name, deadline):
+        deliveries.append({"session": session_name, "deadline": deadline, "at": sim.now()})
+        record_delivery_latency(session_name, deadline)
+
+    record_delivery_latency = main.record_delivery_latency
+    writer = log_writer.LogWriter(log_dir=os.path.join(out_dir, "logs"),
+                                  failure_dir=os.path.join(out_dir, "telegram_logs")).start()
+    step_sec = GRANULARITY_SECONDS[GRANULARITY]
+
+    with FakeOanda(history, sim.now, step_sec=step_sec, latency=oanda_latency, error_rate=error_rate,
+                   clock=sim.now) as oanda, \
+            FakeOpenAI(chunk_delay=0, latency=gpt_latency, error_rate=error_rate, clock=sim.now,
+                       **(gpt_options or {})) as gpt, \
+            FakeTelegram(latency=telegram_latency, error_rate=error_rate, clock=sim.now) as tg:
+        bot = f"{tg.url}/botreplay"
+        patches = [
+            (oanda_connector, "OANDA_CANDLES_URL", f"{oanda.url}/v3/instruments/{INSTRUMENT}/candles"),
+            (oanda_connector, "OANDA_DOMAIN", oanda.url),  # other instruments (INSTRUMENTS)
+            (oanda_connector, "_candle_cache", {}),
+            (oanda_connector, "_fetch_locks", {}),
+            (oanda_connector, "_async_fetch_locks", {}),
+            (gpt_analysis, "client", OpenAI(api_key="replay", base_url=f"{gpt.url}/v1")),
+            (gpt_analysis, "async_client", AsyncOpenAI(api_key="replay", base_url=f"{gpt.url}/v1")),
+            (gpt_cache, "_cache", gpt_cache.GPTResponseCache(cache_dir=os.path.join(out_dir, "gpt_cache"))),
+            (gpt_analysis, "model_latencies", gpt_analysis.LatencyTracker()),
+            (gpt_analysis, "path_latencies", gpt_analysis.LatencyTracker()),
+            (telegram_alert, "TELEGRAM_MSG_URL", f"{bot}/sendMessage"),
+            (telegram_alert, "TELEGRAM_EDIT_URL", f"{bot}/editMessageText"),
+            (telegram_alert, "TELEGRAM_GETME_URL", f"{bot}/getMe"),
+            (log_writer, "_writer", writer),
+            (job_queue, "_queue", job_queue.JobQueue(os.path.join(out_dir, "job_queue.sqlite"))),
+            (main, "ENABLE_PRICE_STREAM", False),
+            (main, "ENABLE_TELEGRAM_QUEUE", False),  # direct sends — no spool shared with a live bot
+            (main, "record_delivery_latency", record_delivery),
+            *patches,
+        ]
+
+        real_start = time.perf_counter()
+        with _patched(patches), open(os.path.join(out_dir, "replay.log"), "w", encoding="utf-8") as log, \
+                contextlib.redirect_stdout(log) if quiet else contextlib.nullcontext():
+            clock.set_clock(sim.now)
+            try:
+                if sync:
+                    main.run_scheduled_sessions(scheduler=scheduler, until=end)
+                else:
+                    asyncio.run(_run_async_loop(scheduler, end))
+            finally:
+                clock.set_clock(None)
+                writer.flush()
+            gpt_paths = gpt_analysis.gpt_path_summary()
+        real_elapsed = time.perf_counter() - real_start
+
+        sends = [(at, _parse_form(body)) for at, _, path, body in tg.calls
+                 if path.endswith("/sendMessage")]
+        gpt_requests = sum(path.endswith("/chat/completions") for _, _, path, _ in gpt.calls)
+        prompt_ticks = sorted({tick for _, _, path, body in gpt.calls if path.endswith("/chat/completions")
+                               for tick in PROMPT_TICK_RE.findall(body.decode("utf-8"))})
+        oanda_requests = len(oanda.calls)
+
+    summary = _write_trace(out_dir, scheduler, deliveries, sends, start, end)
+    summary.update({
+        "start": start.isoformat(), "end": end.isoformat(), "out_dir": out_dir,
+        "real_seconds": round(real_elapsed, 2),
+        "speedup": round((end - start).total_seconds() / real_elapsed) if real_elapsed else None,
+        "gpt_requests": gpt_requests, "oanda_requests": oanda_requests, "telegram_sends": len(sends),
+        "gpt_paths": gpt_paths, "prompt_ticks": prompt_ticks,
+    })
+    return summary
+
+
+def _parse_form(body: bytes) -> dict:
+    return {k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()}
+
+
+def _write_trace(out_dir: str, scheduler: RecordingScheduler, deliveries: list, sends: list,
+                 start: datetime, end: datetime) -> dict:
+    """trace.jsonl plus the checks: missed sessions, latency spread, DST shifts of trigger times."""
+    events = [{"event": "trigger", "at": t["at"], "deadline": t["deadline"], "sessions": t["sessions"]}
+              for t in scheduler.triggers]
+    events += [{"event": "delivery", **d, "latency_sec": round((d["at"] - d["deadline"]).total_seconds(), 3)}
+               for d in deliveries if d["deadline"]]
+    for at, form in sends:
+        match = SESSION_FOOTER_RE.search(form.get("text", ""))
+        events.append({"event": "telegram", "at": at, "chat_id": form.get("chat_id"),
+                       "session": match.group(1) if match else None, "text": form.get("text", "")})
+    events.sort(key=lambda e: e["at"])
+
+    with open(os.path.join(out_dir, "trace.jsonl"), "w", encoding="utf-8") as f:
+        for e in events:
+            f.write(json.dumps(e, ensure_ascii=False, default=lambda v: v.isoformat()) + "\n")
+
+    # Expected schedule, straight from the scheduler's own day compiler
+    expected = []
+    day = start.astimezone(LOCAL_TZ).date()
+    while day <= end.astimezone(LOCAL_TZ).date():
+        expected += [(d, s) for d, s in scheduler.compile_day(day) if start <= d <= end]
+        day += timedelta(days=1)
+    triggered = {(t["deadline"], s) for t in scheduler.triggers for s in t["sessions"]}
+    missed = sorted(set(expected) - triggered)
+
+    # Trigger time per session in UTC — a DST change shows up as a second time
+    utc_times = {}
+    for deadline, session_name in sorted(expected):
+        hhmm = f"{deadline:%H:%M}"
+        if hhmm not in utc_times.setdefault(session_name, {}):
+            utc_times[session_name][hhmm] = f"{deadline.astimezone(LOCAL_TZ):%Y-%m-%d}"
+
+    latencies = sorted(e["latency_sec"] for e in events if e["event"] == "delivery")
+    return {
+        "sessions_expected": len(expected),
+        "sessions_triggered": len(triggered),
+        "missed": [f"{d:%Y-%m-%d %H:%M} UTC {s}" for d, s in missed],
+        "deliveries": len(latencies),
+        "latency_p50": _percentile(latencies, 0.5) if latencies else None,
+        "latency_p95": _percentile(latencies, 0.95) if latencies else None,
+        "latency_max": latencies[-1] if latencies else None,
+        "dst_shifts": {name: times for name, times in utc_times.items() if len(times) > 1},
+    }
+
+
+def print_summary(summary: dict):
+    print(f"\n⏪ Replay {summary['start'][:16]} → {summary['end'][:16]} "
+          f"in {summary['real_seconds']}s real ({summary['speedup']}x)")
+    print(f"   Sessions: {summary['sessions_triggered']}/{summary['sessions_expected']} triggered, "
+          f"{summary['deliveries']} delivered | requests: OANDA {summary['oanda_requests']}, "
+          f"GPT {summary['gpt_requests']}, Telegram {summary['telegram_sends']}")
+    if summary["deliveries"]:
+        print(f"   Trigger-to-delivery: p50 {summary['latency_p50']:.2f}s p95 {summary['latency_p95']:.2f}s "
+              f"max {summary['latency_max']:.2f}s")
+    if len(summary["gpt_paths"]) > 1:
+        print("   GPT answers: " + ", ".join(f"{path} {s['wins']} (p95 {s['p95']:.2f}s)"
+                                          for path, s in summary["gpt_paths"].items()))
+    if summary["prompt_ticks"]:
+        print(f"   Prompt candle ticks: {', '.join(summary['prompt_ticks'])}")
+    for session_name, times in summary["dst_shifts"].items():
+        print(f"   🕒 {session_name}: " + " → ".join(f"{hhmm} UTC (from {day})" for hhmm, day in times.items()))
+    for missed in summary["missed"][:10]:
+        print(f"   ⚠️ Missed: {missed}")
+    print(f"   Trace: {os.path.join(summary['out_dir'], 'trace.jsonl')}")
+
+
+# 🟢 Direct Execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the session loop on a simulated clock against local stubs.")
+    parser.add_argument("--start", default="2025-10-20", help="YYYY-MM-DD[THH:MM] local time (LOCAL_TZ)")
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--speed", type=float, help="pace idle waits (e.g. 1000); default skips them")
+    parser.add_argument("--candles", help="saved OANDA candles JSON (default: synthetic random walk)")
+    parser.add_argument("--gpt-latency", type=float, default=0.0, help="seconds added to every GPT response")
+    parser.add_argument("--telegram-latency", type=float, default=0.0)
+    parser.add_argument("--instruments", help="comma-separated, e.g. XAU_USD,XAG_USD (default: config.INSTRUMENTS)")
+    parser.add_argument("--no-warm-up", action="store_true", help="skip the pre-session warm-up (cold report frames)")
+    parser.add_argument("--job-queue", action="store_true", help="enqueue due batches and run them as claimed jobs")
+    parser.add_argument("--out", help="output directory (default: replay_runs/…)")
+    parser.add_argument("--verbose", action="store_true", help="pipeline output on the console")
+    args = parser.parse_args()
+
+    start_at = datetime.fromisoformat(args.start).replace(tzinfo=LOCAL_TZ)
+    overrides = [(main, "INSTRUMENTS", args.instruments.split(","))] if args.instruments else []
+    if args.no_warm_up:
+        overrides.append((main, "SESSION_WARMUP_LEAD_SEC", 0))
+    if args.job_queue:
+        overrides.append((main, "ENABLE_JOB_QUEUE", True))
+    print_summary(run_replay(
+        start_at, args.days, args.speed, history=load_history(args.candles) if args.candles else None,
+        out_dir=args.out, quiet=not args.verbose,
+        gpt_latency=args.gpt_latency, telegram_latency=args.telegram_latency,
+        patches=overrides,
+    ))
@@ -0,0 +1,158 @@
+# resample.py
+# 🧮 Higher-timeframe candles built locally from the finest fetched granularity — OANDA bucket boundaries, no extra requests
+
+import json
+from datetime import timedelta, timezone
+
+import numpy as np
+
+from candles import Candles
+from config import GRANULARITY, INSTRUMENT, ENABLE_HTF_CONTEXT, HTF_CONTEXT_BARS
+from oanda_connector import GRANULARITY_SECONDS, candle_bucket_start, fetch_latest_data, fetch_latest_data_async
+
+NS = 1_000_000_000
+
+
+# 🕔 Bucket alignment
+def _trading_day_starts(first_ns: int, last_ns: int) -> np.ndarray:
+    """Every trading-day boundary (17:00 New York, DST-aware) from the one containing `first_ns` past `last_ns`."""
+    to_dt = lambda ns: np.datetime64(ns, "ns").astype("datetime64[us]").item().replace(tzinfo=timezone.utc)
+    day = candle_bucket_start(to_dt(first_ns), "D")
+    end = to_dt(last_ns)
+    starts = [day]
+    while day <= end:
+        # +25h always lands in the next trading day, whether the current one has 23, 24 or 25 hours
+        day = candle_bucket_start(day + timedelta(hours=25), "D")
+        starts.append(day)
+    return np.array([int(d.timestamp()) * NS for d in starts], dtype=np.int64)
+
+
+def bucket_starts(times: np.ndarray, granularity: str) -> np.ndarray:
+    """
+    Vectorized candle_bucket_start() over a datetime64[ns] array.
+    Granularities that divide an hour align to the UTC clock; H2 and up count
+    from the trading-day boundary, so their buckets move with New York DST.
+    """
+    ns = times.astype("datetime64[ns]").astype(np.int64)
+    step = GRANULARITY_SECONDS[granularity] * NS
+    if not len(ns) or (3600 * NS) % step == 0:
+        return (ns - ns % step).astype("datetime64[ns]")
+
+    days = _trading_day_starts(int(ns[0]), int(ns[-1]))
+    day_start = days[np.searchsorted(days, ns, side="right") - 1]
+    if granularity == "D":
+        return day_start.astype("datetime64[ns]")
+    return (day_start + (ns - day_start) // step * step).astype("datetime64[ns]")
+
+
+def _bucket_ends(starts: np.ndarray, granularity: str) -> np.ndarray:
+    ns = starts.astype(np.int64)
+    if granularity != "D":
+        return (ns + GRANULARITY_SECONDS[granularity] * NS).astype("datetime64[ns]")
+    days = _trading_day_starts(int(ns[0]), int(ns[-1]))
+    return days[np.searchsorted(days, ns, side="right")].astype("datetime64[ns]")
+
+
+# 🧺 Aggregation
+def resample_candles(candles: Candles, granularity: str, source_granularity: str = GRANULARITY,
+                     complete_only: bool = True) -> Candles:
+    """
+    Aggregates `candles` (complete `source_granularity` candles, oldest first)
+    into `granularity` bars: first open, max high, min low, last close, summed volume.
+
+    With `complete_only`, a bucket the window only partly covers is dropped:
+    the first one when the window starts after its boundary, the last one while
+    its end lies beyond the newest source candle.
+    """
+    if GRANULARITY_SECONDS[granularity] <= GRANULARITY_SECONDS[source_granularity]:
+        raise ValueError(f"Cannot build {granularity} from {source_granularity} candles")
+    if not len(candles):
+        return Candles.empty(candles.decimals)
+
+    buckets = bucket_starts(candles.time, granularity)
+    first = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    last = np.append(first[1:], len(candles)) - 1
+    bars = Candles(
+        buckets[first],
+        candles.open[first],
+        np.maximum.reduceat(candles.high, first),
+        np.minimum.reduceat(candles.low, first),
+        candles.close[last],
+        np.add.reduceat(candles.volume, first),
+        candles.decimals,
+    )
+    if not complete_only:
+        return bars
+
+    keep = np.ones(len(bars), dtype=bool)
+    keep[0] = candles.time[0] == bars.time[0]
+    covered_until = candles.time[-1] + np.timedelta64(GRANULARITY_SECONDS[source_granularity], "s")
+    keep[-1] &= covered_until >= _bucket_ends(bars.time[-1:], granularity)[0]
+    return bars[keep] if not keep.all() else bars
+
+
+def resample_many(candles: Candles, granularities, source_granularity: str = GRANULARITY) -> dict:
+    """{granularity: complete bars} for several timeframes from one window."""
+    return {g: resample_candles(candles, g, source_granularity) for g in granularities}
+
+
+def source_count(bars: dict, source_granularity: str = GRANULARITY) -> int:
+    """Source candles needed for `bars` ({granularity: bar count}), capped at OANDA's 5000 per request."""
+    step = GRANULARITY_SECONDS[source_granularity]
+    # +1 bar: the oldest bucket is usually cut by the window start
+    needed = max(((count + 1) * GRANULARITY_SECONDS[g] // step for g, count in bars.items()), default=0)
+    return min(needed, 4999)
+
+
+# 🕯️ Candles the session pipelines fetch per report — enough history for the higher-timeframe bars when enabled
+REPORT_CANDLE_COUNT = max(50, source_count(HTF_CONTEXT_BARS)) if ENABLE_HTF_CONTEXT else 50
+
+
+# 🌐 One fetch, every timeframe
+def fetch_timeframes(bars: dict, instrument: str = INSTRUMENT, granularity: str = GRANULARITY) -> dict:
+    """
+    {granularity: last `count` complete bars} for `bars` ({"H1": 24, "H4": 12…}),
+    built from a single cached `granularity` window — later calls only fetch the new candles.
+    """
+    candles = fetch_latest_data(source_count(bars, granularity), instrument, granularity)
+    return {g: resample_candles(candles, g, granularity)[-count:] for g, count in bars.items()}
+
+
+async def fetch_timeframes_async(bars: dict, instrument: str = INSTRUMENT, granularity: str = GRANULARITY) -> dict:
+    candles = await fetch_latest_data_async(source_count(bars, granularity), instrument, granularity)
+    return {g: resample_candles(candles, g, granularity)[-count:] for g, count in bars.items()}
+
+
+# 🔍 Verification against recorded OANDA responses
+def _load_oanda(path: str) -> Candles:
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    candles = raw["candles"] if isinstance(raw, dict) else raw
+    return Candles.from_oanda([c for c in candles if c.get("complete", True)])
+
+
+def compare_candles(built: Candles, reference: Candles, decimals: int | None = None) -> list:
+    """
+    Bar-for-bar differences between locally built bars and OANDA's own, over
+    the buckets both cover. Returns one description per mismatch (empty = identical).
+    """
+    d = decimals if decimals is not None else reference.decimals
+    common = np.intersect1d(built.time, reference.time)
+    mismatches = [f"{t}: missing locally" for t in np.setdiff1d(reference.time, built.time)
+                  if built.time[0] <= t <= built.time[-1]] if len(built) else []
+    b = built[np.isin(built.time, common)]
+    r = reference[np.isin(reference.time, common)]
+    for field in ("open", "high", "low", "close"):
+        diff = np.flatnonzero(np.round(getattr(b, field), d) != np.round(getattr(r, field), d))
+        mismatches += [f"{b.time[i]} {field}: {getattr(b, field)[i]:.{d}f} ≠ {getattr(r, field)[i]:.{d}f}" for i in diff]
+    diff = np.flatnonzero(b.volume != r.volume)
+    mismatches += [f"{b.time[i]} volume: {b.volume[i]} ≠ {r.volume[i]}" for i in diff]
+    return mismatches
+
+
+def verify_against_oanda(fine_path: str, coarse_path: str, granularity: str,
+                         source_granularity: str = GRANULARITY) -> tuple[int, list]:
+    """Resamples a saved `source_granularity` response and checks it against a saved `granularity` one → (bars compared, mismatches)."""
+    built = resample_candles(_load_oanda(fine_path), granularity, source_granularity)
+    reference = _load_oanda(coarse_path)
+    return int(np.isin(built.time, reference.time).sum()), compare_candles(built, reference)
@@ -1,71 +1,178 @@
 # session_tracker.py
-from datetime import datetime, timedelta, timezone
+import asyncio
+import heapq
+import time
+from datetime import datetime, date, timedelta, timezone
 from typing import Optional
-from config import SESSIONS, LOCAL_TZ, local_to_utc  # ✅ use your helpers
+from zoneinfo import ZoneInfo
+from config import SESSIONS, LOCAL_TZ, SESSION_BATCH_WINDOW_SEC
+from clock import utc_now
 
-# 🧠 Tracks last triggered time for each session (per UTC date)
-last_triggered_sessions = {}
-last_reset_date = datetime.now(timezone.utc).date()
+# ⛑️ Catch-up window: a deadline missed by up to 5 min (late start, long pipeline) still fires
+MISSED_TRIGGER_GRACE_SEC = 5 * 60
 
-# ⏳ Make the window forgiving (±90s protects against drift & processing delay)
-SESSION_TRIGGER_WINDOW_SEC = 90
+# 💤 Longest single sleep — guards against wall-clock jumps (NTP, suspend) during long waits
+MAX_SLEEP_SEC = 60 * 60
 
-# ⛑️ Optional catch-up window: if we missed the exact time, allow fire within +5 min
-MISSED_TRIGGER_GRACE_SEC = 5 * 60
+# 🏦 Metals trading week: Sunday 18:00 → Friday 17:00 New York time
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN_HOUR = 18   # Sunday
+MARKET_CLOSE_HOUR = 17  # Friday
+
+
+def is_metals_market_open(utc_dt: datetime) -> bool:
+    """True between the Sunday 18:00 open and the Friday 17:00 close (New York), DST-aware."""
+    ny = utc_dt.astimezone(MARKET_TZ)
+    weekday = ny.weekday()
+    if weekday == 5:  # Saturday
+        return False
+    if weekday == 4 and (ny.hour, ny.minute, ny.second) > (MARKET_CLOSE_HOUR, 0, 0):
+        return False
+    if weekday == 6 and ny.hour < MARKET_OPEN_HOUR:
+        return False
+    return True
 
-def _scheduled_time_utc_for_today(session_name: str) -> datetime:
+
+class SessionScheduler:
     """
-    Build today's scheduled datetime in LOCAL_TZ for the session, then convert to UTC.
+    Deadline-driven session trigger.
+
+    Each local day's SESSIONS are converted to UTC once (DST-safe through
+    LOCAL_TZ) and kept in a min-heap; sessions that fall while the metals
+    market is closed are left out. Callers sleep until the next deadline and
+    get back every session due at that instant.
+
+    `clock`, `sleep` and `async_sleep` can be swapped for a simulated clock.
     """
-    # Get the local date 'today' according to LOCAL_TZ
-    now_local = datetime.now(LOCAL_TZ)
-    # Build a local datetime for today at the configured local time
-    sess_local_dt = now_local.replace(
-        hour=SESSIONS[session_name].hour,
-        minute=SESSIONS[session_name].minute,
-        second=0,
-        microsecond=0
-    )
-    # Convert that local time to UTC using provided helper
-    return local_to_utc(sess_local_dt)
+
+    def __init__(self, sessions: dict = SESSIONS, clock=utc_now, sleep=time.sleep, async_sleep=asyncio.sleep):
+        self.sessions = sessions
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self._heap = []
+        self._next_day = self.clock().astimezone(LOCAL_TZ).date()
+
+    def compile_day(self, local_day: date) -> list:
+        """UTC deadlines for one local day, as (deadline, session_name) tuples."""
+        schedule = []
+        for session_name, session_time in self.sessions.items():
+            local_dt = datetime.combine(local_day, session_time, tzinfo=LOCAL_TZ)
+            deadline = local_dt.astimezone(timezone.utc)
+            if is_metals_market_open(deadline):
+                schedule.append((deadline, session_name))
+        return schedule
+
+    def _ensure_compiled(self):
+        """Compiles the following day(s) once the heap runs dry (skips closed weekend days)."""
+        now = self.clock()
+        for _ in range(8):
+            if self._heap:
+                return
+            for deadline, session_name in self.compile_day(self._next_day):
+                # Drop deadlines already beyond the catch-up grace (e.g. started mid-day)
+                if (now - deadline).total_seconds() <= MISSED_TRIGGER_GRACE_SEC:
+                    heapq.heappush(self._heap, (deadline, session_name))
+            self._next_day += timedelta(days=1)
+
+    def next_deadline(self) -> Optional[datetime]:
+        self._ensure_compiled()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self) -> list:
+        """Pops every session whose deadline has passed (within the catch-up grace)."""
+        now = self.clock()
+        due = []
+        while self.next_deadline() is not None and self._heap[0][0] <= now:
+            deadline, session_name = heapq.heappop(self._heap)
+            if (now - deadline).total_seconds() <= MISSED_TRIGGER_GRACE_SEC:
+                due.append(session_name)
+        return due
+
+    def pop_following(self, window_sec: float = SESSION_BATCH_WINDOW_SEC) -> list:
+        """Pops sessions due within `window_sec` from now, so they run with the sessions due now."""
+        if window_sec <= 0:
+            return []
+        until = self.clock() + timedelta(seconds=window_sec)
+        following = []
+        while self._heap and self._heap[0][0] <= until:
+            following.append(heapq.heappop(self._heap)[1])
+        return following
+
+    def sessions_at(self, deadline: datetime) -> list:
+        """Sessions scheduled at exactly `deadline` (without popping them)."""
+        return sorted(name for d, name in self._heap if d == deadline)
+
+    def sleep_until(self, when: datetime):
+        while (remaining := (when - self.clock()).total_seconds()) > 0:
+            self.sleep(min(remaining, MAX_SLEEP_SEC))
+
+    async def sleep_until_async(self, when: datetime):
+        while (remaining := (when - self.clock()).total_seconds()) > 0:
+            await self.async_sleep(min(remaining, MAX_SLEEP_SEC))
+
+    def seconds_until_next(self) -> float:
+        deadline = self.next_deadline()
+        if deadline is None:
+            return MAX_SLEEP_SEC
+        return max(0.0, (deadline - self.clock()).total_seconds())
+
+    def wait_for_next(self) -> list:
+        """Blocks until the next deadline and returns all sessions due then."""
+        while True:
+            due = self.pop_due()
+            if due:
+                return due + self.pop_following()
+            self.sleep(min(self.seconds_until_next(), MAX_SLEEP_SEC))
+
+    async def wait_for_next_async(self) -> list:
+        """Asyncio counterpart of wait_for_next()."""
+        while True:
+            due = self.pop_due()
+            if due:
+                return due + self.pop_following()
+            await self.async_sleep(min(self.seconds_until_next(), MAX_SLEEP_SEC))
+
+
+# 🌍 Process-wide scheduler behind check_sessions()
+_default_scheduler = None
+_pending_sessions = []
+
 
 def check_sessions() -> Optional[str]:
     """
-    Timezone-aware session trigger:
-    - Converts local session times to UTC at runtime (DST-safe).
-    - Resets daily memory at UTC midnight.
-    - Fires once per session with ±90s window + a 5min catch-up.
+    Non-blocking compatibility check on top of SessionScheduler:
+    returns one due session per call (call again to drain sessions due together).
     """
-    global last_triggered_sessions, last_reset_date
-
-    now_utc = datetime.now(timezone.utc)
-    weekday = now_utc.weekday()
-
-    # 💤 Metals weekend safeguards
-    if weekday in [5, 6]:  # Sat/Sun
-        return None
-
-    # 🔁 Reset memory at midnight UTC
-    if now_utc.date() != last_reset_date:
-        last_triggered_sessions.clear()
-        last_reset_date = now_utc.date()
-
-    # 🔎 Scan all sessions
-    for session_name in SESSIONS.keys():
-        scheduled_utc = _scheduled_time_utc_for_today(session_name)
-        delta_sec = (now_utc - scheduled_utc).total_seconds()
-        last_sent_time = last_triggered_sessions.get(session_name)
-
-        # ✅ Fire inside ±window
-        if abs(delta_sec) <= SESSION_TRIGGER_WINDOW_SEC:
-            if not last_sent_time:
-                last_triggered_sessions[session_name] = now_utc
-                return session_name
-
-        # 🧯 Catch-up if we missed (within +5 minutes and not sent yet)
-        if 0 < delta_sec <= MISSED_TRIGGER_GRACE_SEC:
-            if not last_sent_time:
-                last_triggered_sessions[session_name] = now_utc
-                return session_name
-
-    return None
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = SessionScheduler()
+
+    if not _pending_sessions:
+        _pending_sessions.extend(_default_scheduler.pop_due())
+    return _pending_sessions.pop(0) if _pending_sessions else None
+
+
+# 🧾 Dry run — the trigger loop's schedule without sleeping, fetching or sending
+def preview_schedule(days: float = 1, start: Optional[datetime] = None) -> list:
+    """(deadline, [sessions due together]) for the next `days`, as the loop would trigger them."""
+    now = [start or utc_now()]
+    scheduler = SessionScheduler(clock=lambda: now[0])
+    end = now[0] + timedelta(days=days)
+    schedule = []
+    while (deadline := scheduler.next_deadline()) is not None and deadline <= end:
+        now[0] = deadline
+        schedule.append((deadline, scheduler.pop_due() + scheduler.pop_following()))
+    return schedule
+
+
+# 🟢 Direct Execution
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="List upcoming session triggers (no API calls, no credentials).")
+    parser.add_argument("--days", type=float, default=1)
+    args = parser.parse_args()
+
+    for deadline, names in preview_schedule(args.days):
+        print(f"{deadline.astimezone(LOCAL_TZ):%a %d %b %H:%M} ({deadline:%H:%M} UTC)  {', '.join(names)}")
@@ -0,0 +1,283 @@
+# stub_servers.py
+# 🧪 Local stand-ins for the OANDA, OpenAI and Telegram APIs — offline runs of the full pipeline
+
+import json
+import random
+import re
+import sys
+import threading
+import time
+from datetime import timezone
+from typing import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import numpy as np
+
+from candles import Candles
+
+DEFAULT_REPORT = """<b>DOMINANT TREND</b>
+• Bullish drift above the Asia range.
+
+<b>LIQUIDITY EVENTS</b>
+• Sell-side sweep below the overnight low, closed back inside.
+
+<b>KEY LEVELS</b>
+• Support 3340.00 | Resistance 3362.50
+
+<b>SNIPER PLAN</b>
+• Buy pullbacks into 3345.00, target 3360.00.
+"""
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default 5 drops connection bursts into 1s SYN retries
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response (a cancelled hedged request) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubServer:
+    """
+    ThreadingHTTPServer on 127.0.0.1 (random port) in a daemon thread.
+    `latency` delays every response, `fail_first` answers the first N requests with HTTP 500
+    and `error_rate` a random share of the rest (seeded, so runs are repeatable).
+    Requests are recorded in `calls` as (clock() time, method, path, body) — monotonic
+    seconds unless another clock (e.g. a replay's simulated one) is passed.
+    """
+
+    def __init__(self, latency: float = 0.0, fail_first: int = 0, error_rate: float = 0.0,
+                 clock=time.monotonic, seed: int = 7):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self.clock = clock
+        self.calls = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                with stub._lock:
+                    stub.calls.append((stub.clock(), self.command, self.path, body))
+                    failing = stub.fail_first > 0
+                    stub.fail_first -= failing
+                    failing = failing or (stub.error_rate > 0 and stub._rng.random() < stub.error_rate)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if failing:
+                    return stub.send_json(self, {"error": "stub failure"}, status=500)
+                stub.handle(self, body)
+
+            do_GET = do_POST = _dispatch
+
+        self.server = _Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def handle(self, request: BaseHTTPRequestHandler, body: bytes):
+        self.send_json(request, {"error": "not found"}, status=404)
+
+    @staticmethod
+    def send_json(request: BaseHTTPRequestHandler, payload: dict, status: int = 200):
+        data = json.dumps(payload).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeOpenAI(StubServer):
+    """
+    Chat completions (plain JSON or SSE stream) and models.retrieve.
+    Streams `report` in `chunk_size`-character deltas, `chunk_delay` seconds apart.
+    Batched prompts (`=== SESSION: name ===` markers) get one marked report per session.
+    `model_latency` ({model: seconds}) sets the delay for those models (never below `latency`); the others
+    stall for `slow_latency` on a `slow_rate` share of requests (a primary model's long tail).
+    `empty_rate` answers a share of completions with empty content.
+    """
+
+    BATCH_MARKER_RE = re.compile(r"^=== SESSION: .+ ===$", re.MULTILINE)
+
+    def __init__(self, report: str = DEFAULT_REPORT, chunk_size: int = 24, chunk_delay: float = 0.05,
+                 model_latency: dict | None = None, slow_rate: float = 0.0, slow_latency: float = 0.0,
+                 empty_rate: float = 0.0, **kwargs):
+        self.report = report
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.model_latency = model_latency or {}
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.empty_rate = empty_rate
+        super().__init__(**kwargs)
+
+    def _delay(self, model: str) -> float:
+        """Seconds to hold this completion, beyond the base `latency`."""
+        if model in self.model_latency:
+            return max(0.0, self.model_latency[model] - self.latency)
+        with self._lock:
+            slow = self.slow_rate > 0 and self._rng.random() < self.slow_rate
+        return self.slow_latency if slow else 0.0
+
+    def handle(self, request, body):
+        path = request.path
+        if request.command == "GET" and path.startswith("/v1/models/"):
+            return self.send_json(request, {"id": path.rsplit("/", 1)[-1], "object": "model", "created": 0, "owned_by": "stub"})
+        if path != "/v1/chat/completions":
+            return super().handle(request, body)
+
+        params = json.loads(body or b"{}")
+        model = params.get("model", "stub")
+        prompt = "\n".join(m.get("content") or "" for m in params.get("messages", []))
+        markers = list(dict.fromkeys(self.BATCH_MARKER_RE.findall(prompt)))
+        report = "\n".join(f"{marker}\n{self.report}" for marker in markers) if markers else self.report
+        time.sleep(self._delay(model))
+        with self._lock:
+            if self.empty_rate > 0 and self._rng.random() < self.empty_rate:
+                report = ""
+
+        if not params.get("stream"):
+            return self.send_json(request, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": report}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+        request.send_response(200)
+        request.send_header("Content-Type", "text/event-stream")
+        request.send_header("Cache-Control", "no-cache")
+        request.send_header("Connection", "close")
+        request.end_headers()
+
+        def event(delta: dict, finish_reason=None):
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            request.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            request.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for i in range(0, len(report), self.chunk_size):
+            time.sleep(self.chunk_delay)
+            event({"content": report[i:i + self.chunk_size]})
+        event({}, finish_reason="stop")
+        request.wfile.write(b"data: [DONE]\n\n")
+        request.wfile.flush()
+        request.close_connection = True
+
+
+class FakeTelegram(StubServer):
+    """
+    sendMessage / editMessageText / getMe. Delivered texts are kept in `messages` (message_id → text history).
+    `throttle_first` answers the first N sends with 429 and `retry_after` seconds;
+    sends to `blocked_chats` get 403 like a bot blocked by the user.
+    """
+
+    def __init__(self, throttle_first: int = 0, retry_after: int = 1, blocked_chats=(), **kwargs):
+        self.messages = {}
+        self.chats = {}  # message_id → chat_id
+        self.blocked_chats = {str(c) for c in blocked_chats}
+        self.throttle_first = throttle_first
+        self.retry_after = retry_after
+        self._next_id = 1
+        super().__init__(**kwargs)
+
+    def handle(self, request, body):
+        method = request.path.rsplit("/", 1)[-1]
+        form = {k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()}
+
+        if method == "sendMessage" and form.get("chat_id") in self.blocked_chats:
+            return self.send_json(request, {
+                "ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user",
+            }, status=403)
+
+        if method == "sendMessage" and self.throttle_first > 0:
+            self.throttle_first -= 1
+            return self.send_json(request, {
+                "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+
+        if method == "getMe":
+            return self.send_json(request, {"ok": True, "result": {"id": 1, "is_bot": True, "username": "stub_bot"}})
+
+        if method == "sendMessage":
+            with self._lock:
+                message_id = self._next_id
+                self._next_id += 1
+                self.messages[message_id] = [form.get("text", "")]
+                self.chats[message_id] = form.get("chat_id")
+            return self.send_json(request, {"ok": True, "result": {"message_id": message_id, "text": form.get("text", "")}})
+
+        if method == "editMessageText":
+            history = self.messages.get(int(form.get("message_id", 0)))
+            if history is None:
+                return self.send_json(request, {"ok": False, "description": "Bad Request: message to edit not found"}, status=400)
+            if history[-1] == form.get("text"):
+                return self.send_json(request, {"ok": False, "description": "Bad Request: message is not modified"}, status=400)
+            history.append(form.get("text", ""))
+            return self.send_json(request, {"ok": True, "result": {"message_id": int(form["message_id"])}})
+
+        return super().handle(request, body)
+
+
+class FakeOanda(StubServer):
+    """
+    v3 instrument candles served from a local Candles `history`, as of `as_of()`
+    (aware UTC datetime): candles that have ended are complete, the one still
+    running comes back incomplete. Answers `count` and `from`/`includeFirst` queries.
+    `history` may also be a callable instrument → Candles, for per-instrument prices.
+    """
+
+    def __init__(self, history: Candles | Callable[[str], Candles], as_of, step_sec: int = 300, **kwargs):
+        self.history = history
+        self.as_of = as_of
+        self.step = np.timedelta64(step_sec, "s")
+        super().__init__(**kwargs)
+
+    def handle(self, request, body):
+        path, _, query = request.path.partition("?")
+        if request.command != "GET" or not path.endswith("/candles"):
+            return super().handle(request, body)
+
+        params = {k: v[0] for k, v in parse_qs(query).items()}
+        instrument = path.split("/")[-2]
+        history = self.history(instrument) if callable(self.history) else self.history
+        now = np.datetime64(self.as_of().astimezone(timezone.utc).replace(tzinfo=None), "ns")
+        started = int(np.searchsorted(history.time, now, side="right"))
+
+        if "from" in params:
+            since = np.datetime64(params["from"].rstrip("Z"), "ns")
+            side = "right" if params.get("includeFirst") == "false" else "left"
+            window = history[int(np.searchsorted(history.time, since, side=side)):started]
+        else:
+            window = history[max(0, started - int(params.get("count", 500))):started]
+
+        candles = window.to_oanda()
+        if candles and window.time[-1] + self.step > now:
+            candles[-1]["complete"] = False
+        self.send_json(request, {"instrument": instrument, "granularity": params.get("granularity"),
+                                 "candles": candles})
@@ -1,135 +1,249 @@
+import asyncio
 import os
-import re
-import requests
-from datetime import datetime
-from config import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, ENABLE_LOGGING
+import time
+from http_client import http_request, async_http_request
+from instrumentation import TELEGRAM_FAILURES, TELEGRAM_FALLBACKS, get_logger, traced
+from log_writer import log_event
+from html_engine import render_html, split_html, trim_html, prepare_telegram_chunks
+from config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_API_BASE, TELEGRAM_EDIT_MIN_INTERVAL_SEC
+)
 
 # 🔧 Constants
-TELEGRAM_MSG_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+TELEGRAM_MSG_URL = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+TELEGRAM_EDIT_URL = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}/editMessageText"
+TELEGRAM_GETME_URL = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}/getMe"
 MAX_MESSAGE_LENGTH = 4096
 SPLIT_BUFFER = 50  # Safety margin for HTML length
 LOG_DIR = os.path.join(os.path.dirname(__file__), "telegram_logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
+log = get_logger("telegram")
+
 # 🧼 HTML Sanitizer — Only allow Telegram-safe tags and fix escaped tags
 def sanitize_telegram_html(text: str) -> str:
     """Cleans HTML to keep only Telegram-safe tags."""
-    allowed_tags = {
-        "b", "strong", "i", "em", "u", "ins", "s", "strike", "del",
-        "a", "code", "pre", "span", "br"
-    }
-    # Replace escaped HTML entities
-    text = text.replace("&lt;", "<").replace("&gt;", ">")
-
-    # Remove <br> inside <code> or <pre> blocks
-    text = re.sub(r"(<code>.*?)(<br>)(.*?</code>)", r"\1\3", text, flags=re.IGNORECASE | re.DOTALL)
-    text = re.sub(r"(<pre>.*?)(<br>)(.*?</pre>)", r"\1\3", text, flags=re.IGNORECASE | re.DOTALL)
-
-    # Normalize <br> tags
-    text = re.sub(r"<\s*br\s*/?>", "<br>", text, flags=re.IGNORECASE)
-
-    # Keep only allowed tags
-    return re.sub(
-        r"</?([a-zA-Z0-9]+)(\s[^>]*)?>",
-        lambda m: m.group(0) if m.group(1).lower() in allowed_tags else "",
-        text
-    )
+    return render_html(text)
 
 # ✂️ Safe HTML chunking
 def safe_html_split(text: str, max_len: int) -> list:
     """Splits HTML-safe text into Telegram-safe chunks without breaking tags."""
-    words = text.split(" ")
-    chunks = []
-    current = ""
+    return split_html(text, max_len)
+
+# 🧩 Shared preparation for the sync and async senders
+@traced("sanitize_split")
+def _prepare_message(message: str):
+    """Returns (sanitized message, base payload, chunks), or None if the message is too short."""
+    if not message or len(message.strip()) < 10:
+        log.debug("Message too short or empty.")
+        return None
+
+    # Sanitize HTML and split into safe chunks (one token pass each)
+    message, chunks = prepare_telegram_chunks(message, MAX_MESSAGE_LENGTH - SPLIT_BUFFER)
+    log.debug("Sanitized message length: %d chars", len(message))
+
+    # Prepare base payload
+    payload = {
+        "chat_id": TELEGRAM_CHAT_ID,
+        "parse_mode": "HTML",
+        "protect_content": True,
+        "disable_web_page_preview": True
+    }
 
-    for word in words:
-        if len(current) + len(word) + 1 > max_len:
-            chunks.append(current)
-            current = word
-        else:
-            current += (" " if current else "") + word
+    log.debug("Message split into %d chunk(s)", len(chunks))
+    return message, payload, chunks
 
-    if current:
-        chunks.append(current)
-    return chunks
 
 # 📤 Send message to Telegram with full logging
+@traced("telegram_send")
 def send_telegram_message(message: str) -> bool:
     """Sends a message to Telegram with HTML sanitization, chunking, and logging."""
-    if ENABLE_LOGGING:
-        print("DEBUG: send_telegram_message() was called")
-
-    if not message or len(message.strip()) < 10:
-        if ENABLE_LOGGING:
-            print("DEBUG: Message too short or empty.")
-        return False
+    log.debug("send_telegram_message() was called")
 
     try:
-        # Sanitize HTML
-        message = sanitize_telegram_html(message)
-        if ENABLE_LOGGING:
-            print(f"DEBUG: Sanitized message length: {len(message)} chars")
-
-        # Prepare base payload
-        payload = {
-            "chat_id": TELEGRAM_CHAT_ID,
-            "parse_mode": "HTML",
-            "protect_content": True,
-            "disable_web_page_preview": True
-        }
-
-        # Split into safe chunks
-        chunks = safe_html_split(message, MAX_MESSAGE_LENGTH - SPLIT_BUFFER)
-        if ENABLE_LOGGING:
-            print(f"DEBUG: Message split into {len(chunks)} chunk(s)")
+        prepared = _prepare_message(message)
+        if prepared is None:
+            return False
+        message, payload, chunks = prepared
 
         # Send each chunk
         for i, chunk in enumerate(chunks, start=1):
             payload["text"] = chunk
-            resp = requests.post(TELEGRAM_MSG_URL, data=payload, timeout=10)
+            resp = http_request("POST", TELEGRAM_MSG_URL, data=payload)
 
-            if ENABLE_LOGGING:
-                print(f"DEBUG: Chunk {i} response: {resp.status_code} — {resp.text}")
+            log.debug("Chunk %d response: %s — %s", i, resp.status_code, resp.text)
 
             # If HTML fails, retry without parse_mode
             if resp.status_code != 200:
                 if resp.status_code == 400:  # HTML parse error
-                    if ENABLE_LOGGING:
-                        print("DEBUG: HTML parse failed — retrying without parse_mode.")
+                    log.debug("HTML parse failed — retrying without parse_mode.")
                     payload.pop("parse_mode", None)
-                    resp = requests.post(TELEGRAM_MSG_URL, data=payload, timeout=10)
+                    TELEGRAM_FALLBACKS.inc(sender="direct")
+                    resp = http_request("POST", TELEGRAM_MSG_URL, data=payload)
                     if resp.status_code == 200:
-                        if ENABLE_LOGGING:
-                            print(f"DEBUG: Chunk {i} sent successfully in plain text fallback")
+                        log.debug("Chunk %d sent successfully in plain text fallback", i)
                         continue
 
                 _log_failure("TEXT", chunk, resp.status_code, resp.text)
                 return False
 
-        if ENABLE_LOGGING:
-            print("DEBUG: All chunks sent successfully")
+        log.debug("All chunks sent successfully")
         return True
 
     except Exception as e:
-        if ENABLE_LOGGING:
-            print(f"DEBUG: Exception while sending: {e}")
+        log.error("❌ Exception while sending to Telegram: %s", e)
         _log_failure("TEXT", message, "Exception", str(e))
         return False
 
+
+# 📤 Async sender for the asyncio session runner
+@traced("telegram_send")
+async def send_telegram_message_async(message: str) -> bool:
+    """Async counterpart of send_telegram_message() on the shared async HTTP pool."""
+    try:
+        prepared = _prepare_message(message)
+        if prepared is None:
+            return False
+        message, payload, chunks = prepared
+
+        for i, chunk in enumerate(chunks, start=1):
+            payload["text"] = chunk
+            resp = await async_http_request("POST", TELEGRAM_MSG_URL, data=payload)
+
+            log.debug("Chunk %d response: %s — %s", i, resp.status_code, resp.text)
+
+            if resp.status_code != 200:
+                if resp.status_code == 400:  # HTML parse error
+                    payload.pop("parse_mode", None)
+                    TELEGRAM_FALLBACKS.inc(sender="direct")
+                    resp = await async_http_request("POST", TELEGRAM_MSG_URL, data=payload)
+                    if resp.status_code == 200:
+                        continue
+
+                _log_failure("TEXT", chunk, resp.status_code, resp.text)
+                return False
+
+        return True
+
+    except Exception as e:
+        log.error("❌ Exception while sending to Telegram: %s", e)
+        _log_failure("TEXT", message, "Exception", str(e))
+        return False
+
+# ✏️ Progressive message — sent once, then edited in place as the report grows
+class ProgressiveTelegramMessage:
+    """
+    A report message that is sent as soon as its first part is ready and then
+    updated with editMessageText. Edits are spaced at least `min_interval`
+    seconds apart; intermediate versions that arrive faster are coalesced and
+    the latest one is flushed once the interval is up.
+    """
+
+    def __init__(self, chat_id=TELEGRAM_CHAT_ID, min_interval: float = TELEGRAM_EDIT_MIN_INTERVAL_SEC):
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.message_id = None
+        self.sent_text = None
+        self.pending_text = None
+        self.last_edit_at = 0.0
+        self.parse_mode = "HTML"
+        self._lock = asyncio.Lock()  # one send/edit at a time, so versions land in order
+        self._flush = None
+
+    def _payload(self, text: str) -> dict:
+        payload = {"chat_id": self.chat_id, "text": text, "disable_web_page_preview": True}
+        if self.parse_mode:
+            payload["parse_mode"] = self.parse_mode
+        return payload
+
+    async def _post(self, url: str, payload: dict):
+        resp = await async_http_request("POST", url, data=payload)
+        if resp.status_code == 400 and self.parse_mode and "not modified" not in resp.text:
+            # HTML rejected — stay in plain text for the rest of this message
+            log.debug("HTML parse failed — continuing without parse_mode.")
+            self.parse_mode = None
+            payload.pop("parse_mode", None)
+            TELEGRAM_FALLBACKS.inc(sender="progressive")
+            resp = await async_http_request("POST", url, data=payload)
+        return resp
+
+    async def update(self, html: str, final: bool = False) -> bool:
+        text = trim_html(sanitize_telegram_html(html), MAX_MESSAGE_LENGTH)
+        async with self._lock:
+            if final and self._flush is not None:
+                self._flush.cancel()  # the final version supersedes anything coalesced
+                self._flush = None
+            return await self._update(text, final)
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        async with self._lock:
+            self._flush = None
+            if self.pending_text is not None:
+                await self._update(self.pending_text, False)
+
+    async def _update(self, text: str, final: bool) -> bool:
+        if self.message_id is None:
+            payload = self._payload(text)
+            payload["protect_content"] = True
+            resp = await self._post(TELEGRAM_MSG_URL, payload)
+            if resp.status_code != 200:
+                _log_failure("TEXT", text, resp.status_code, resp.text)
+                return False
+            self.message_id = resp.json()["result"]["message_id"]
+            self.sent_text, self.last_edit_at = text, time.monotonic()
+            return True
+
+        if text == self.sent_text:
+            return True
+
+        wait = self.min_interval - (time.monotonic() - self.last_edit_at)
+        if wait > 0:
+            if not final:
+                self.pending_text = text  # coalesced — sent by the next edit or the flush after `wait`
+                if self._flush is None:
+                    self._flush = asyncio.create_task(self._flush_later(wait))
+                return True
+            await asyncio.sleep(wait)
+
+        payload = self._payload(text)
+        payload["message_id"] = self.message_id
+        resp = await self._post(TELEGRAM_EDIT_URL, payload)
+        self.last_edit_at = time.monotonic()
+        if resp.status_code != 200 and "not modified" not in resp.text:
+            _log_failure("EDIT", text, resp.status_code, resp.text)
+            return False
+        self.sent_text, self.pending_text = text, None
+        log.debug("Edited message %s (%d chars)", self.message_id, len(text))
+        return True
+
+    async def finish(self, html: str) -> bool:
+        """Final version — always delivered, waiting out the edit interval if needed."""
+        return await self.update(html, final=True)
+
+
+# 🔥 Pre-session warm-up: open the pooled connection before the alert needs it
+def warm_telegram_connection():
+    try:
+        http_request("GET", TELEGRAM_GETME_URL)
+    except Exception as e:
+        log.debug("Telegram warm-up failed: %s", e)
+
+
+async def warm_telegram_connection_async():
+    try:
+        await async_http_request("GET", TELEGRAM_GETME_URL)
+    except Exception as e:
+        log.debug("Telegram warm-up failed: %s", e)
+
+
 # 🧾 Error logger
 def _log_failure(content_type: str, content: str, error_code, error_detail):
-    """Logs failed Telegram send attempts to file."""
+    """Logs failed Telegram send attempts (queued — written by the log writer thread)."""
     try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_file = os.path.join(LOG_DIR, "telegram_failures.log")
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write("\n" + "-" * 60 + "\n")
-            f.write(f"[{timestamp}] TELEGRAM {content_type} FAILURE\n")
-            f.write(f"Error Code: {error_code}\n")
-            f.write(f"Error Detail: {error_detail}\n")
-            f.write("Content:\n" + content + "\n")
-        if ENABLE_LOGGING:
-            print(f"DEBUG: Failure logged to {log_file}")
+        TELEGRAM_FAILURES.inc(content_type=content_type.split(" ", 1)[0])  # "BROADCAST <chat>" → BROADCAST
+        log_event("telegram_failure", content_type=content_type, content=content,
+                  error_code=error_code, error_detail=error_detail)
+        log.debug("Failure queued for %s", os.path.join(LOG_DIR, "telegram_failures.log"))
     except Exception as log_error:
-        if ENABLE_LOGGING:
-            print(f"DEBUG: Failed to write failure log: {log_error}")
+        log.error("❌ Failed to write failure log: %s", log_error)
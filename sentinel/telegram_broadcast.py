@@ -0,0 +1,148 @@
+# telegram_broadcast.py
+# 📣 Concurrent fan-out of one report to many subscriber chats/channels
+
+import asyncio
+import os
+import time
+
+import telegram_alert
+from http_client import async_http_request, close_async_http_client
+from instrumentation import RETRIES, TELEGRAM_FALLBACKS, get_logger
+from telegram_alert import _prepare_message, _log_failure
+from telegram_queue import TokenBucket, global_send_bucket
+from config import (
+    TELEGRAM_BROADCAST_CHAT_IDS, TELEGRAM_BROADCAST_FILE,
+    BROADCAST_MAX_WORKERS, BROADCAST_MAX_ATTEMPTS
+)
+
+log = get_logger("telegram_broadcast")
+
+
+def load_chat_ids(chat_ids=None, path: str | None = TELEGRAM_BROADCAST_FILE) -> list:
+    """
+    Recipients from a list/comma-separated string and/or a file (one ID per line,
+    `#` comments allowed). Duplicates are dropped, order is kept.
+    """
+    ids = []
+    if isinstance(chat_ids, str):
+        ids += chat_ids.split(",")
+    elif chat_ids:
+        ids += [str(c) for c in chat_ids]
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            ids += [line.split("#", 1)[0] for line in f]
+    return list(dict.fromkeys(c.strip() for c in ids if c.strip()))
+
+
+async def _take_token(bucket: TokenBucket):
+    while (wait := bucket.try_take()) > 0:
+        await asyncio.sleep(wait)
+
+
+async def _send_to_chat(chat_id: str, chunks: list, bucket: TokenBucket, started: float) -> dict:
+    """All chunks to one chat, in order. Failures stay with this chat."""
+    result = {"chat_id": chat_id, "ok": False, "status": None, "attempts": 0, "latency": None, "error": None}
+    parse_mode = "HTML"
+
+    for chunk in chunks:
+        for attempt in range(1, BROADCAST_MAX_ATTEMPTS + 1):
+            result["attempts"] += 1
+            if attempt > 1:
+                RETRIES.inc(target="telegram_broadcast")
+            payload = {"chat_id": chat_id, "text": chunk, "protect_content": True, "disable_web_page_preview": True}
+            if parse_mode:
+                payload["parse_mode"] = parse_mode
+
+            await _take_token(bucket)
+            try:
+                resp = await async_http_request("POST", telegram_alert.TELEGRAM_MSG_URL, data=payload)
+                status, body = resp.status_code, resp.text
+            except Exception as e:
+                status, body = "Exception", str(e)
+            result["status"] = status
+
+            if status == 200:
+                break
+            if status == 429:
+                try:
+                    retry_after = float(resp.json().get("parameters", {}).get("retry_after", 1))
+                except ValueError:
+                    retry_after = 1.0
+                # Flood control is bot-wide — every sender drawing from the bucket waits it out, not just this chat
+                bucket.pause(retry_after)
+                continue
+            if status == 400 and parse_mode and "parse entities" in body:
+                parse_mode = None  # plain text for the rest of this chat's chunks
+                TELEGRAM_FALLBACKS.inc(sender="broadcast")
+                continue
+            # Blocked bot, unknown chat… — retrying a 4xx won't help
+            if isinstance(status, int) and 400 <= status < 500:
+                break
+            if attempt < BROADCAST_MAX_ATTEMPTS:
+                await asyncio.sleep(min(30, 2 ** (attempt - 1)))
+
+        if status != 200:
+            result["error"] = body[:200]
+            _log_failure(f"BROADCAST {chat_id}", chunk, status, body)
+            return result
+
+    result["ok"] = True
+    result["latency"] = time.perf_counter() - started
+    return result
+
+
+async def broadcast_telegram_message_async(message: str, chat_ids=None, max_workers: int = BROADCAST_MAX_WORKERS,
+                                           bucket: TokenBucket = global_send_bucket) -> list:
+    """
+    Sends one message to every chat concurrently: at most `max_workers` chats in
+    flight, all sends drawn from the bot-wide token bucket (shared with the outbox).
+    Returns one result dict per chat: chat_id, ok, status, attempts,
+    latency (seconds from broadcast start), error.
+    """
+    recipients = load_chat_ids(chat_ids if chat_ids is not None else TELEGRAM_BROADCAST_CHAT_IDS)
+    if not recipients:
+        return []
+    prepared = _prepare_message(message)
+    if prepared is None:
+        return []
+    chunks = prepared[2]
+
+    semaphore = asyncio.Semaphore(max_workers)
+    started = time.perf_counter()
+
+    async def worker(chat_id):
+        async with semaphore:
+            return await _send_to_chat(chat_id, chunks, bucket, started)
+
+    results = await asyncio.gather(*(worker(chat_id) for chat_id in recipients))
+    log.debug("%s", summarize_broadcast(results))
+    return results
+
+
+def broadcast_telegram_message(message: str, chat_ids=None, max_workers: int = BROADCAST_MAX_WORKERS) -> list:
+    """Blocking wrapper for the sync session loop and manual tests (no event loop at all without recipients)."""
+    recipients = load_chat_ids(chat_ids if chat_ids is not None else TELEGRAM_BROADCAST_CHAT_IDS)
+    if not recipients:
+        return []
+
+    async def run():
+        try:
+            return await broadcast_telegram_message_async(message, recipients, max_workers)
+        finally:
+            # The pooled client is bound to this loop — asyncio.run() closes the loop right after
+            await close_async_http_client()
+
+    return asyncio.run(run())
+
+
+def summarize_broadcast(results: list) -> str:
+    delivered = sorted(r["latency"] for r in results if r["ok"])
+    failed = [r for r in results if not r["ok"]]
+    line = f"📣 Broadcast: {len(delivered)}/{len(results)} delivered"
+    if delivered:
+        pick = lambda q: delivered[min(len(delivered) - 1, int(q * len(delivered)))]
+        line += f" | latency p50 {pick(0.5):.2f}s p95 {pick(0.95):.2f}s max {delivered[-1]:.2f}s"
+    if failed:
+        line += " | failed: " + ", ".join(f"{r['chat_id']} ({r['status']})" for r in failed[:5])
+        line += f" +{len(failed) - 5} more" if len(failed) > 5 else ""
+    return line
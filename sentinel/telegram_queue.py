@@ -0,0 +1,337 @@
+# telegram_queue.py
+# 📮 Durable outbound Telegram queue — disk spool, background sender, token-bucket rate limits
+
+import glob
+import json
+import os
+import threading
+import time
+
+import telegram_alert
+from http_client import http_request
+from instrumentation import RETRIES, TELEGRAM_FALLBACKS, get_logger
+from telegram_alert import _prepare_message, _log_failure
+from config import (
+    TELEGRAM_CHAT_ID, TELEGRAM_SPOOL_DIR,
+    TELEGRAM_GLOBAL_RATE_PER_SEC, TELEGRAM_CHAT_RATE_PER_SEC, TELEGRAM_CHAT_BURST,
+    TELEGRAM_RETRY_BASE_SEC, TELEGRAM_RETRY_MAX_SEC, TELEGRAM_MAX_ATTEMPTS
+)
+
+log = get_logger("telegram_queue")
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `capacity` banked; pause() holds every taker back (Telegram's retry_after)."""
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _paused(self) -> float:
+        return max(0.0, self.paused_until - self.updated)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        with self._lock:
+            self._refill()
+            if self._paused():
+                return self._paused()
+            return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+
+    def try_take(self) -> float:
+        """Takes a token if one is available (returns 0), else returns the seconds to wait."""
+        with self._lock:
+            self._refill()
+            if self._paused():
+                return self._paused()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+# 🌐 Bot-wide send budget, shared by the outbox and broadcasts
+global_send_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE_PER_SEC, TELEGRAM_GLOBAL_RATE_PER_SEC)
+
+
+class TelegramOutbox:
+    """
+    Every chunk is written to the spool directory before it is sent and removed
+    once Telegram accepts it, so pending alerts survive restarts and are
+    replayed by the next process.
+
+    A background thread sends chunks in enqueue order. Per chat, a chunk is
+    only sent after the previous one went through, so multi-chunk reports keep
+    their order; chats don't hold each other up. 429 answers wait `retry_after`,
+    network errors and 5xx back off exponentially, permanent 4xx errors and
+    chunks out of attempts go to `dead/` and telegram_failures.log, together
+    with the unsent rest of their message.
+    """
+
+    def __init__(self, spool_dir: str = TELEGRAM_SPOOL_DIR, global_bucket: TokenBucket = global_send_bucket,
+                 chat_rate: float = TELEGRAM_CHAT_RATE_PER_SEC, chat_burst: float = TELEGRAM_CHAT_BURST):
+        self.spool_dir = spool_dir
+        self.dead_dir = os.path.join(spool_dir, "dead")
+        os.makedirs(self.dead_dir, exist_ok=True)
+
+        self.global_bucket = global_bucket
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chat_buckets = {}
+        self._callbacks = {}  # group → [chunks left, on_delivered, on_failed]
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.stats = {"queued": 0, "sent": 0, "retried": 0, "rate_limited": 0, "dead": 0}
+
+        # ♻️ Replay whatever a previous run left in the spool
+        self._pending = []
+        for path in sorted(glob.glob(os.path.join(spool_dir, "*.json"))):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._pending.append(json.load(f))
+            except (OSError, ValueError):
+                os.replace(path, os.path.join(self.dead_dir, os.path.basename(path)))
+        self._pending.sort(key=lambda e: e["seq"])
+        self._seq = self._pending[-1]["seq"] + 1 if self._pending else 1
+        if self._pending:
+            log.info("📮 Replaying %d spooled Telegram chunk(s)", len(self._pending))
+
+    # 💾 Spool files
+    def _path(self, entry: dict, directory: str | None = None) -> str:
+        return os.path.join(directory or self.spool_dir, f"{entry['seq']:012d}.json")
+
+    def _persist(self, entry: dict):
+        tmp_path = self._path(entry) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(entry))
+
+    def _forget(self, entry: dict, dead: bool = False):
+        try:
+            if dead:
+                os.replace(self._path(entry), self._path(entry, self.dead_dir))
+            else:
+                os.remove(self._path(entry))
+        except OSError:
+            pass
+        with self._cond:
+            self._pending.remove(entry)
+
+    # 📥 Producer side — never blocks on the network
+    def enqueue(self, message: str, chat_id=TELEGRAM_CHAT_ID, on_delivered=None, on_failed=None) -> bool:
+        """
+        Spools a message (split into chunks) for delivery. `on_delivered()` runs
+        once every chunk is accepted, `on_failed()` if the message goes to dead/.
+        Both run on the sender thread and are lost with the process.
+        """
+        prepared = _prepare_message(message)
+        if prepared is None:
+            return False
+        _, payload, chunks = prepared
+
+        with self._cond:
+            group = self._seq
+            entries = []
+            for chunk in chunks:
+                entries.append({
+                    "seq": self._seq, "group": group, "chat_id": chat_id, "text": chunk,
+                    "parse_mode": payload.get("parse_mode"), "attempts": 0, "not_before": 0.0,
+                })
+                self._seq += 1
+            for entry in entries:
+                self._persist(entry)
+            self._pending.extend(entries)
+            if on_delivered or on_failed:
+                self._callbacks[group] = [len(entries), on_delivered, on_failed]
+            self.stats["queued"] += len(entries)
+            self._cond.notify()
+
+        log.debug("Queued %d Telegram chunk(s) for chat %s (%d pending)", len(entries), chat_id, self.pending_count())
+        return True
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    # 🚦 Scheduling — first chunk per chat, when its chat and the global bucket allow it
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _next_ready(self):
+        """Returns (entry, 0) for a chunk that can go now, or (None, seconds to wait)."""
+        now = time.time()
+        seen = set()
+        best_wait = None
+        for entry in self._pending:
+            chat_key = str(entry["chat_id"])
+            if chat_key in seen:
+                continue
+            seen.add(chat_key)
+            wait = max(
+                entry["not_before"] - now,
+                self._chat_bucket(chat_key).wait_time(),
+                self.global_bucket.wait_time(),
+            )
+            if wait <= 0:
+                return entry, 0.0
+            best_wait = wait if best_wait is None else min(best_wait, wait)
+        return None, best_wait
+
+    # 📤 One delivery attempt
+    def _deliver(self, entry: dict):
+        self._chat_bucket(str(entry["chat_id"])).take()
+        self.global_bucket.take()
+
+        payload = {"chat_id": entry["chat_id"], "text": entry["text"],
+                   "protect_content": True, "disable_web_page_preview": True}
+        if entry["parse_mode"]:
+            payload["parse_mode"] = entry["parse_mode"]
+
+        try:
+            resp = http_request("POST", telegram_alert.TELEGRAM_MSG_URL, data=payload)
+            status, body = resp.status_code, resp.text
+        except Exception as e:
+            status, body = "Exception", str(e)
+
+        if status == 200:
+            self.stats["sent"] += 1
+            self._forget(entry)
+            self._chunk_done(entry)
+            return
+
+        if status == 429:
+            # ⏳ Flood control — the whole bot waits as long as Telegram asks, doesn't count as an attempt
+            try:
+                retry_after = float(resp.json().get("parameters", {}).get("retry_after", 1))
+            except ValueError:
+                retry_after = 1.0
+            self.stats["rate_limited"] += 1
+            self.global_bucket.pause(retry_after)
+            entry["not_before"] = time.time() + retry_after
+            self._persist(entry)
+            log.warning("⏳ Telegram rate limit for chat %s — retrying in %.0fs", entry["chat_id"], retry_after)
+            return
+
+        if status == 400 and entry["parse_mode"] and "parse entities" in body:
+            # HTML rejected — resend this chunk as plain text
+            log.debug("HTML parse failed — retrying without parse_mode.")
+            entry["parse_mode"] = None
+            self._persist(entry)
+            TELEGRAM_FALLBACKS.inc(sender="outbox")
+            return
+
+        entry["attempts"] += 1
+        permanent = isinstance(status, int) and 400 <= status < 500
+        if permanent or entry["attempts"] >= TELEGRAM_MAX_ATTEMPTS:
+            self._dead_letter(entry, status, body)
+            return
+
+        delay = min(TELEGRAM_RETRY_MAX_SEC, TELEGRAM_RETRY_BASE_SEC * 2 ** (entry["attempts"] - 1))
+        entry["not_before"] = time.time() + delay
+        self._persist(entry)
+        self.stats["retried"] += 1
+        RETRIES.inc(target="telegram_outbox")
+        log.warning("🔁 Telegram send failed (%s) — attempt %d, retrying in %.1fs", status, entry["attempts"], delay)
+
+    def _dead_letter(self, entry: dict, status, body: str):
+        """Moves the chunk and the rest of its message to dead/ — later chunks alone would read as a cut-off report."""
+        with self._cond:
+            rest = [e for e in self._pending if e["group"] == entry["group"] and e is not entry]
+        self.stats["dead"] += 1 + len(rest)
+        _log_failure("TEXT", entry["text"], status, body)
+        self._forget(entry, dead=True)
+        for sibling in rest:
+            _log_failure("TEXT", sibling["text"], "Skipped", f"chunk {entry['seq']} of the same message failed")
+            self._forget(sibling, dead=True)
+        if rest:
+            log.warning("🪦 Dead-lettered %d more chunk(s) of the message with chunk %d", len(rest), entry["seq"])
+        self._chunk_done(entry, delivered=False)
+
+    def _chunk_done(self, entry: dict, delivered: bool = True):
+        with self._cond:
+            waiting = self._callbacks.get(entry["group"])
+            if waiting is None:
+                return
+            if delivered:
+                waiting[0] -= 1
+                if waiting[0]:
+                    return
+            del self._callbacks[entry["group"]]
+        callback = waiting[1] if delivered else waiting[2]
+        if callback is None:
+            return
+        try:
+            callback()
+        except Exception as e:
+            log.error("❌ Telegram delivery callback failed: %s", e)
+
+    # 🔁 Background sender
+    def _run(self):
+        while True:
+            with self._cond:
+                entry, wait = self._next_ready()
+                while entry is None and not self._stopping:
+                    self._cond.wait(wait)
+                    entry, wait = self._next_ready()
+                if self._stopping:
+                    return
+            self._deliver(entry)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="telegram-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, drain_timeout: float = 0.0):
+        """Stops the sender, optionally waiting up to `drain_timeout` seconds for the queue to empty."""
+        deadline = time.monotonic() + drain_timeout
+        while self.pending_count() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+# 🌍 Process-wide outbox (created on first use — replays the spool and starts the sender)
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> TelegramOutbox:
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = TelegramOutbox().start()
+        return _outbox
+
+
+def queue_telegram_message(message: str, chat_id=TELEGRAM_CHAT_ID, on_delivered=None, on_failed=None) -> bool:
+    """Non-blocking replacement for send_telegram_message(): spools the message for the background sender."""
+    return get_outbox().enqueue(message, chat_id, on_delivered, on_failed)
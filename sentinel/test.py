@@ -10,7 +10,7 @@ from gpt_analysis import (
 from telegram_alert import send_telegram_message
 from prompt_formatter import format_spectral_summary
 from log_writer import log_message
-from config import ENABLE_LOGGING
+from config import ENABLE_LOGGING, validate_env
 
 
 def run_manual_test(session_name: str = "London Open"):
@@ -69,6 +69,149 @@ def run_manual_test(session_name: str = "London Open"):
         print(f"❌ TEST ERROR: {str(e)}")
 
 
+def run_stream_replay_test(record_path: str, granularity: str = "M5"):
+    """
+    Replays a recorded pricing stream (see PRICE_STREAM_RECORD_PATH) offline
+    and prints the candles built from it — no OANDA connection needed.
+    """
+    import asyncio
+    from price_stream import PriceStreamConsumer, ReplayTickSource
+
+    print(f"\n🧪 STREAM REPLAY STARTED: {record_path}")
+    built = []
+
+    class ReplayConsumer(PriceStreamConsumer):
+        async def _publish(self, granularity, candles):
+            built.extend(candles)
+
+    consumer = ReplayConsumer(granularities=(granularity,), source=ReplayTickSource(record_path), record_path=None)
+    asyncio.run(consumer.run(reconnect=False))
+
+    for c in built:
+        print(f"{c['time']} | O:{c['mid']['o']} H:{c['mid']['h']} L:{c['mid']['l']} C:{c['mid']['c']} V:{c['volume']}")
+    print(f"✅ Built {len(built)} complete {granularity} candles from replay.")
+
+
+def run_streaming_stub_test(session_name: str = "London Open"):
+    """
+    Runs the streaming pipeline against local OpenAI/Telegram stubs and prints
+    when the message was sent and each edit landed — no API keys needed.
+    """
+    import asyncio
+    import time
+    from openai import AsyncOpenAI
+    import gpt_analysis
+    import main
+    import telegram_alert
+    from bench_features import synthetic_candles
+    from gpt_cache import get_gpt_cache
+    from stub_servers import FakeOpenAI, FakeTelegram
+
+    print(f"\n🧪 STREAMING STUB TEST STARTED: {session_name}")
+
+    async def fake_fetch(*args, **kwargs):
+        return synthetic_candles(300)
+
+    with FakeOpenAI(chunk_delay=0.2) as gpt, FakeTelegram() as tg:
+        gpt_analysis.async_client = AsyncOpenAI(api_key="stub", base_url=f"{gpt.url}/v1")
+        get_gpt_cache().ttl = 0  # always hit the stub
+        telegram_alert.TELEGRAM_MSG_URL = f"{tg.url}/botstub/sendMessage"
+        telegram_alert.TELEGRAM_EDIT_URL = f"{tg.url}/botstub/editMessageText"
+        main.fetch_latest_data_async = fake_fetch
+
+        start = time.monotonic()
+        asyncio.run(main.run_session_streaming_async(session_name, asyncio.Semaphore(1)))
+
+        for at, method, path, _ in tg.calls:
+            print(f"  +{at - start:5.2f}s {path.rsplit('/', 1)[-1]}")
+        for message_id, history in tg.messages.items():
+            print(f"✅ Message {message_id}: sent once, edited {len(history) - 1}×, final {len(history[-1])} chars")
+
+
+def run_broadcast_stub_test(chat_count: int = 300, blocked: int = 3):
+    """
+    Broadcasts a long report to `chat_count` fake chats on a local Bot API stub
+    (some blocked, some throttled) and prints the per-recipient outcome summary.
+    """
+    import telegram_alert
+    from stub_servers import FakeTelegram, DEFAULT_REPORT
+    from telegram_broadcast import broadcast_telegram_message, summarize_broadcast
+
+    print(f"\n🧪 BROADCAST STUB TEST STARTED: {chat_count} chats")
+    chat_ids = [str(100000 + i) for i in range(chat_count)]
+
+    with FakeTelegram(latency=0.05, throttle_first=5, blocked_chats=chat_ids[:blocked]) as tg:
+        telegram_alert.TELEGRAM_MSG_URL = f"{tg.url}/botstub/sendMessage"
+        results = broadcast_telegram_message(DEFAULT_REPORT, chat_ids)
+
+    print(summarize_broadcast(results))
+    sends = sorted(at for at, method, path, _ in tg.calls)
+    if len(sends) > 1:
+        print(f"✅ {len(sends)} requests in {sends[-1] - sends[0]:.2f}s "
+              f"({(len(sends) - 1) / (sends[-1] - sends[0]):.1f} msg/s)")
+
+
+def run_resample_verification(record_dir: str | None = None, instrument: str = "XAU_USD"):
+    """
+    Checks the local multi-timeframe resampler bar-for-bar against OANDA: records
+    M5 plus M15/H1/H4/D candle responses into `record_dir` (or reuses the JSON
+    files already there) and compares the bars built from M5 with OANDA's own.
+    """
+    import json
+    import os
+    from oanda_connector import _request_candles
+    from resample import verify_against_oanda
+
+    record_dir = record_dir or os.path.join(os.path.dirname(__file__), "resample_check")
+    os.makedirs(record_dir, exist_ok=True)
+    counts = {"M5": 4999, "M15": 1600, "H1": 400, "H4": 100, "D": 16}  # about the same 17 days each
+
+    print(f"\n🧪 RESAMPLE VERIFICATION STARTED: {instrument} ({record_dir})")
+    paths = {g: os.path.join(record_dir, f"{instrument}_{g}.json") for g in counts}
+    for granularity, count in counts.items():
+        if not os.path.exists(paths[granularity]):
+            candles = _request_candles(instrument, {"granularity": granularity, "count": count, "price": "M"})
+            with open(paths[granularity], "w", encoding="utf-8") as f:
+                json.dump({"instrument": instrument, "granularity": granularity, "candles": candles.to_oanda()}, f)
+            print(f"📥 Recorded {len(candles)} {granularity} candles")
+
+    for granularity in ("M15", "H1", "H4", "D"):
+        compared, mismatches = verify_against_oanda(paths["M5"], paths[granularity], granularity, "M5")
+        print(("✅" if compared and not mismatches else "❌") + f" {granularity}: {compared} bars compared, "
+              f"{len(mismatches)} mismatch(es)")
+        for line in mismatches[:10]:
+            print(f"   {line}")
+
+
+def run_replay_check(days: float = 2, warm_up: bool = True, instruments: list | None = None):
+    """
+    Replays `days` of sessions against the local stubs and checks every
+    triggered session was delivered. `warm_up=False` formats every report
+    without a pre-rendered frame (cold starts, catch-ups, late job retries).
+    Also checks the prompts carry each instrument's own price tick.
+    """
+    from datetime import datetime
+    import main
+    from config import INSTRUMENT, LOCAL_TZ
+    from replay import SYNTHETIC_PROFILES, print_summary, run_replay
+
+    patches = [] if warm_up else [(main, "SESSION_WARMUP_LEAD_SEC", 0)]
+    if instruments:
+        patches.append((main, "INSTRUMENTS", instruments))
+    instruments = instruments or main.INSTRUMENTS
+    print(f"\n🧪 REPLAY CHECK STARTED: {days:g} days, warm-up {'on' if warm_up else 'off'}, "
+          f"instruments {', '.join(instruments)}")
+    summary = run_replay(datetime(2025, 10, 20, tzinfo=LOCAL_TZ), days, patches=patches)
+    print_summary(summary)
+    expected = summary["sessions_triggered"] * len(instruments)
+    print(("✅" if summary["deliveries"] == expected else "❌") + f" {summary['deliveries']}/{expected} delivered")
+    decimals = {SYNTHETIC_PROFILES.get(i, SYNTHETIC_PROFILES[INSTRUMENT])[2] for i in instruments}
+    ticks = sorted(f"{10 ** -d:.{d}f}" for d in decimals)
+    print(("✅" if summary["prompt_ticks"] == ticks else "❌")
+          + f" prompt ticks {', '.join(summary['prompt_ticks']) or 'none'} (expected {', '.join(ticks)})")
+
+
 # 🟢 Direct Execution
 if __name__ == "__main__":
+    validate_env()
     run_manual_test("Pre-New York")